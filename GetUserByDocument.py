@@ -4,12 +4,12 @@
 Script para buscar un usuario específico por número de documento en MiID.
 """
 
-import mysql.connector
 import logging
 import json
 import os
 from pathlib import Path
-from config import AZURE_CONFIG, MIID_CONFIG
+from GetUserMiID import conectar_miid
+from trazas import trazar
 
 # Configuración de logging
 logging.basicConfig(
@@ -18,21 +18,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def conectar_miid():
-    """
-    Abre conexión a MiID (Los datos de conexión los traigo desde config.py)
-    """
-    try:
-        logger.info("Conectando a MiID")
-
-        conexion = mysql.connector.connect(**MIID_CONFIG)
-        logger.info("Conexión a MiID establecida exitosamente")
-        return conexion
-
-    except Exception as e:
-        logger.error(f"Error al conectarse a la base de datos: {e}")
-        return None
-
+@trazar("miid.buscar_documento")
 def buscar_usuario_por_documento(numero_documento: str):
     """
     Busca un usuario específico por número de documento en MiID.
@@ -7,20 +7,12 @@ import logging
 import json
 import os
 from pathlib import Path
-from config import AZURE_CONFIG, MIID_CONFIG
-try:
-    # Intentar cargar config externo junto al exe/CWD en modo empaquetado
-    from importlib.util import spec_from_file_location, module_from_spec
-    from pathlib import Path as _Path
-    cfg_path = _Path.cwd() / "config.py"
-    if cfg_path.exists():
-        _spec = spec_from_file_location("config_external", str(cfg_path))
-        if _spec and _spec.loader:
-            _mod = module_from_spec(_spec)
-            _spec.loader.exec_module(_mod)
-            MIID_CONFIG = getattr(_mod, 'MIID_CONFIG', MIID_CONFIG)
-except Exception:
-    pass
+# config.py externo (junto al exe/CWD) si existe; se carga una sola vez por proceso
+from configuracion import cargar_config
+_config = cargar_config()
+AZURE_CONFIG, MIID_CONFIG = _config.AZURE_CONFIG, _config.MIID_CONFIG
+from datos_locales import conectar_local, usar_fuente_local
+from trazas import trazar
 
 # Configuración de logging
 logging.basicConfig(
@@ -29,14 +21,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Conexiones a MiID que se mantienen abiertas: close() las devuelve al pool
+# (uno por configuración; se llena al crearse) y la siguiente consulta no paga
+# el handshake TLS. Alcanza para los workers de la cola más una consulta manual
+TAMANO_POOL_MIID = 3
+
 def conectar_miid():
     """
-    Abro conexión  a MiID (Los datos de conexión los traigo desde config.py)
+    Abro conexión  a MiID (Los datos de conexión los traigo desde config.py).
+    La conexión sale del pool; al cerrarla vuelve a él.
     """
+    if usar_fuente_local():
+        return conectar_local()
+
     try:
         logger.info("Conectando a MiID")
 
-        conexion = mysql.connector.connect(**MIID_CONFIG)
+        try:
+            conexion = mysql.connector.connect(**{'pool_size': TAMANO_POOL_MIID, **MIID_CONFIG})
+        except mysql.connector.errors.PoolError:
+            # Pool agotado (todas las conexiones en uso): conexión suelta
+            conexion = mysql.connector.connect(**MIID_CONFIG)
         logger.info("Conexión a MiID establecida exitosamente")
         return conexion
 
@@ -44,6 +49,7 @@ def conectar_miid():
         logger.error(f"Error al conectarse a la base de datos: {e}")
         return None
 
+@trazar("miid.ultimo_usuario", falla_si_none=True)
 def obtener_ultimo_usuario_midd():
     """
     Consulto el último usuario con proceso exitoso en MiID
@@ -111,6 +117,103 @@ def obtener_ultimo_usuario_midd():
             except Exception as e:
                 logger.error(f"Error al cerrar la conexion")
 
+@trazar("miid.rango_fechas", falla_si_none=True)
+def obtener_rango_fechas_enrolamiento():
+    """
+    Consulto la fecha mínima y máxima de LP_CREATION_DATE de los enrolamientos
+    exitosos, para poder partir el histórico en rangos.
+
+    Returns:
+        Tupla (fecha_minima, fecha_maxima) o None si no hay registros o falla.
+    """
+    conexion = None
+    try:
+        conexion = conectar_miid()
+        if not conexion:
+            return None
+
+        cursor = conexion.cursor()
+        query = """
+        SELECT MIN(lpe.LP_CREATION_DATE), MAX(lpe.LP_CREATION_DATE)
+        FROM log_process_enroll lpe
+        WHERE lpe.LP_STATUS_PROCESS = 1 AND lpe.EC_ID = 11000
+        """
+        cursor.execute(query)
+        fila = cursor.fetchone()
+        if not fila or fila[0] is None:
+            logger.warning("No hay enrolamientos exitosos en MiID")
+            return None
+        return fila[0], fila[1]
+
+    except Exception as e:
+        logger.error(f"Error al obtener rango de fechas: {e}")
+        return None
+    finally:
+        if conexion:
+            try:
+                conexion.close()
+            except Exception as e:
+                logger.error(f"Error al cerrar la conexion: {e}")
+
+@trazar("miid.usuarios_por_rango", falla_si_none=True)
+def obtener_usuarios_por_rango(fecha_inicio, fecha_fin):
+    """
+    Consulto los usuarios con proceso exitoso cuyo LP_CREATION_DATE está en
+    [fecha_inicio, fecha_fin), ordenados de forma estable (fecha, LP_ID) para
+    que el backfill pueda retomar un rango a mitad de camino.
+
+    Args:
+        fecha_inicio: Fecha inicial (inclusiva)
+        fecha_fin: Fecha final (exclusiva)
+
+    Returns:
+        Lista de diccionarios con el mismo formato que obtener_ultimo_usuario_midd,
+        o None si falla la consulta.
+    """
+    conexion = None
+    try:
+        conexion = conectar_miid()
+        if not conexion:
+            return None
+
+        cursor = conexion.cursor()
+        query = """
+        SELECT
+            lpe.LP_ID,
+            p.PER_DOCUMENT_NUMBER,
+            COALESCE(
+                NULLIF(TRIM(p.PER_ANI_FIRST_NAME), ''), 
+                CONCAT('Usuario_', p.PER_DOCUMENT_NUMBER)
+            ) AS ANI_FIRST_NAME,
+            lpe.LP_CREATION_DATE
+        FROM log_process_enroll lpe
+        INNER JOIN person p ON lpe.PER_ID = p.PER_ID
+        WHERE lpe.LP_STATUS_PROCESS = 1 AND lpe.EC_ID = 11000
+          AND lpe.LP_CREATION_DATE >= %s AND lpe.LP_CREATION_DATE < %s
+        ORDER BY lpe.LP_CREATION_DATE ASC, lpe.LP_ID ASC
+        """
+        cursor.execute(query, (fecha_inicio, fecha_fin))
+
+        return [
+            {
+                'lpid': lp_id,
+                'documento': doc_num,
+                'nombre': ani_first_name,
+                'fecha_creacion': creation_date
+            }
+            for lp_id, doc_num, ani_first_name, creation_date in cursor.fetchall()
+        ]
+
+    except Exception as e:
+        logger.error(f"Error al obtener usuarios del rango {fecha_inicio} - {fecha_fin}: {e}")
+        return None
+    finally:
+        if conexion:
+            try:
+                conexion.close()
+            except Exception as e:
+                logger.error(f"Error al cerrar la conexion: {e}")
+
 def main():
     """
     Orquesto la extracción del usuario y la actualización de la configuración
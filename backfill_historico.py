@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backfill del histórico de enrolamientos de MiID hacia ControlId.
+
+Parto el histórico de log_process_enroll en rangos de LP_CREATION_DATE,
+proceso los rangos en paralelo (cada worker con su propia sesión de ControlId
+y su propia conexión a Azure SQL) y guardo un checkpoint por rango para poder
+retomar el proceso donde quedó.
+
+Uso:
+    python backfill_historico.py --desde 2023-01-01 --hasta 2024-01-01 --workers 4
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from GetUserMiID import obtener_rango_fechas_enrolamiento, obtener_usuarios_por_rango
+from download_image_to_sql_temp import conectar_base_datos, descargar_imagen_por_lpid
+from flujo_usuario_inteligente import (
+    obtener_sesion,
+    procesar_usuario_con_imagen,
+    procesar_usuario_inteligente,
+)
+from configuracion import ruta_datos
+from metricas import USUARIOS_SINCRONIZADOS, iniciar_servidor_metricas
+from config import AZURE_CONFIG
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+RUTA_CHECKPOINT = ruta_datos("backfill_checkpoint.json")
+
+# Cada cuántos usuarios se persiste el avance de un rango
+INTERVALO_CHECKPOINT = 25
+
+# Cada cuántos segundos se reporta el throughput
+INTERVALO_REPORTE = 30
+
+
+def partir_rangos(desde: datetime, hasta: datetime, dias: int) -> List[Tuple[datetime, datetime]]:
+    """
+    Divide [desde, hasta) en rangos consecutivos de `dias` días.
+
+    Args:
+        desde: Fecha inicial (inclusiva)
+        hasta: Fecha final (exclusiva)
+        dias: Tamaño de cada rango en días
+
+    Returns:
+        Lista de tuplas (inicio, fin).
+
+    Raises:
+        ValueError: Si `dias` es menor a 1.
+    """
+    if dias < 1:
+        raise ValueError(f"dias debe ser al menos 1 (recibido {dias})")
+    rangos = []
+    paso = timedelta(days=dias)
+    inicio = desde
+    while inicio < hasta:
+        fin = min(inicio + paso, hasta)
+        rangos.append((inicio, fin))
+        inicio = fin
+    return rangos
+
+
+def clave_rango(inicio: datetime, fin: datetime) -> str:
+    """Clave estable de un rango dentro del checkpoint."""
+    return f"{inicio.isoformat()}|{fin.isoformat()}"
+
+
+class Checkpoint:
+    """
+    Estado persistente del backfill: un registro por rango con su estado,
+    contadores y el último LP_ID procesado. Se escribe de forma atómica
+    (archivo temporal + replace) para no corromperlo si el proceso muere.
+    """
+
+    def __init__(self, ruta: Path, reiniciar: bool = False):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self.rangos: Dict[str, Dict[str, Any]] = {}
+        if ruta.exists() and not reiniciar:
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    self.rangos = json.load(f).get("rangos", {})
+                logger.info(f"Checkpoint cargado: {len(self.rangos)} rangos registrados")
+            except Exception as e:
+                logger.warning(f"No se pudo leer el checkpoint, se inicia desde cero: {e}")
+
+    def obtener(self, clave: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.rangos.get(clave, {}))
+
+    def actualizar(self, clave: str, **valores) -> None:
+        with self._lock:
+            self.rangos.setdefault(clave, {}).update(valores)
+            self._guardar()
+
+    def _guardar(self) -> None:
+        temporal = self.ruta.with_suffix(".tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"rangos": self.rangos}, f, indent=2, default=str)
+        temporal.replace(self.ruta)
+
+
+class Throughput:
+    """Contador compartido entre workers para reportar usuarios por minuto."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.inicio = time.monotonic()
+        self.procesados = 0
+        self.fallidos = 0
+
+    def registrar(self, exito: bool) -> None:
+        with self._lock:
+            if exito:
+                self.procesados += 1
+            else:
+                self.fallidos += 1
+
+    def usuarios_por_minuto(self) -> float:
+        transcurrido = time.monotonic() - self.inicio
+        if transcurrido <= 0:
+            return 0.0
+        return (self.procesados + self.fallidos) * 60.0 / transcurrido
+
+    def resumen(self) -> str:
+        return (
+            f"procesados={self.procesados} fallidos={self.fallidos} "
+            f"throughput={self.usuarios_por_minuto():.1f} usuarios/min"
+        )
+
+
+def sincronizar_usuario(session: str, conexion_azure, usuario: Dict[str, Any]) -> bool:
+    """
+    Sincroniza un usuario histórico: descarga su imagen (si la hay) y lo crea
+    o modifica en ControlId.
+
+    Returns:
+        True si el usuario quedó sincronizado.
+    """
+    ruta_imagen = None
+    try:
+        ruta_imagen = descargar_imagen_por_lpid(conexion_azure, usuario['lpid'], usuario['documento'])
+    except Exception as e:
+        logger.warning(f"No se pudo descargar imagen de {usuario['documento']}: {e}")
+
+    if ruta_imagen:
+        user_id = procesar_usuario_con_imagen(session, usuario['nombre'], usuario['documento'], str(ruta_imagen))
+    else:
+        user_id = procesar_usuario_inteligente(session, usuario['nombre'], usuario['documento'])
+    USUARIOS_SINCRONIZADOS.incrementar(resultado="exito" if user_id is not None else "error")
+    return user_id is not None
+
+
+def procesar_rango(inicio: datetime, fin: datetime, checkpoint: Checkpoint,
+                   throughput: Throughput, detener: threading.Event) -> bool:
+    """
+    Procesa todos los usuarios de un rango, retomando después del último
+    LP_ID registrado en el checkpoint.
+
+    Returns:
+        True si el rango quedó completado.
+    """
+    clave = clave_rango(inicio, fin)
+    estado = checkpoint.obtener(clave)
+    if estado.get("estado") == "completado":
+        logger.info(f"Rango {clave} ya completado; se omite")
+        return True
+
+    usuarios = obtener_usuarios_por_rango(inicio, fin)
+    if usuarios is None:
+        logger.error(f"No se pudieron consultar los usuarios del rango {clave}")
+        return False
+
+    # Retomar después del último LP_ID procesado (el orden de la consulta es estable)
+    ultimo_lpid = estado.get("ultimo_lpid")
+    if ultimo_lpid is not None:
+        for indice, usuario in enumerate(usuarios):
+            if str(usuario['lpid']) == str(ultimo_lpid):
+                usuarios = usuarios[indice + 1:]
+                break
+
+    procesados = estado.get("procesados", 0)
+    fallidos = estado.get("fallidos", 0)
+    checkpoint.actualizar(clave, estado="en_progreso", total=procesados + fallidos + len(usuarios))
+    logger.info(f"Rango {clave}: {len(usuarios)} usuarios pendientes")
+
+    if not usuarios:
+        checkpoint.actualizar(clave, estado="completado")
+        return True
+
+    session = obtener_sesion()
+    if not session:
+        logger.error(f"Rango {clave}: no se pudo obtener sesión de ControlId")
+        return False
+
+    conexion_azure = conectar_base_datos(
+        AZURE_CONFIG['servidor'],
+        AZURE_CONFIG['base_datos'],
+        AZURE_CONFIG['usuario'],
+        AZURE_CONFIG['contraseña']
+    )
+    try:
+        for numero, usuario in enumerate(usuarios, start=1):
+            if detener.is_set():
+                checkpoint.actualizar(clave, procesados=procesados, fallidos=fallidos, ultimo_lpid=ultimo_lpid)
+                return False
+
+            exito = sincronizar_usuario(session, conexion_azure, usuario)
+            throughput.registrar(exito)
+            if exito:
+                procesados += 1
+            else:
+                fallidos += 1
+
+            ultimo_lpid = usuario['lpid']
+            if numero % INTERVALO_CHECKPOINT == 0:
+                checkpoint.actualizar(clave, procesados=procesados, fallidos=fallidos, ultimo_lpid=ultimo_lpid)
+
+        checkpoint.actualizar(
+            clave, estado="completado", procesados=procesados, fallidos=fallidos, ultimo_lpid=ultimo_lpid
+        )
+        logger.info(f"Rango {clave} completado: {procesados} procesados, {fallidos} fallidos")
+        return True
+    finally:
+        conexion_azure.close()
+
+
+def reportar_throughput(throughput: Throughput, detener: threading.Event) -> None:
+    """Reporta periódicamente el throughput hasta que termine el backfill."""
+    while not detener.wait(INTERVALO_REPORTE):
+        logger.info(f"Avance backfill: {throughput.resumen()}")
+
+
+def ejecutar_backfill(desde: Optional[datetime], hasta: Optional[datetime], dias: int,
+                      workers: int, ruta_checkpoint: Path = RUTA_CHECKPOINT,
+                      reiniciar: bool = False) -> bool:
+    """
+    Orquesta el backfill completo.
+
+    Args:
+        desde: Fecha inicial; si es None se usa la mínima de MiID
+        hasta: Fecha final; si es None se usa la máxima de MiID
+        dias: Días por rango
+        workers: Número de rangos procesados en paralelo
+        ruta_checkpoint: Archivo de checkpoint
+        reiniciar: Ignorar el checkpoint existente
+
+    Returns:
+        True si todos los rangos quedaron completados.
+    """
+    if desde is None or hasta is None:
+        limites = obtener_rango_fechas_enrolamiento()
+        if not limites:
+            logger.error("No se pudo determinar el rango de fechas del histórico")
+            return False
+        desde = desde or limites[0]
+        # El límite superior es exclusivo: incluir el último enrolamiento
+        hasta = hasta or (limites[1] + timedelta(seconds=1))
+
+    rangos = partir_rangos(desde, hasta, dias)
+    iniciar_servidor_metricas()
+    logger.info(f"=== BACKFILL HISTÓRICO: {len(rangos)} rangos de {dias} días con {workers} workers ===")
+
+    checkpoint = Checkpoint(ruta_checkpoint, reiniciar=reiniciar)
+    throughput = Throughput()
+    detener = threading.Event()
+    reporte = threading.Thread(target=reportar_throughput, args=(throughput, detener), daemon=True)
+    reporte.start()
+
+    completados = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futuros = {
+                executor.submit(procesar_rango, inicio, fin, checkpoint, throughput, detener): (inicio, fin)
+                for inicio, fin in rangos
+            }
+            try:
+                for futuro in as_completed(futuros):
+                    inicio, fin = futuros[futuro]
+                    try:
+                        if futuro.result():
+                            completados += 1
+                    except Exception as e:
+                        logger.error(f"Error en el rango {clave_rango(inicio, fin)}: {e}")
+            except KeyboardInterrupt:
+                logger.warning("Interrupción recibida; guardando checkpoints y deteniendo workers...")
+                detener.set()
+                for futuro in futuros:
+                    futuro.cancel()
+                raise
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detener.set()
+
+    logger.info("=" * 60)
+    logger.info(f"Rangos completados: {completados}/{len(rangos)}")
+    logger.info(f"Resumen: {throughput.resumen()}")
+    logger.info("=" * 60)
+    return completados == len(rangos)
+
+
+def _parsear_fecha(valor: str) -> datetime:
+    return datetime.fromisoformat(valor)
+
+
+def _entero_positivo(valor: str) -> int:
+    numero = int(valor)
+    if numero < 1:
+        raise argparse.ArgumentTypeError(f"debe ser un entero mayor o igual a 1 (recibido {valor})")
+    return numero
+
+
+def main():
+    """
+    Punto de entrada de línea de comandos.
+    """
+    parser = argparse.ArgumentParser(description="Backfill histórico de enrolamientos MiID -> ControlId")
+    parser.add_argument("--desde", type=_parsear_fecha, help="Fecha inicial (YYYY-MM-DD), por defecto la mínima en MiID")
+    parser.add_argument("--hasta", type=_parsear_fecha, help="Fecha final exclusiva (YYYY-MM-DD), por defecto la máxima en MiID")
+    parser.add_argument("--dias-por-rango", type=_entero_positivo, default=7, help="Días de LP_CREATION_DATE por rango (default: 7)")
+    parser.add_argument("--workers", type=_entero_positivo, default=4, help="Rangos procesados en paralelo (default: 4)")
+    parser.add_argument("--checkpoint", type=Path, default=RUTA_CHECKPOINT, help="Archivo de checkpoint")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignorar el checkpoint y empezar desde cero")
+    args = parser.parse_args()
+
+    return ejecutar_backfill(
+        args.desde,
+        args.hasta,
+        args.dias_por_rango,
+        args.workers,
+        ruta_checkpoint=args.checkpoint,
+        reiniciar=args.reiniciar,
+    )
+
+
+if __name__ == "__main__":
+    success = main()
+    if success:
+        print("\n[EXITO] Backfill completado")
+    else:
+        print("\n[ERROR] El backfill no se completó. Ejecuta de nuevo para retomar desde el checkpoint.")
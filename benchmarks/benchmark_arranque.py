@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de arranque: tiempo de importación de los módulos de entrada.
+
+Cada módulo se importa en un intérprete nuevo con `-X importtime` (en un
+directorio temporal con un config.py de prueba) y se reporta el tiempo total
+de importación, los módulos más costosos y si se cargó alguno de los drivers
+pesados que deben quedar diferidos hasta después de mostrar la ventana.
+
+Uso:
+    python benchmarks/benchmark_arranque.py
+    python benchmarks/benchmark_arranque.py --modulos control_id_gui_final,backfill_historico --repeticiones 5
+    python benchmarks/benchmark_arranque.py --comparar benchmarks/resultados/<anterior>.json
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+from utilidades import RAIZ_PROYECTO, cargar_resultados, guardar_resultados
+
+# Drivers que no deben importarse al abrir la GUI (se cargan en cargar_modulos)
+DRIVERS_DIFERIDOS = ("mysql.connector", "pyodbc", "requests", "PIL")
+
+CONFIG_PRUEBA = '''
+MIID_CONFIG = {"host": "127.0.0.1", "port": 3306, "user": "", "password": "", "database": ""}
+AZURE_CONFIG = {"servidor": "", "base_datos": "", "usuario": "", "contraseña": "",
+                "stored_procedure": "", "business_context": ""}
+CONTROL_ID_CONFIG = {"base_url": "http://127.0.0.1:1", "login": "admin", "password": "admin"}
+CARPETAS_CONFIG = {"carpeta_local_temp": ".", "extension_imagen": ".jpg"}
+METRICAS_CONFIG = {"habilitado": False}
+'''
+
+
+def parsear_importtime(salida: str) -> List[Dict[str, Any]]:
+    """Líneas de `-X importtime` como {modulo, propio_us, acumulado_us, nivel}."""
+    registros = []
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        # "import time:   123 |   456 |     modulo"
+        partes = linea[len("import time:"):].split("|")
+        if len(partes) != 3:
+            continue
+        nombre = partes[2].rstrip()
+        registros.append({
+            'modulo': nombre.strip(),
+            'propio_us': int(partes[0]),
+            'acumulado_us': int(partes[1]),
+            'nivel': (len(nombre) - len(nombre.lstrip())) // 2,
+        })
+    return registros
+
+
+def medir_importacion(modulo: str, directorio: Path) -> Dict[str, Any]:
+    """Importa `modulo` en un intérprete nuevo y devuelve el perfil de importación."""
+    entorno = dict(os.environ)
+    entorno['PYTHONPATH'] = os.pathsep.join(filter(None, [str(RAIZ_PROYECTO), entorno.get('PYTHONPATH')]))
+    entorno['PYTHONDONTWRITEBYTECODE'] = "1"
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=directorio, env=entorno, capture_output=True, text=True, timeout=120,
+    )
+    registros = parsear_importtime(proceso.stderr)
+    error = None
+    if proceso.returncode != 0:
+        error = next(
+            (linea for linea in reversed(proceso.stderr.splitlines()) if linea and not linea.startswith("import time:")),
+            f"código {proceso.returncode}",
+        )
+    raiz = next((r for r in registros if r['modulo'] == modulo), None)
+    return {
+        'total_us': raiz['acumulado_us'] if raiz else sum(r['propio_us'] for r in registros),
+        'registros': registros,
+        'error': error,
+    }
+
+
+def perfilar(modulo: str, repeticiones: int, top: int, directorio: Path, base: set) -> Dict[str, Any]:
+    """
+    Perfil de importación de `modulo`. `base` son los módulos que el intérprete
+    ya carga al arrancar (site, encodings...), que no se atribuyen al módulo.
+    """
+    mediciones = [medir_importacion(modulo, directorio) for _ in range(repeticiones)]
+    mejor = min(mediciones, key=lambda m: m['total_us'])
+    importados = {r['modulo'] for r in mejor['registros']} - base
+    directos = [r for r in mejor['registros'] if r['nivel'] == 1 and r['modulo'] not in base]
+    return {
+        'modulo': modulo,
+        'total_ms': mejor['total_us'] / 1000,
+        'mediana_ms': statistics.median(m['total_us'] for m in mediciones) / 1000,
+        'modulos_importados': len(importados),
+        # -X importtime también lista los imports que fallaron (p. ej. pyodbc no instalado)
+        'drivers_importados': [d for d in DRIVERS_DIFERIDOS if d in importados],
+        'mas_costosos': [
+            {'modulo': r['modulo'], 'acumulado_ms': r['acumulado_us'] / 1000}
+            for r in sorted(directos, key=lambda r: r['acumulado_us'], reverse=True)[:top]
+        ],
+        'error': mejor['error'],
+    }
+
+
+def imprimir(resultado: Dict[str, Any], anterior: Dict[str, Any] = None) -> None:
+    comparacion = ""
+    if anterior and anterior.get('total_ms'):
+        comparacion = f" ({(resultado['total_ms'] / anterior['total_ms'] - 1) * 100:+.1f}% vs anterior)"
+    print(f"\n== {resultado['modulo']} ==")
+    print(f"  importación: {resultado['total_ms']:.1f} ms (mediana {resultado['mediana_ms']:.1f} ms){comparacion}")
+    print(f"  módulos importados: {resultado['modulos_importados']}")
+    drivers = resultado['drivers_importados']
+    print(f"  drivers importados: {', '.join(drivers) if drivers else 'ninguno'}")
+    if resultado['error']:
+        print(f"  ERROR: {resultado['error']}")
+    print("  imports directos más costosos:")
+    for costoso in resultado['mas_costosos']:
+        print(f"    {costoso['acumulado_ms']:8.1f} ms  {costoso['modulo']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de importación de los módulos de entrada")
+    parser.add_argument("--modulos", default="control_id_gui_final,backfill_historico",
+                        help="Módulos a importar, separados por coma")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Importaciones por módulo (se toma la mejor)")
+    parser.add_argument("--top", type=int, default=10, help="Imports directos a listar")
+    parser.add_argument("--salida", type=Path, default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", type=Path, default=None, help="Resultados anteriores para comparar")
+    args = parser.parse_args()
+
+    modulos = [valor.strip() for valor in args.modulos.split(",") if valor.strip()]
+    anteriores = {}
+    if args.comparar:
+        anteriores = {r['modulo']: r for r in cargar_resultados(args.comparar)['resultados']}
+
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="arranque_") as temporal:
+        directorio = Path(temporal)
+        # config.py de prueba en el directorio de trabajo (como el externo junto al exe)
+        (directorio / "config.py").write_text(CONFIG_PRUEBA, encoding="utf-8")
+        base = {r['modulo'] for r in parsear_importtime(
+            subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"],
+                           capture_output=True, text=True, timeout=60).stderr
+        )}
+        for modulo in modulos:
+            resultado = perfilar(modulo, args.repeticiones, args.top, directorio, base)
+            imprimir(resultado, anteriores.get(modulo))
+            resultados.append(resultado)
+
+    parametros = {clave: (str(valor) if isinstance(valor, Path) else valor) for clave, valor in vars(args).items()}
+    ruta = guardar_resultados("arranque", parametros, resultados, args.salida)
+    print(f"\nResultados guardados en {ruta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de la normalización de imágenes (preprocesado.py).
+
+Genera fotos sintéticas del tamaño de una cámara (ruido, orientación EXIF y
+metadatos) y mide:
+- normalización serie (en este proceso) contra el pool de procesos, con
+  varios hilos pidiendo imágenes a la vez como hacen los workers
+- carga de la imagen original y de la normalizada al equipo simulado, cuyo
+  tiempo de procesamiento crece con el tamaño (`--segundos-por-mb`), para
+  aproximar lo que el terminal tarda en reducir la foto antes de enrolarla
+
+Reporta ms por imagen, imágenes/s, bytes enviados y latencia p50/p95 de
+user_set_image, y guarda todo en benchmarks/resultados/*.json.
+
+Uso:
+    python benchmarks/benchmark_preprocesado.py --imagenes 24 --ancho 4000 --alto 3000
+    python benchmarks/benchmark_preprocesado.py --comparar benchmarks/resultados/anterior.json
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+from utilidades import cargar_resultados, guardar_resultados, instalar_config, resumen_latencias
+
+# Los módulos del proyecto se importan dentro de las funciones, después de
+# instalar_config
+
+# Orientación EXIF "rotar 90°": la más común en fotos de celular
+ORIENTACION_ROTADA = 6
+
+
+def generar_fotos(carpeta: Path, cantidad: int, ancho: int, alto: int) -> List[Path]:
+    """Fotos JPEG con ruido (comprimen como una foto real), EXIF y comentario."""
+    from PIL import Image
+
+    carpeta.mkdir(parents=True, exist_ok=True)
+    fotos = []
+    for indice in range(cantidad):
+        canales = [Image.effect_noise((ancho, alto), 40 + indice % 3 * 10) for _ in range(3)]
+        imagen = Image.merge("RGB", canales)
+        exif = Image.Exif()
+        exif[0x0112] = ORIENTACION_ROTADA
+        exif[0x010F] = "Camara benchmark"
+        ruta = carpeta / f"foto_{indice:04d}.jpg"
+        imagen.save(ruta, format="JPEG", quality=95, exif=exif.tobytes(), comment=b"benchmark")
+        fotos.append(ruta)
+    return fotos
+
+
+def copiar_fotos(fotos: List[Path], carpeta: Path) -> List[Path]:
+    if carpeta.exists():
+        shutil.rmtree(carpeta)
+    carpeta.mkdir(parents=True)
+    copias = []
+    for foto in fotos:
+        destino = carpeta / foto.name
+        shutil.copyfile(foto, destino)
+        copias.append(destino)
+    return copias
+
+
+def medir_serie(fotos: List[Path], carpeta: Path, lado_maximo: int, calidad: int) -> Dict[str, Any]:
+    """Normalización en este proceso, una imagen tras otra."""
+    from preprocesado import normalizar_imagen
+
+    copias = copiar_fotos(fotos, carpeta)
+    tiempos = []
+    inicio = time.perf_counter()
+    for copia in copias:
+        marca = time.perf_counter()
+        normalizar_imagen(str(copia), str(copia), lado_maximo, calidad)
+        tiempos.append(time.perf_counter() - marca)
+    total = time.perf_counter() - inicio
+    return {
+        'modo': "serie",
+        'segundos': total,
+        'imagenes_por_segundo': len(copias) / total if total else 0.0,
+        'latencia': resumen_latencias(tiempos),
+    }
+
+
+def medir_pool(fotos: List[Path], carpeta: Path, hilos: int) -> Dict[str, Any]:
+    """Normalización con preprocesar_imagen desde varios hilos (pool de procesos)."""
+    from preprocesado import _obtener_pool, preprocesar_imagen
+
+    # El arranque de los procesos no forma parte de la medición
+    _obtener_pool().submit(os.getpid).result()
+
+    copias = copiar_fotos(fotos, carpeta)
+    tiempos = []
+
+    def normalizar(copia: Path) -> None:
+        marca = time.perf_counter()
+        preprocesar_imagen(copia)
+        tiempos.append(time.perf_counter() - marca)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        list(executor.map(normalizar, copias))
+    total = time.perf_counter() - inicio
+    return {
+        'modo': "pool",
+        'segundos': total,
+        'imagenes_por_segundo': len(copias) / total if total else 0.0,
+        'latencia': resumen_latencias(tiempos),
+        'copias': copias,
+    }
+
+
+def medir_carga(fotos: List[Path], etiqueta: str, segundos_por_mb: float) -> Dict[str, Any]:
+    """Carga cada imagen a un usuario del equipo simulado."""
+    from flujo_usuario_inteligente import asignar_imagen_usuario, obtener_sesion
+    from simulador_controlid import SimuladorControlId
+
+    tamanos = [foto.stat().st_size for foto in fotos]
+    tiempos = []
+    fallos = 0
+    with SimuladorControlId(segundos_por_mb=segundos_por_mb,
+                            max_tamano_imagen=max(tamanos) + 1) as simulador:
+        dispositivo = {'base_url': simulador.url, 'login': "admin", 'password': "admin"}
+        sesion = obtener_sesion(dispositivo)
+        for indice, foto in enumerate(fotos):
+            user_id = simulador.estado.crear_usuario({'name': f"Benchmark {indice}", 'registration': f"{indice}"})
+            marca = time.perf_counter()
+            if not asignar_imagen_usuario(sesion, str(user_id), str(foto), base_url=simulador.url):
+                fallos += 1
+            tiempos.append(time.perf_counter() - marca)
+    return {
+        'modo': f"carga_{etiqueta}",
+        'bytes_promedio': sum(tamanos) / len(tamanos),
+        'fallos': fallos,
+        'latencia': resumen_latencias(tiempos),
+    }
+
+
+def imprimir(resultado: Dict[str, Any], anterior: Dict[str, Any] = None) -> None:
+    latencia = resultado['latencia']
+    linea = f"  {resultado['modo']:<18} p50 {latencia['p50'] * 1000:8.1f} ms  p95 {latencia['p95'] * 1000:8.1f} ms"
+    if 'imagenes_por_segundo' in resultado:
+        linea += f"  {resultado['imagenes_por_segundo']:7.1f} img/s"
+    if 'bytes_promedio' in resultado:
+        linea += f"  {resultado['bytes_promedio'] / 1024:8.0f} KB/imagen"
+    if anterior:
+        previo = anterior['latencia']['p50']
+        if previo:
+            linea += f"  (p50 {(latencia['p50'] - previo) / previo * 100:+.1f}% vs anterior)"
+    print(linea)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de normalización de imágenes")
+    parser.add_argument("--imagenes", type=int, default=16)
+    parser.add_argument("--ancho", type=int, default=4000)
+    parser.add_argument("--alto", type=int, default=3000)
+    parser.add_argument("--lado-maximo", type=int, default=1024)
+    parser.add_argument("--calidad", type=int, default=85)
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos del pool (por defecto, uno por núcleo)")
+    parser.add_argument("--hilos", type=int, default=4, help="Hilos que piden imágenes al pool")
+    parser.add_argument("--segundos-por-mb", type=float, default=0.5,
+                        help="Procesamiento del equipo simulado por MB de imagen")
+    parser.add_argument("--salida", type=Path, default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", type=Path, default=None, help="Resultados anteriores para comparar")
+    args = parser.parse_args()
+
+    instalar_config(
+        CONTROL_ID_CONFIG={'base_url': "http://equipo", 'login': "admin", 'password': "admin"},
+        MIID_CONFIG={},
+        AZURE_CONFIG={'stored_procedure': "", 'business_context': ""},
+        CARPETAS_CONFIG={'carpeta_local_temp': ".", 'extension_imagen': ".jpg"},
+        CONTROL_ID_LIMITES={},
+        RESILIENCIA_CONFIG={},
+        PREPROCESADO_CONFIG={
+            'habilitado': True,
+            'lado_maximo': args.lado_maximo,
+            'calidad_jpeg': args.calidad,
+            'procesos': args.procesos,
+        },
+    )
+    logging.disable(logging.WARNING)
+
+    from preprocesado import cerrar_pool
+
+    anteriores = {}
+    if args.comparar:
+        anteriores = {r['modo']: r for r in cargar_resultados(args.comparar)['resultados']}
+
+    resultados = []
+    carpeta = Path(tempfile.mkdtemp(prefix="benchmark_preprocesado_"))
+    try:
+        print(f"Generando {args.imagenes} fotos de {args.ancho}x{args.alto}...")
+        fotos = generar_fotos(carpeta / "originales", args.imagenes, args.ancho, args.alto)
+
+        print("Normalización:")
+        serie = medir_serie(fotos, carpeta / "serie", args.lado_maximo, args.calidad)
+        imprimir(serie, anteriores.get("serie"))
+        pool = medir_pool(fotos, carpeta / "pool", args.hilos)
+        normalizadas = pool.pop('copias')
+        imprimir(pool, anteriores.get("pool"))
+        resultados += [serie, pool]
+
+        print("Carga al equipo simulado:")
+        for etiqueta, conjunto in (("original", fotos), ("normalizada", normalizadas)):
+            resultado = medir_carga(conjunto, etiqueta, args.segundos_por_mb)
+            imprimir(resultado, anteriores.get(resultado['modo']))
+            resultados.append(resultado)
+    finally:
+        cerrar_pool()
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    parametros = {clave: (str(valor) if isinstance(valor, Path) else valor) for clave, valor in vars(args).items()}
+    ruta = guardar_resultados("preprocesado", parametros, resultados, args.salida)
+    print(f"\nResultados guardados en {ruta}")
+
+
+if __name__ == "__main__":
+    main()
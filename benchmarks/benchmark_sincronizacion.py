@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de punta a punta de la sincronización MiID -> ControlId.
+
+Cada escenario (modo x escala) corre contra los reemplazos locales:
+- MiID y Azure en SQLite (datos_locales), sembrados con N enrolamientos
+- servidor de imágenes local
+- equipo ControlId simulado (simulador_controlid)
+
+El flujo medido es el mismo que arma `procesar_usuario_completo` en la GUI:
+encolar en la ColaTrabajos, que un worker del PlanificadorPrioridad lo tome,
+descargar la imagen (SP + HTTP), crear/modificar el usuario con su grupo y
+asignar la imagen. Los servidores simulados corren en este proceso y el flujo
+en un proceso hijo, para que no compitan por el GIL y la memoria pico medida
+sea solo la del flujo.
+
+Reporta usuarios/s, latencia p50/p95/p99 por etapa, memoria pico y las
+solicitudes HTTP hechas, y guarda todo en benchmarks/resultados/*.json.
+
+Uso:
+    python benchmarks/benchmark_sincronizacion.py --escalas 100,1000,10000 --modos secuencial,cola
+    python benchmarks/benchmark_sincronizacion.py --escalas 1000 --comparar benchmarks/resultados/anterior.json
+"""
+
+import argparse
+import multiprocessing
+import queue
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from utilidades import cargar_resultados, guardar_resultados, instalar_config, resumen_latencias, rss_pico_mb
+
+# Los módulos del proyecto se importan dentro de las funciones: el proceso hijo
+# reimporta este archivo y debe instalar su `config` antes de importarlos
+
+CARPETA_DATOS = Path(__file__).resolve().parent / "datos"
+URL_IMAGENES_SEMBRADAS = "http://imagenes-benchmark"
+BUSINESS_CONTEXT = "benchmark"
+STORED_PROCEDURE = "dbo.GetMatchIDImgFaceByCASBid"
+
+ETAPAS = ("miid", "cola", "descarga", "controlid", "imagen", "total")
+
+# Cada cuánto se revisa si el proceso hijo sigue vivo mientras se espera su resultado
+INTERVALO_ESPERA = 1.0
+
+
+def preparar_datos(usuarios: int, semilla: int) -> Path:
+    """Siembra (una sola vez por escala y semilla) la base local y sus imágenes."""
+    from datos_locales import sembrar
+
+    carpeta = CARPETA_DATOS / f"escala_{usuarios}_{semilla}"
+    ruta = carpeta / "datos.db"
+    if not ruta.exists():
+        print(f"Sembrando {usuarios} enrolamientos en {carpeta}...")
+        sembrar(
+            usuarios,
+            ruta=carpeta / "sembrando.db",
+            carpeta_imagenes=carpeta / "imagenes",
+            url_imagenes=URL_IMAGENES_SEMBRADAS,
+            business_context=BUSINESS_CONTEXT,
+            proporcion_fallidos=0,
+            ancho=240,
+            alto=320,
+            semilla=semilla,
+        )
+        (carpeta / "sembrando.db").rename(ruta)
+    return carpeta
+
+
+def _instalar_config(escenario: Dict[str, Any]) -> None:
+    """Configuración del escenario (instalada antes de importar los módulos del proyecto)."""
+    instalar_config(
+        CONTROL_ID_CONFIG={'base_url': escenario['url_controlid'], 'login': "admin", 'password': "admin"},
+        MIID_CONFIG={},
+        AZURE_CONFIG={
+            'servidor': "", 'base_datos': "", 'usuario': "", 'contraseña': "",
+            'stored_procedure': STORED_PROCEDURE,
+            'business_context': BUSINESS_CONTEXT,
+        },
+        CARPETAS_CONFIG={'carpeta_local_temp': escenario['carpeta_temp'], 'extension_imagen': ".jpg"},
+        FUENTE_DATOS={'tipo': "sqlite", 'ruta': escenario['ruta_datos']},
+        CONTROL_ID_LIMITES={
+            'max_en_vuelo': escenario['max_en_vuelo'],
+            'solicitudes_por_segundo': escenario['solicitudes_por_segundo'],
+            'rafaga': max(1, escenario['max_en_vuelo']),
+        },
+        RESILIENCIA_CONFIG={},
+    )
+
+
+class _Mediciones:
+    """Latencias por etapa acumuladas por los workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.etapas: Dict[str, List[float]] = {etapa: [] for etapa in ETAPAS}
+        self.exitos = 0
+        self.fallos = 0
+        self.descargas = 0
+
+    def registrar(self, tiempos: Dict[str, float], exito: bool, descargada: bool) -> None:
+        with self._lock:
+            for etapa, valor in tiempos.items():
+                self.etapas[etapa].append(valor)
+            if exito:
+                self.exitos += 1
+            else:
+                self.fallos += 1
+            if descargada:
+                self.descargas += 1
+
+
+def _crear_procesador(mediciones: _Mediciones, sesion: str) -> Callable[[Dict[str, Any]], bool]:
+    """Procesamiento de un usuario, con los mismos pasos que ControlIdGUI.procesar_usuario."""
+    from download_image_to_sql_temp import conectar_base_datos, descargar_imagen_por_lpid
+    from flujo_usuario_inteligente import asignar_imagen_usuario, procesar_usuario_inteligente
+
+    locales = threading.local()
+
+    def procesar(usuario: Dict[str, Any]) -> bool:
+        if not hasattr(locales, 'conexion'):
+            locales.conexion = conectar_base_datos("", "", "", "")
+
+        inicio = time.perf_counter()
+        tiempos = {}
+        if 'encolado' in usuario:
+            tiempos['cola'] = time.time() - usuario['encolado']
+
+        ruta_imagen = descargar_imagen_por_lpid(locales.conexion, usuario['lpid'], usuario['documento'])
+        marca = time.perf_counter()
+        tiempos['descarga'] = marca - inicio
+
+        user_id = procesar_usuario_inteligente(sesion, usuario['nombre'], usuario['documento'])
+        tiempos['controlid'] = time.perf_counter() - marca
+        marca = time.perf_counter()
+
+        exito = user_id is not None
+        if exito and ruta_imagen:
+            exito = asignar_imagen_usuario(sesion, user_id, str(ruta_imagen))
+            tiempos['imagen'] = time.perf_counter() - marca
+
+        tiempos['total'] = time.perf_counter() - inicio + tiempos.get('cola', 0.0)
+        mediciones.registrar(tiempos, exito, ruta_imagen is not None)
+        return exito
+
+    return procesar
+
+
+def modo_secuencial(usuarios: List[Dict[str, Any]], procesar: Callable, escenario: Dict[str, Any]) -> None:
+    """Un usuario tras otro en el mismo hilo (línea base, sin cola)."""
+    for usuario in usuarios:
+        procesar(usuario)
+
+
+def modo_cola(usuarios: List[Dict[str, Any]], procesar: Callable, escenario: Dict[str, Any]) -> None:
+    """Cola persistente + PlanificadorPrioridad, como procesar_usuario_completo en la GUI."""
+    from cola_trabajos import CARRIL_FONDO, ColaTrabajos
+    from planificador import PlanificadorPrioridad
+
+    cola = ColaTrabajos(Path(escenario['carpeta_temp']) / "cola.db")
+    planificador = PlanificadorPrioridad(cola, procesar, workers=escenario['workers'])
+    planificador.iniciar()
+    try:
+        for usuario in usuarios:
+            planificador.encolar(dict(usuario, encolado=time.time()), clave=str(usuario['documento']), carril=CARRIL_FONDO)
+        while cola.pendientes():
+            time.sleep(0.05)
+    finally:
+        planificador.detener()
+        cola.cerrar()
+
+
+# Modos disponibles; un modo nuevo (lotes, multi-equipo...) solo necesita
+# registrarse aquí con la misma firma
+MODOS: Dict[str, Callable[[List[Dict[str, Any]], Callable, Dict[str, Any]], None]] = {
+    'secuencial': modo_secuencial,
+    'cola': modo_cola,
+}
+
+
+def _ejecutar_en_hijo(escenario: Dict[str, Any], salida) -> None:
+    """Corre un escenario en el proceso hijo y envía las mediciones al padre."""
+    try:
+        import logging
+        import os
+        _instalar_config(escenario)
+        # Los módulos del flujo imprimen y loguean cada paso; en el benchmark
+        # solo interesan las mediciones
+        logging.disable(logging.WARNING)
+        sys.stdout = open(os.devnull, "w")
+
+        from GetUserMiID import obtener_rango_fechas_enrolamiento, obtener_usuarios_por_rango
+        from flujo_usuario_inteligente import obtener_sesion
+
+        mediciones = _Mediciones()
+        inicio = time.perf_counter()
+
+        marca = time.perf_counter()
+        desde, hasta = obtener_rango_fechas_enrolamiento()
+        # El rango es exclusivo al final: +1 s para incluir el último enrolamiento
+        usuarios = obtener_usuarios_por_rango(desde, hasta + timedelta(seconds=1))
+        mediciones.etapas['miid'].append(time.perf_counter() - marca)
+
+        sesion = obtener_sesion()
+        procesar = _crear_procesador(mediciones, sesion)
+        MODOS[escenario['modo']](usuarios, procesar, escenario)
+        duracion = time.perf_counter() - inicio
+
+        salida.put({
+            'usuarios_leidos': len(usuarios),
+            'duracion': duracion,
+            'exitos': mediciones.exitos,
+            'fallos': mediciones.fallos,
+            'descargas': mediciones.descargas,
+            'etapas': {etapa: resumen_latencias(valores) for etapa, valores in mediciones.etapas.items()},
+            'rss_pico_mb': rss_pico_mb(),
+        })
+    except Exception as e:
+        import traceback
+        salida.put({'error': f"{e}\n{traceback.format_exc()}"})
+
+
+def _esperar_resultado(proceso, salida, limite: float) -> Dict[str, Any]:
+    """
+    Espera las mediciones del hijo sin colgarse si muere sin responder
+    (crash, OOM, señal) o si el escenario supera `limite` segundos.
+    """
+    vence = time.monotonic() + limite
+    while True:
+        try:
+            return salida.get(timeout=INTERVALO_ESPERA)
+        except queue.Empty:
+            pass
+        if not proceso.is_alive():
+            # Pudo haber puesto el resultado justo antes de terminar
+            try:
+                return salida.get(timeout=INTERVALO_ESPERA)
+            except queue.Empty:
+                raise RuntimeError(f"El proceso hijo terminó sin resultados (exitcode {proceso.exitcode})")
+        if time.monotonic() >= vence:
+            proceso.terminate()
+            proceso.join()
+            raise RuntimeError(f"El escenario superó el límite de {limite:.0f} s")
+
+
+def ejecutar_escenario(modo: str, usuarios: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Prepara datos y servidores, corre el flujo en un proceso hijo y junta los resultados."""
+    from datos_locales import ServidorImagenes
+    from simulador_controlid import SimuladorControlId
+
+    carpeta_datos = preparar_datos(usuarios, args.semilla)
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_sync_") as temporal, \
+            ServidorImagenes(carpeta_datos / "imagenes", puerto=0) as servidor_imagenes, \
+            SimuladorControlId(latencia=args.latencia, jitter=args.jitter, tasa_error=args.tasa_error,
+                               semilla=args.semilla) as simulador:
+        # Copia de la base con las URLs apuntando al servidor de imágenes de este escenario
+        ruta_datos = Path(temporal) / "datos.db"
+        shutil.copy(carpeta_datos / "datos.db", ruta_datos)
+        conexion = sqlite3.connect(str(ruta_datos))
+        conexion.execute(
+            "UPDATE match_id_img_face SET IMAGE_URL = REPLACE(IMAGE_URL, ?, ?)",
+            (URL_IMAGENES_SEMBRADAS, servidor_imagenes.url),
+        )
+        conexion.commit()
+        conexion.close()
+
+        escenario = {
+            'modo': modo,
+            'workers': args.workers,
+            'max_en_vuelo': args.max_en_vuelo,
+            'solicitudes_por_segundo': args.solicitudes_por_segundo,
+            'url_controlid': simulador.url,
+            'ruta_datos': str(ruta_datos),
+            'carpeta_temp': str(Path(temporal) / "imagenes"),
+        }
+
+        contexto = multiprocessing.get_context("spawn")
+        salida = contexto.Queue()
+        proceso = contexto.Process(target=_ejecutar_en_hijo, args=(escenario, salida))
+        proceso.start()
+        try:
+            resultado = _esperar_resultado(proceso, salida, args.timeout)
+        finally:
+            proceso.join()
+
+        if 'error' in resultado:
+            raise RuntimeError(f"Falló el escenario {modo}/{usuarios}: {resultado['error']}")
+
+        estadisticas = simulador.estadisticas()
+
+    resultado.update({
+        'modo': modo,
+        'usuarios': usuarios,
+        'workers': args.workers if modo != 'secuencial' else 1,
+        'usuarios_por_segundo': resultado['exitos'] / resultado['duracion'] if resultado['duracion'] else 0.0,
+        'solicitudes_http': {
+            'controlid': estadisticas['solicitudes'],
+            'controlid_total': sum(estadisticas['solicitudes'].values()),
+            'controlid_errores': estadisticas['errores'],
+            'imagenes': resultado['descargas'],
+        },
+    })
+    resultado['usuarios_por_minuto'] = resultado['usuarios_por_segundo'] * 60
+    return resultado
+
+
+def imprimir_resultado(resultado: Dict[str, Any], anterior: Optional[Dict[str, Any]] = None) -> None:
+    comparacion = ""
+    if anterior and anterior.get('usuarios_por_segundo'):
+        cambio = (resultado['usuarios_por_segundo'] / anterior['usuarios_por_segundo'] - 1) * 100
+        comparacion = f" ({cambio:+.1f}% vs anterior)"
+    rss = resultado['rss_pico_mb']
+    print(f"\n== {resultado['modo']} | {resultado['usuarios']} usuarios | {resultado['workers']} workers ==")
+    print(f"  {resultado['usuarios_por_segundo']:.1f} usuarios/s ({resultado['usuarios_por_minuto']:.0f}/min){comparacion}")
+    print(f"  éxitos {resultado['exitos']}, fallos {resultado['fallos']}, duración {resultado['duracion']:.1f} s, "
+          f"RSS pico {f'{rss:.0f} MB' if rss is not None else 'n/d'}")
+    print(f"  HTTP ControlId: {resultado['solicitudes_http']['controlid_total']} "
+          f"{resultado['solicitudes_http']['controlid']}, imágenes: {resultado['solicitudes_http']['imagenes']}")
+    print(f"  {'etapa':<10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for etapa in ETAPAS:
+        datos = resultado['etapas'][etapa]
+        if datos['n']:
+            print(f"  {etapa:<10} {datos['p50'] * 1000:>9.1f} {datos['p95'] * 1000:>9.1f} {datos['p99'] * 1000:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta de la sincronización")
+    parser.add_argument("--escalas", default="100,1000,10000", help="Cantidades de enrolamientos separadas por coma")
+    parser.add_argument("--modos", default=",".join(MODOS), help=f"Modos separados por coma ({', '.join(MODOS)})")
+    parser.add_argument("--workers", type=int, default=2, help="Workers de la cola")
+    parser.add_argument("--max-en-vuelo", type=int, default=2, help="Solicitudes simultáneas por equipo")
+    parser.add_argument("--solicitudes-por-segundo", type=float, default=0,
+                        help="Límite de solicitudes/s al equipo (0 = sin límite)")
+    parser.add_argument("--latencia", type=float, default=0.0, help="Latencia simulada del equipo en segundos")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--tasa-error", type=float, default=0.0)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=3600,
+                        help="Segundos máximos por escenario antes de abortarlo")
+    parser.add_argument("--salida", type=Path, default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", type=Path, default=None, help="Resultados anteriores para comparar")
+    args = parser.parse_args()
+
+    escalas = [int(valor) for valor in args.escalas.split(",") if valor.strip()]
+    modos = [valor.strip() for valor in args.modos.split(",") if valor.strip()]
+    desconocidos = [modo for modo in modos if modo not in MODOS]
+    if desconocidos:
+        parser.error(f"Modos desconocidos: {', '.join(desconocidos)}")
+
+    anteriores = {}
+    if args.comparar:
+        for resultado in cargar_resultados(args.comparar)['resultados']:
+            anteriores[(resultado['modo'], resultado['usuarios'])] = resultado
+
+    resultados = []
+    for usuarios in escalas:
+        for modo in modos:
+            resultado = ejecutar_escenario(modo, usuarios, args)
+            imprimir_resultado(resultado, anteriores.get((modo, usuarios)))
+            resultados.append(resultado)
+
+    parametros = {clave: (str(valor) if isinstance(valor, Path) else valor) for clave, valor in vars(args).items()}
+    ruta = guardar_resultados("sincronizacion", parametros, resultados, args.salida)
+    print(f"\nResultados guardados en {ruta}")
+
+
+if __name__ == "__main__":
+    main()
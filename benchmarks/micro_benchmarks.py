@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks de las funciones de parseo y búsqueda más usadas.
+
+Cada caso corre la función real del proyecto contra payloads sintéticos de
+tamaño creciente (sin red: la respuesta HTTP se sustituye por una ya armada)
+y reporta el tiempo por llamada y el exponente de crecimiento entre tamaños
+consecutivos: ~1 es lineal, bastante más de 1 indica comportamiento
+superlineal.
+
+Casos:
+- columnas_sp: descubrimiento de la columna de URL en procesar_resultado_sp
+- busqueda_registration: recorrido de usuarios en buscar_usuario_por_registration
+- membresia_grupos: recorrido de user_groups en crear_grupo_para_usuario
+- json_load_objects: decodificación de la respuesta de load_objects
+  (json.loads y requests.Response.json)
+
+Uso:
+    python benchmarks/micro_benchmarks.py --tamanos 100,1000,10000,100000
+    python benchmarks/micro_benchmarks.py --casos busqueda_registration --comparar benchmarks/resultados/<anterior>.json
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import math
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from utilidades import cargar_resultados, guardar_resultados, instalar_config
+
+# Exponente a partir del cual un caso se marca como superlineal
+UMBRAL_SUPERLINEAL = 1.3
+
+
+class _RespuestaFalsa:
+    """Respuesta HTTP ya decodificada, para medir solo el código del proyecto."""
+
+    def __init__(self, datos: Any, status_code: int = 200):
+        self._datos = datos
+        self.status_code = status_code
+        self.text = ""
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> Any:
+        return self._datos
+
+
+class _CursorFalso:
+    """Cursor con N columnas; la de la URL es la última (peor caso del recorrido)."""
+
+    def __init__(self, columnas: int):
+        self.description = [(f"COLUMNA_{i}",) for i in range(columnas - 1)] + [("IMAGE_URL",)]
+        self._fila = tuple(range(columnas - 1)) + ("http://imagenes/1.jpg",)
+
+    def fetchone(self):
+        return self._fila
+
+
+def _usuarios(n: int) -> List[Dict[str, Any]]:
+    return [
+        {'id': i + 1, 'name': f"Usuario {i}", 'registration': str(10000000 + i), 'password': "", 'salt': ""}
+        for i in range(n)
+    ]
+
+
+def _preparar_columnas_sp(n: int) -> Callable[[], Any]:
+    import download_image_to_sql_temp as descarga
+
+    cursor = _CursorFalso(n)
+    return lambda: descarga.procesar_resultado_sp(cursor)
+
+
+def _preparar_busqueda_registration(n: int) -> Callable[[], Any]:
+    import flujo_usuario_inteligente as flujo
+
+    respuesta = _RespuestaFalsa({'users': _usuarios(n)})
+    buscado = str(10000000 + n - 1)  # el último: recorrido completo
+
+    def llamar():
+        flujo._post_controlid = lambda url, idempotente=True, **kwargs: respuesta
+        return flujo.buscar_usuario_por_registration("sesion", buscado, "http://equipo")
+
+    return llamar
+
+
+def _preparar_membresia_grupos(n: int) -> Callable[[], Any]:
+    import flujo_usuario_inteligente as flujo
+
+    carga = _RespuestaFalsa({'user_groups': [{'user_id': i + 1, 'group_id': 1002} for i in range(n)]})
+    creacion = _RespuestaFalsa({'ids': []})
+
+    def post(url, idempotente=True, **kwargs):
+        return carga if url.endswith("load_objects.fcgi") else creacion
+
+    def llamar():
+        flujo._post_controlid = post
+        # Usuario sin grupo: recorre toda la lista y luego crea la relación
+        return flujo.crear_grupo_para_usuario("sesion", str(n + 1), 1002, "http://equipo")
+
+    return llamar
+
+
+def _preparar_json_load_objects(n: int) -> Callable[[], Any]:
+    import requests
+
+    contenido = json.dumps({'users': _usuarios(n)}).encode("utf-8")
+
+    def llamar():
+        json.loads(contenido)
+        respuesta = requests.Response()
+        respuesta._content = contenido
+        respuesta.status_code = 200
+        respuesta.headers['Content-Type'] = "application/json"
+        return respuesta.json()
+
+    return llamar
+
+
+CASOS: Dict[str, Callable[[int], Callable[[], Any]]] = {
+    'columnas_sp': _preparar_columnas_sp,
+    'busqueda_registration': _preparar_busqueda_registration,
+    'membresia_grupos': _preparar_membresia_grupos,
+    'json_load_objects': _preparar_json_load_objects,
+}
+
+
+def medir(llamar: Callable[[], Any], repeticiones: int, tiempo_minimo: float) -> Dict[str, float]:
+    """
+    Mide el tiempo por llamada: cada repetición ejecuta tantas llamadas como
+    hagan falta para durar al menos `tiempo_minimo`.
+    """
+    llamar()  # calentamiento
+
+    llamadas = 1
+    while True:
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            llamar()
+        duracion = time.perf_counter() - inicio
+        if duracion >= tiempo_minimo or llamadas >= 1_000_000:
+            break
+        llamadas *= 2
+
+    tiempos = [duracion / llamadas]
+    for _ in range(repeticiones - 1):
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            llamar()
+        tiempos.append((time.perf_counter() - inicio) / llamadas)
+
+    return {'minimo': min(tiempos), 'mediana': statistics.median(tiempos), 'llamadas': llamadas}
+
+
+def ejecutar_caso(nombre: str, tamanos: List[int], repeticiones: int, tiempo_minimo: float) -> Dict[str, Any]:
+    mediciones = []
+    for tamano in tamanos:
+        llamar = CASOS[nombre](tamano)
+        # Los prints de las funciones cuentan en el tiempo, pero no se muestran
+        with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+            resultado = medir(llamar, repeticiones, tiempo_minimo)
+        resultado['tamano'] = tamano
+        mediciones.append(resultado)
+
+    # Exponente de crecimiento entre tamaños consecutivos (t ~ n^k)
+    for anterior, actual in zip(mediciones, mediciones[1:]):
+        if anterior['minimo'] > 0 and actual['tamano'] != anterior['tamano']:
+            actual['exponente'] = (
+                math.log(actual['minimo'] / anterior['minimo']) / math.log(actual['tamano'] / anterior['tamano'])
+            )
+    return {'caso': nombre, 'mediciones': mediciones}
+
+
+def imprimir_caso(resultado: Dict[str, Any], anterior: Dict[str, Any] = None) -> None:
+    previos = {m['tamano']: m for m in (anterior or {}).get('mediciones', [])}
+    print(f"\n== {resultado['caso']} ==")
+    print(f"  {'tamaño':>8} {'µs/llamada':>12} {'exponente':>10}  comparación")
+    for medicion in resultado['mediciones']:
+        exponente = medicion.get('exponente')
+        texto_exponente = f"{exponente:.2f}" if exponente is not None else "-"
+        if exponente is not None and exponente > UMBRAL_SUPERLINEAL:
+            texto_exponente += " !"
+        comparacion = ""
+        previo = previos.get(medicion['tamano'])
+        if previo and previo['minimo']:
+            comparacion = f"{(medicion['minimo'] / previo['minimo'] - 1) * 100:+.1f}%"
+        print(f"  {medicion['tamano']:>8} {medicion['minimo'] * 1e6:>12.1f} {texto_exponente:>10}  {comparacion}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de parseo y búsqueda")
+    parser.add_argument("--tamanos", default="100,1000,10000,100000", help="Tamaños de payload separados por coma")
+    parser.add_argument("--casos", default=",".join(CASOS), help=f"Casos separados por coma ({', '.join(CASOS)})")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--tiempo-minimo", type=float, default=0.2, help="Segundos mínimos por repetición")
+    parser.add_argument("--salida", type=Path, default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", type=Path, default=None, help="Resultados anteriores para comparar")
+    args = parser.parse_args()
+
+    tamanos = [int(valor) for valor in args.tamanos.split(",") if valor.strip()]
+    casos = [valor.strip() for valor in args.casos.split(",") if valor.strip()]
+    desconocidos = [caso for caso in casos if caso not in CASOS]
+    if desconocidos:
+        parser.error(f"Casos desconocidos: {', '.join(desconocidos)}")
+
+    instalar_config(
+        CONTROL_ID_CONFIG={'base_url': "http://equipo", 'login': "admin", 'password': "admin"},
+        MIID_CONFIG={},
+        AZURE_CONFIG={'stored_procedure': "", 'business_context': ""},
+        CARPETAS_CONFIG={'carpeta_local_temp': ".", 'extension_imagen': ".jpg"},
+    )
+    # Los mensajes se siguen formateando (como en producción) pero no se emiten
+    logging.disable(logging.WARNING)
+
+    anteriores = {}
+    if args.comparar:
+        anteriores = {r['caso']: r for r in cargar_resultados(args.comparar)['resultados']}
+
+    resultados = []
+    for caso in casos:
+        resultado = ejecutar_caso(caso, tamanos, args.repeticiones, args.tiempo_minimo)
+        imprimir_caso(resultado, anteriores.get(caso))
+        resultados.append(resultado)
+
+    parametros = {clave: (str(valor) if isinstance(valor, Path) else valor) for clave, valor in vars(args).items()}
+    ruta = guardar_resultados("micro", parametros, resultados, args.salida)
+    print(f"\nResultados guardados en {ruta}")
+
+
+if __name__ == "__main__":
+    main()
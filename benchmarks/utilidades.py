@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Utilidades compartidas por los benchmarks: percentiles, versión del código,
+memoria pico y guardado de resultados en JSON.
+"""
+
+import json
+import math
+import platform
+import subprocess
+import sys
+import types
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+RAIZ_PROYECTO = Path(__file__).resolve().parent.parent
+CARPETA_RESULTADOS = Path(__file__).resolve().parent / "resultados"
+
+# Los benchmarks importan los módulos del proyecto (estructura plana)
+if str(RAIZ_PROYECTO) not in sys.path:
+    sys.path.insert(0, str(RAIZ_PROYECTO))
+
+
+def instalar_config(**secciones: Any) -> None:
+    """
+    Registra un módulo `config` con las secciones dadas. Se llama antes de
+    importar los módulos del proyecto para que un benchmark nunca lea la
+    configuración de producción.
+    """
+    config = types.ModuleType("config")
+    for nombre, valor in secciones.items():
+        setattr(config, nombre, valor)
+    sys.modules['config'] = config
+
+
+def percentil(valores: Sequence[float], p: float) -> float:
+    """Percentil por rango más cercano (p entre 0 y 100)."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[min(indice, len(ordenados) - 1)]
+
+
+def resumen_latencias(valores: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, promedio y máximo de una lista de latencias (segundos)."""
+    if not valores:
+        return {'n': 0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'promedio': 0.0, 'maximo': 0.0}
+    return {
+        'n': len(valores),
+        'p50': percentil(valores, 50),
+        'p95': percentil(valores, 95),
+        'p99': percentil(valores, 99),
+        'promedio': sum(valores) / len(valores),
+        'maximo': max(valores),
+    }
+
+
+def rss_pico_mb() -> Optional[float]:
+    """Memoria residente pico del proceso en MB (None si la plataforma no la expone)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB; macOS, bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def version_codigo() -> str:
+    """Commit actual (con -dirty si hay cambios) para comparar resultados entre versiones."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=RAIZ_PROYECTO, capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or "desconocida"
+    except Exception:
+        return "desconocida"
+
+
+def guardar_resultados(nombre: str, parametros: Dict[str, Any], resultados: List[Dict[str, Any]],
+                       ruta: Optional[Path] = None) -> Path:
+    """
+    Guarda los resultados con metadatos de versión y plataforma.
+
+    Returns:
+        Ruta del archivo JSON escrito.
+    """
+    ahora = datetime.now()
+    if ruta is None:
+        CARPETA_RESULTADOS.mkdir(parents=True, exist_ok=True)
+        ruta = CARPETA_RESULTADOS / f"{nombre}_{ahora.strftime('%Y%m%d_%H%M%S')}.json"
+    documento = {
+        'benchmark': nombre,
+        'fecha': ahora.isoformat(timespec='seconds'),
+        'version': version_codigo(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'parametros': parametros,
+        'resultados': resultados,
+    }
+    Path(ruta).write_text(json.dumps(documento, indent=2, ensure_ascii=False), encoding="utf-8")
+    return Path(ruta)
+
+
+def cargar_resultados(ruta: Path) -> Dict[str, Any]:
+    return json.loads(Path(ruta).read_text(encoding="utf-8"))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché negativa de registros de MiID que no se pueden sincronizar.
+
+Un usuario sin nombre, sin URL de imagen en el SP o con una imagen rechazada
+por validacion_imagen no se arregla solo entre un ciclo y el siguiente: sin
+esta caché el loop de sincronización lo volvía a consultar (y a descargar de
+Azure) en cada ciclo. Cada registro conocido como inválido queda suprimido
+durante `ttl_segundos`, con el motivo, y después se vuelve a intentar una vez
+por si lo corrigieron en origen.
+
+Configuración opcional en config.py:
+    CACHE_NEGATIVA_CONFIG = {"ttl_segundos": 3600, "max_entradas": 10000}
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from metricas import registrar_cache
+
+try:
+    from config import CACHE_NEGATIVA_CONFIG
+except ImportError:
+    CACHE_NEGATIVA_CONFIG = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TTL_SEGUNDOS = 3600.0
+MAX_ENTRADAS = 10000
+
+# Motivos de supresión
+SIN_NOMBRE = "sin nombre"
+SIN_IMAGEN = "sin URL de imagen"
+IMAGEN_INVALIDA = "con imagen inválida"
+
+
+def clave_usuario(usuario: Dict[str, Any]) -> str:
+    """Clave documento/LPID: un reenrolamiento (LPID nuevo) no queda suprimido."""
+    return f"{usuario.get('documento')}/{usuario.get('lpid', '')}"
+
+
+class CacheNegativa:
+    """
+    Registros inválidos con vencimiento.
+
+    Args:
+        ttl_segundos: Tiempo que se suprime un registro antes de reintentarlo
+        max_entradas: Tope de registros recordados (se descartan los más viejos)
+    """
+
+    def __init__(self, ttl_segundos: float = TTL_SEGUNDOS, max_entradas: int = MAX_ENTRADAS):
+        self.ttl_segundos = float(ttl_segundos)
+        self.max_entradas = max(1, int(max_entradas))
+        self._entradas: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def registrar(self, usuario: Dict[str, Any], motivo: str) -> None:
+        """Suprime el registro durante el TTL."""
+        clave = clave_usuario(usuario)
+        with self._lock:
+            self._entradas.pop(clave, None)
+            self._entradas[clave] = (time.monotonic() + self.ttl_segundos, motivo)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        logger.info(f"Registro {clave} suprimido {self.ttl_segundos:.0f} s ({motivo})")
+
+    def motivo(self, usuario: Dict[str, Any]) -> Optional[str]:
+        """
+        Motivo por el que el registro está suprimido, o None si se puede procesar.
+        """
+        clave = clave_usuario(usuario)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada and entrada[0] <= time.monotonic():
+                del self._entradas[clave]
+                entrada = None
+        registrar_cache("negativa", entrada is not None)
+        return entrada[1] if entrada else None
+
+    def olvidar(self, usuario: Dict[str, Any]) -> None:
+        """Quita el registro (p. ej. el operador pide procesarlo explícitamente)."""
+        with self._lock:
+            self._entradas.pop(clave_usuario(usuario), None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entradas)
+
+
+def crear_cache_negativa() -> CacheNegativa:
+    """Caché con la configuración de CACHE_NEGATIVA_CONFIG."""
+    return CacheNegativa(
+        ttl_segundos=float(CACHE_NEGATIVA_CONFIG.get('ttl_segundos', TTL_SEGUNDOS)),
+        max_entradas=int(CACHE_NEGATIVA_CONFIG.get('max_entradas', MAX_ENTRADAS)),
+    )
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cola de trabajos persistente en SQLite (modo WAL) para la sincronización de
+usuarios.
+
+Semántica "al menos una vez": un trabajo reservado queda invisible durante el
+timeout de visibilidad; si el proceso muere antes de confirmarlo, vuelve a ser
+visible y otro consumidor lo retoma. Cada reserva incrementa el contador de
+intentos y, al superar el máximo, el trabajo pasa a la tabla de muertos
+(dead-letter) para revisión manual.
+
+Los trabajos se separan en carriles: el interactivo (acciones del operador en
+la GUI) se reserva antes que el de fondo (sincronización automática, backfill).
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Segundos que un trabajo reservado permanece invisible para otros consumidores
+TIMEOUT_VISIBILIDAD = 300
+
+# Intentos antes de mover un trabajo a la tabla de muertos
+MAX_INTENTOS = 5
+
+# Espera base (segundos) del backoff entre reintentos de un trabajo fallido
+ESPERA_REINTENTO_BASE = 5
+ESPERA_REINTENTO_MAXIMA = 600
+
+# Carriles de prioridad
+CARRIL_INTERACTIVO = "interactivo"
+CARRIL_FONDO = "fondo"
+
+# Banderas del payload que sobreviven a una fusión si cualquiera de los pedidos
+# las trae (p. ej. el primer sondeo marca el enrolamiento como nuevo para el SLO
+# y los siguientes, mientras el trabajo espera, ya no)
+CAMPOS_ACUMULADOS = ("enrolamiento_nuevo",)
+# Campos de los que se conserva el menor valor (el enrolamiento original)
+CAMPOS_MINIMOS = ("fecha_creacion",)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    clave TEXT,
+    payload TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    visible_desde REAL NOT NULL,
+    creado REAL NOT NULL,
+    ultimo_error TEXT,
+    carril TEXT NOT NULL DEFAULT 'fondo'
+);
+CREATE TABLE IF NOT EXISTS trabajos_muertos (
+    id INTEGER PRIMARY KEY,
+    clave TEXT,
+    payload TEXT NOT NULL,
+    intentos INTEGER NOT NULL,
+    creado REAL NOT NULL,
+    muerto_en REAL NOT NULL,
+    ultimo_error TEXT
+);
+"""
+
+
+def fusionar_payloads(anterior: Dict[str, Any], nuevo: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Payload de un trabajo fusionado: los datos más nuevos, sin perder las
+    banderas de CAMPOS_ACUMULADOS ni el menor valor de CAMPOS_MINIMOS.
+    Ambos payloads deben venir ya normalizados por JSON.
+    """
+    fusionado = dict(anterior)
+    fusionado.update(nuevo)
+    for campo in CAMPOS_ACUMULADOS:
+        if anterior.get(campo) or nuevo.get(campo):
+            fusionado[campo] = True
+    for campo in CAMPOS_MINIMOS:
+        valores = [p[campo] for p in (anterior, nuevo) if p.get(campo) is not None]
+        if valores:
+            fusionado[campo] = min(valores)
+    return fusionado
+
+
+class ColaTrabajos:
+    """
+    Cola persistente de trabajos de sincronización.
+
+    Una única conexión compartida protegida por un lock: SQLite serializa las
+    escrituras de todos modos y así evitamos contención entre conexiones.
+    """
+
+    def __init__(self, ruta: Path, timeout_visibilidad: float = TIMEOUT_VISIBILIDAD,
+                 max_intentos: int = MAX_INTENTOS):
+        self.ruta = Path(ruta)
+        self.timeout_visibilidad = timeout_visibilidad
+        self.max_intentos = max_intentos
+        self._lock = threading.Lock()
+
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._conexion = sqlite3.connect(str(self.ruta), check_same_thread=False, isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        # NORMAL en WAL es durable ante caídas del proceso y mucho más rápido que FULL
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.executescript(_ESQUEMA)
+        self._migrar()
+
+        pendientes = self.pendientes()
+        if pendientes:
+            logger.info(f"Cola de trabajos recuperada con {pendientes} trabajos pendientes")
+
+    def _migrar(self) -> None:
+        """Agrega columnas nuevas a colas creadas por versiones anteriores."""
+        columnas = {fila[1] for fila in self._conexion.execute("PRAGMA table_info(trabajos)")}
+        if 'carril' not in columnas:
+            self._conexion.execute(f"ALTER TABLE trabajos ADD COLUMN carril TEXT NOT NULL DEFAULT '{CARRIL_FONDO}'")
+        self._conexion.execute(
+            "CREATE INDEX IF NOT EXISTS idx_trabajos_carril ON trabajos (carril, visible_desde, id)"
+        )
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_clave ON trabajos (clave)")
+
+    def encolar(self, payload: Dict[str, Any], clave: Optional[str] = None,
+                carril: str = CARRIL_FONDO) -> int:
+        """
+        Agrega un trabajo a la cola.
+
+        Args:
+            payload: Datos del trabajo (se serializan a JSON)
+            clave: Identificador de negocio (p. ej. documento) para diagnóstico
+            carril: CARRIL_INTERACTIVO o CARRIL_FONDO
+
+        Returns:
+            ID del trabajo encolado.
+        """
+        ahora = time.time()
+        with self._lock:
+            cursor = self._conexion.execute(
+                "INSERT INTO trabajos (clave, payload, visible_desde, creado, carril) VALUES (?, ?, ?, ?, ?)",
+                (clave, json.dumps(payload, default=str), ahora, ahora, carril),
+            )
+            return cursor.lastrowid
+
+    def encolar_o_fusionar(self, payload: Dict[str, Any], clave: str,
+                           carril: str = CARRIL_FONDO) -> Tuple[int, bool]:
+        """
+        Encola un trabajo, salvo que ya haya uno con la misma clave que todavía
+        no empezó: en ese caso se fusiona con él (ver fusionar_payloads) y, si el
+        nuevo pedido es interactivo, el trabajo pasa al carril interactivo.
+
+        Returns:
+            (ID del trabajo, True si se fusionó con uno existente).
+        """
+        ahora = time.time()
+        datos = json.dumps(payload, default=str)
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                fila = self._conexion.execute(
+                    "SELECT id, carril, payload FROM trabajos WHERE clave = ? AND intentos = 0 ORDER BY id LIMIT 1",
+                    (clave,),
+                ).fetchone()
+                if fila:
+                    trabajo_id, carril_actual, payload_actual = fila
+                    nuevo_carril = CARRIL_INTERACTIVO if CARRIL_INTERACTIVO in (carril, carril_actual) else carril_actual
+                    fusionado = fusionar_payloads(json.loads(payload_actual), json.loads(datos))
+                    self._conexion.execute(
+                        "UPDATE trabajos SET payload = ?, carril = ? WHERE id = ?",
+                        (json.dumps(fusionado), nuevo_carril, trabajo_id),
+                    )
+                else:
+                    trabajo_id = self._conexion.execute(
+                        "INSERT INTO trabajos (clave, payload, visible_desde, creado, carril) VALUES (?, ?, ?, ?, ?)",
+                        (clave, datos, ahora, ahora, carril),
+                    ).lastrowid
+                self._conexion.execute("COMMIT")
+            except Exception:
+                self._conexion.execute("ROLLBACK")
+                raise
+        return trabajo_id, bool(fila)
+
+    def encolar_lote(self, trabajos: Iterable[Dict[str, Any]], clave_campo: Optional[str] = None,
+                     carril: str = CARRIL_FONDO) -> int:
+        """
+        Encola muchos trabajos en una sola transacción (miles por segundo).
+
+        Args:
+            trabajos: Payloads a encolar
+            clave_campo: Campo del payload a usar como clave
+            carril: Carril de todos los trabajos del lote
+
+        Returns:
+            Cantidad de trabajos encolados.
+        """
+        ahora = time.time()
+        filas = [
+            (str(t.get(clave_campo)) if clave_campo else None, json.dumps(t, default=str), ahora, ahora, carril)
+            for t in trabajos
+        ]
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                self._conexion.executemany(
+                    "INSERT INTO trabajos (clave, payload, visible_desde, creado, carril) VALUES (?, ?, ?, ?, ?)",
+                    filas,
+                )
+                self._conexion.execute("COMMIT")
+            except Exception:
+                self._conexion.execute("ROLLBACK")
+                raise
+        return len(filas)
+
+    def reservar(self, carriles: Sequence[str] = (CARRIL_INTERACTIVO, CARRIL_FONDO)) -> Optional[Dict[str, Any]]:
+        """
+        Reserva el trabajo visible más antiguo del primer carril (en el orden
+        dado) que tenga trabajos, y lo oculta durante el timeout de visibilidad.
+
+        Args:
+            carriles: Carriles a revisar, en orden de preferencia
+
+        Returns:
+            Diccionario con id, clave, payload, intentos, carril y creado, o
+            None si no hay trabajos.
+        """
+        ahora = time.time()
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                fila = None
+                for carril in carriles:
+                    fila = self._conexion.execute(
+                        "SELECT id, clave, payload, intentos, carril, creado FROM trabajos "
+                        "WHERE carril = ? AND visible_desde <= ? ORDER BY id LIMIT 1",
+                        (carril, ahora),
+                    ).fetchone()
+                    if fila:
+                        break
+                if not fila:
+                    self._conexion.execute("COMMIT")
+                    return None
+
+                trabajo_id, clave, payload, intentos, carril, creado = fila
+                self._conexion.execute(
+                    "UPDATE trabajos SET intentos = intentos + 1, visible_desde = ? WHERE id = ?",
+                    (ahora + self.timeout_visibilidad, trabajo_id),
+                )
+                self._conexion.execute("COMMIT")
+            except Exception:
+                self._conexion.execute("ROLLBACK")
+                raise
+
+        return {
+            'id': trabajo_id,
+            'clave': clave,
+            'payload': json.loads(payload),
+            'intentos': intentos + 1,
+            'carril': carril,
+            'creado': creado,
+        }
+
+    def confirmar(self, trabajo_id: int) -> None:
+        """Marca un trabajo como completado y lo elimina de la cola."""
+        with self._lock:
+            self._conexion.execute("DELETE FROM trabajos WHERE id = ?", (trabajo_id,))
+
+    def fallar(self, trabajo_id: int, error: str = "") -> bool:
+        """
+        Registra el fallo de un trabajo reservado. Si aún tiene intentos, vuelve
+        a ser visible tras un backoff exponencial; si no, pasa a la tabla de muertos.
+
+        Returns:
+            True si el trabajo se reintentará, False si se movió a muertos.
+        """
+        ahora = time.time()
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                fila = self._conexion.execute(
+                    "SELECT clave, payload, intentos, creado FROM trabajos WHERE id = ?",
+                    (trabajo_id,),
+                ).fetchone()
+                if not fila:
+                    self._conexion.execute("COMMIT")
+                    return False
+
+                clave, payload, intentos, creado = fila
+                if intentos >= self.max_intentos:
+                    self._conexion.execute(
+                        "INSERT OR REPLACE INTO trabajos_muertos "
+                        "(id, clave, payload, intentos, creado, muerto_en, ultimo_error) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (trabajo_id, clave, payload, intentos, creado, ahora, error),
+                    )
+                    self._conexion.execute("DELETE FROM trabajos WHERE id = ?", (trabajo_id,))
+                    self._conexion.execute("COMMIT")
+                    logger.warning(f"Trabajo {trabajo_id} ({clave}) movido a muertos tras {intentos} intentos: {error}")
+                    return False
+
+                espera = min(ESPERA_REINTENTO_BASE * (2 ** (intentos - 1)), ESPERA_REINTENTO_MAXIMA)
+                self._conexion.execute(
+                    "UPDATE trabajos SET visible_desde = ?, ultimo_error = ? WHERE id = ?",
+                    (ahora + espera, error, trabajo_id),
+                )
+                self._conexion.execute("COMMIT")
+            except Exception:
+                self._conexion.execute("ROLLBACK")
+                raise
+
+        logger.info(f"Trabajo {trabajo_id} ({clave}) se reintentará en {espera:.0f} s")
+        return True
+
+    def pendientes(self, carril: Optional[str] = None) -> int:
+        """Cantidad de trabajos en la cola (visibles o reservados), opcionalmente de un carril."""
+        with self._lock:
+            if carril:
+                return self._conexion.execute(
+                    "SELECT COUNT(*) FROM trabajos WHERE carril = ?", (carril,)
+                ).fetchone()[0]
+            return self._conexion.execute("SELECT COUNT(*) FROM trabajos").fetchone()[0]
+
+    def muertos(self, limite: int = 100) -> List[Dict[str, Any]]:
+        """Lista los trabajos de la tabla de muertos, más recientes primero."""
+        with self._lock:
+            filas = self._conexion.execute(
+                "SELECT id, clave, payload, intentos, muerto_en, ultimo_error FROM trabajos_muertos "
+                "ORDER BY muerto_en DESC LIMIT ?",
+                (limite,),
+            ).fetchall()
+        return [
+            {
+                'id': trabajo_id,
+                'clave': clave,
+                'payload': json.loads(payload),
+                'intentos': intentos,
+                'muerto_en': muerto_en,
+                'ultimo_error': ultimo_error,
+            }
+            for trabajo_id, clave, payload, intentos, muerto_en, ultimo_error in filas
+        ]
+
+    def reencolar_muerto(self, trabajo_id: int) -> bool:
+        """Devuelve un trabajo muerto a la cola con el contador de intentos en cero."""
+        ahora = time.time()
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                fila = self._conexion.execute(
+                    "SELECT clave, payload FROM trabajos_muertos WHERE id = ?", (trabajo_id,)
+                ).fetchone()
+                if not fila:
+                    self._conexion.execute("COMMIT")
+                    return False
+                self._conexion.execute(
+                    "INSERT INTO trabajos (clave, payload, visible_desde, creado) VALUES (?, ?, ?, ?)",
+                    (fila[0], fila[1], ahora, ahora),
+                )
+                self._conexion.execute("DELETE FROM trabajos_muertos WHERE id = ?", (trabajo_id,))
+                self._conexion.execute("COMMIT")
+            except Exception:
+                self._conexion.execute("ROLLBACK")
+                raise
+        return True
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conexion.close()
+
+
+def _verificar_fusion() -> None:
+    """
+    Chequeo rápido: un re-encolado del mismo documento mientras el trabajo
+    espera no debe borrar la marca de enrolamiento nuevo ni la fecha original.
+    """
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        cola = ColaTrabajos(Path(carpeta) / "cola.db")
+        try:
+            primero = {'documento': "1", 'fecha_creacion': "2024-01-01 10:00:00", 'enrolamiento_nuevo': True}
+            sondeo = {'documento': "1", 'fecha_creacion': "2024-01-01 10:00:05", 'enrolamiento_nuevo': False}
+            trabajo_id, _ = cola.encolar_o_fusionar(primero, clave="1")
+            assert cola.encolar_o_fusionar(sondeo, clave="1") == (trabajo_id, True)
+            payload = cola.reservar()['payload']
+            assert payload['enrolamiento_nuevo'] is True, payload
+            assert payload['fecha_creacion'] == primero['fecha_creacion'], payload
+        finally:
+            cola.cerrar()
+    print("Fusión de trabajos: OK")
+
+
+if __name__ == "__main__":
+    _verificar_fusion()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Apertura de conexiones en paralelo, midiendo la latencia de cada una.
+
+Se usa al arrancar la GUI para calentar MiID, Azure SQL y los equipos
+ControlId a la vez (en lugar de pagar cada conexión en serie dentro del
+primer ciclo de sincronización) y para el diagnóstico de conexiones.
+
+Cada tarea es una función sin argumentos que abre (y deja en su pool) una
+conexión: devuelve un valor verdadero si tuvo éxito.
+
+Las pruebas de conexión (`probar_conexiones`) miden además cada fase por
+separado (DNS, TCP, TLS, autenticación y primera consulta) con los valores
+que se le pasen, sin tocar config.py ni los pools en uso.
+"""
+
+import logging
+import socket
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Segundos máximos de espera por el conjunto de conexiones
+TIMEOUT_CONEXIONES = 30.0
+
+
+def abrir_y_devolver(conectar: Callable[[], Any]) -> bool:
+    """
+    Abre una conexión de base de datos y la cierra enseguida: con pooling
+    (mysql.connector, ODBC) la conexión queda abierta en el pool, lista para
+    la primera consulta.
+    """
+    conexion = conectar()
+    if not conexion:
+        return False
+    conexion.close()
+    return True
+
+
+def medir_en_paralelo(tareas: Dict[str, Callable[[], Any]],
+                      timeout: float = TIMEOUT_CONEXIONES) -> Dict[str, Dict[str, Any]]:
+    """
+    Ejecuta todas las tareas a la vez.
+
+    Returns:
+        Por tarea: exito, latencia (segundos), error y valor devuelto.
+    """
+    resultados: Dict[str, Dict[str, Any]] = {}
+    if not tareas:
+        return resultados
+
+    def _medir(nombre: str, tarea: Callable[[], Any]) -> Dict[str, Any]:
+        inicio = time.perf_counter()
+        valor: Optional[Any] = None
+        error = ""
+        try:
+            valor = tarea()
+            if not valor:
+                error = "sin respuesta"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        latencia = time.perf_counter() - inicio
+        if error:
+            logger.warning(f"Conexión {nombre}: error en {latencia:.2f} s ({error})")
+        else:
+            logger.info(f"Conexión {nombre}: {latencia * 1000:.0f} ms")
+        return {'exito': not error, 'latencia': latencia, 'error': error, 'valor': valor}
+
+    executor = ThreadPoolExecutor(max_workers=len(tareas), thread_name_prefix="conexion")
+    futuros = {nombre: executor.submit(_medir, nombre, tarea) for nombre, tarea in tareas.items()}
+    wait(futuros.values(), timeout=timeout)
+    # Sin esperar a las que siguen colgadas: se reportan como timeout
+    executor.shutdown(wait=False)
+
+    for nombre, futuro in futuros.items():
+        if futuro.done():
+            resultados[nombre] = futuro.result()
+        else:
+            resultados[nombre] = {'exito': False, 'latencia': timeout, 'error': "timeout", 'valor': None}
+    return resultados
+
+
+# Fases medidas por cada prueba de conexión, en orden
+FASES = ("DNS", "TCP", "TLS", "Autenticación", "Primera consulta")
+
+# Timeout por operación de las pruebas (segundos)
+TIMEOUT_PRUEBA = 10.0
+
+# Puerto por defecto de Azure SQL
+PUERTO_SQL_SERVER = 1433
+
+
+class Sondeo:
+    """
+    Resultado de una prueba de conexión: duración de cada fase, notas de las
+    fases que no aplican y el error de la fase que falló.
+    """
+
+    def __init__(self, servicio: str):
+        self.servicio = servicio
+        self.fases: Dict[str, float] = {}
+        self.notas: Dict[str, str] = {}
+        self.error = ""
+
+    @contextmanager
+    def fase(self, nombre: str) -> Iterator[None]:
+        """Mide una fase; si falla queda registrada con su error."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error = f"{nombre}: {e or type(e).__name__}"
+            raise
+        finally:
+            self.fases[nombre] = time.perf_counter() - inicio
+
+    def omitir(self, nombre: str, nota: str) -> None:
+        self.notas[nombre] = nota
+
+    @property
+    def exito(self) -> bool:
+        return not self.error
+
+    def __bool__(self) -> bool:
+        return self.exito
+
+    @property
+    def total(self) -> float:
+        return sum(self.fases.values())
+
+
+def _fases_red(sondeo: Sondeo, host: str, puerto: int, tls: bool, timeout: float) -> None:
+    """
+    DNS, TCP y (si `tls`) handshake TLS contra host:puerto en un socket
+    propio, para separar la red de lo que después hace el driver.
+    """
+    with sondeo.fase("DNS"):
+        direcciones = socket.getaddrinfo(host, puerto, type=socket.SOCK_STREAM)
+    familia, tipo, protocolo, _, direccion = direcciones[0]
+    conexion = socket.socket(familia, tipo, protocolo)
+    try:
+        conexion.settimeout(timeout)
+        with sondeo.fase("TCP"):
+            conexion.connect(direccion)
+        if tls:
+            with sondeo.fase("TLS"):
+                conexion = ssl.create_default_context().wrap_socket(conexion, server_hostname=host)
+        else:
+            sondeo.omitir("TLS", "sin TLS")
+    finally:
+        conexion.close()
+
+
+def _host_puerto_sql_server(servidor: str) -> tuple:
+    """'tcp:servidor.database.windows.net,1433' -> (host, puerto)."""
+    servidor = servidor.strip()
+    if servidor.lower().startswith("tcp:"):
+        servidor = servidor[4:]
+    host, _, puerto = servidor.partition(",")
+    return host.strip(), int(puerto) if puerto.strip() else PUERTO_SQL_SERVER
+
+
+def _primera_consulta(sondeo: Sondeo, conexion: Any) -> None:
+    """SELECT 1 con la conexión ya autenticada, que después se cierra."""
+    try:
+        with sondeo.fase("Primera consulta"):
+            cursor = conexion.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+    finally:
+        conexion.close()
+
+
+def _probar_fuente_local(sondeo: Sondeo) -> None:
+    """Con FUENTE_DATOS sqlite solo hay conexión y consulta local."""
+    from datos_locales import conectar_local
+
+    for nombre in ("DNS", "TCP", "TLS"):
+        sondeo.omitir(nombre, "fuente local")
+    with sondeo.fase("Autenticación"):
+        conexion = conectar_local()
+        if conexion is None:
+            raise ValueError("no se pudo abrir la fuente local")
+    _primera_consulta(sondeo, conexion)
+
+
+def _probar_miid(sondeo: Sondeo, miid: Dict[str, Any], timeout: float) -> None:
+    from datos_locales import usar_fuente_local
+
+    if usar_fuente_local():
+        _probar_fuente_local(sondeo)
+        return
+    _fases_red(sondeo, miid['host'], int(miid.get('port') or 3306), False, timeout)
+    # MySQL negocia TLS dentro de su protocolo: queda incluido en la autenticación
+    sondeo.omitir("TLS", "en autenticación")
+    import mysql.connector
+
+    with sondeo.fase("Autenticación"):
+        # Conexión directa (sin pool) para no mezclar la prueba con el pool en uso
+        conexion = mysql.connector.connect(
+            host=miid['host'], port=int(miid.get('port') or 3306), user=miid.get('user'),
+            password=miid.get('password'), database=miid.get('database') or None,
+            connection_timeout=int(timeout),
+        )
+    _primera_consulta(sondeo, conexion)
+
+
+def _probar_azure(sondeo: Sondeo, azure: Dict[str, Any], timeout: float) -> None:
+    from datos_locales import usar_fuente_local
+
+    if usar_fuente_local():
+        _probar_fuente_local(sondeo)
+        return
+    host, puerto = _host_puerto_sql_server(azure['servidor'])
+    _fases_red(sondeo, host, puerto, False, timeout)
+    # TDS negocia TLS dentro del prelogin: queda incluido en la autenticación
+    sondeo.omitir("TLS", "en autenticación")
+    from download_image_to_sql_temp import conectar_base_datos
+
+    with sondeo.fase("Autenticación"):
+        conexion = conectar_base_datos(azure['servidor'], azure['base_datos'], azure['usuario'], azure['contraseña'])
+    _primera_consulta(sondeo, conexion)
+
+
+def _probar_imagenes(sondeo: Sondeo, url: str, timeout: float) -> None:
+    partes = urlsplit(url)
+    if not partes.hostname:
+        raise ValueError(f"URL inválida: {url}")
+    tls = partes.scheme == "https"
+    _fases_red(sondeo, partes.hostname, partes.port or (443 if tls else 80), tls, timeout)
+    sondeo.omitir("Autenticación", "no aplica")
+    import requests
+
+    with sondeo.fase("Primera consulta"):
+        # Hasta el primer byte: los encabezados de la respuesta, sin bajar la imagen
+        respuesta = requests.get(url, stream=True, timeout=timeout)
+        respuesta.close()
+        if respuesta.status_code >= 500:
+            raise ValueError(f"HTTP {respuesta.status_code}")
+    if respuesta.status_code >= 400:
+        # El host respondió; el recurso de prueba puede no existir o ser privado
+        sondeo.omitir("Primera consulta", f"HTTP {respuesta.status_code}")
+
+
+def _probar_controlid(sondeo: Sondeo, control: Dict[str, Any], timeout: float) -> None:
+    base_url = control['base_url'].rstrip("/")
+    partes = urlsplit(base_url)
+    if not partes.hostname:
+        raise ValueError(f"URL inválida: {base_url}")
+    tls = partes.scheme == "https"
+    _fases_red(sondeo, partes.hostname, partes.port or (443 if tls else 80), tls, timeout)
+    import requests
+
+    # Sin limitador ni circuit breaker: se prueban valores aún no guardados
+    with requests.Session() as http:
+        with sondeo.fase("Autenticación"):
+            respuesta = http.post(
+                f"{base_url}/login.fcgi",
+                json={"login": control['login'], "password": control['password']},
+                timeout=timeout,
+            )
+            respuesta.raise_for_status()
+            sesion = respuesta.json().get('session')
+            if not sesion:
+                raise ValueError("login sin sesión")
+        with sondeo.fase("Primera consulta"):
+            respuesta = http.post(
+                f"{base_url}/load_objects.fcgi",
+                params={'session': sesion},
+                json={"object": "users", "limit": 1},
+                timeout=timeout,
+            )
+            respuesta.raise_for_status()
+
+
+def _sondear(servicio: str, prueba: Callable[..., None], *args: Any) -> Sondeo:
+    sondeo = Sondeo(servicio)
+    try:
+        prueba(sondeo, *args)
+    except Exception as e:
+        if not sondeo.error:
+            sondeo.error = str(e) or type(e).__name__
+        logger.warning(f"Prueba de {servicio} fallida: {sondeo.error}")
+    return sondeo
+
+
+def probar_conexiones(miid: Optional[Dict[str, Any]] = None, azure: Optional[Dict[str, Any]] = None,
+                      url_imagenes: str = "", control: Optional[Dict[str, Any]] = None,
+                      timeout: float = TIMEOUT_PRUEBA) -> List[Sondeo]:
+    """
+    Prueba en paralelo MiID, Azure SQL, el host de imágenes y el login de
+    ControlId con los valores indicados (p. ej. los del formulario sin guardar).
+    Los servicios sin datos no se prueban.
+
+    Returns:
+        Un Sondeo por servicio probado.
+    """
+    pruebas: Dict[str, Callable[[], Sondeo]] = {}
+    if miid and miid.get('host'):
+        pruebas["MiID"] = lambda: _sondear("MiID", _probar_miid, miid, timeout)
+    if azure and azure.get('servidor'):
+        pruebas["Azure SQL"] = lambda: _sondear("Azure SQL", _probar_azure, azure, timeout)
+    if url_imagenes:
+        pruebas["Imágenes"] = lambda: _sondear("Imágenes", _probar_imagenes, url_imagenes, timeout)
+    if control and control.get('base_url'):
+        pruebas["ControlId"] = lambda: _sondear("ControlId", _probar_controlid, control, timeout)
+
+    # Cada fase tiene su timeout; el total acota las que se cuelgan igual
+    resultados = medir_en_paralelo(pruebas, timeout=timeout * len(FASES))
+    sondeos = []
+    for nombre, resultado in resultados.items():
+        sondeo = resultado['valor']
+        if sondeo is None:
+            sondeo = Sondeo(nombre)
+            sondeo.error = resultado['error']
+        sondeos.append(sondeo)
+    return sondeos
+
+
+def tabla_sondeos(sondeos: List[Sondeo]) -> str:
+    """Tabla de texto (para fuente monoespaciada) con los ms de cada fase."""
+    columnas = ("Servicio",) + FASES + ("Total",)
+    filas = []
+    for sondeo in sondeos:
+        celdas = [sondeo.servicio]
+        for nombre in FASES:
+            if nombre in sondeo.fases and not sondeo.error.startswith(f"{nombre}:"):
+                celdas.append(f"{sondeo.fases[nombre] * 1000:.0f} ms")
+            elif nombre in sondeo.fases:
+                celdas.append("ERROR")
+            else:
+                celdas.append(sondeo.notas.get(nombre, "-"))
+        celdas.append(f"{sondeo.total * 1000:.0f} ms")
+        filas.append(celdas)
+
+    anchos = [max(len(fila[i]) for fila in [columnas] + filas) for i in range(len(columnas))]
+    lineas = [" | ".join(c.ljust(a) for c, a in zip(columnas, anchos))]
+    lineas.append("-+-".join("-" * a for a in anchos))
+    lineas.extend(" | ".join(c.ljust(a) for c, a in zip(fila, anchos)) for fila in filas)
+
+    errores = [f"{s.servicio}: {s.error}" for s in sondeos if s.error]
+    notas = [f"{s.servicio}: {s.notas['Primera consulta']}" for s in sondeos
+             if s.exito and 'Primera consulta' in s.fases and 'Primera consulta' in s.notas]
+    if errores:
+        lineas.append("")
+        lineas.append("Errores:")
+        lineas.extend(f"  {error}" for error in errores)
+    if notas:
+        lineas.append("")
+        lineas.append("Notas:")
+        lineas.extend(f"  {nota}" for nota in notas)
+    return "\n".join(lineas)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Carga única de config.py.
+
+El config.py externo (junto al ejecutable o en el directorio de trabajo)
+tiene prioridad sobre el empaquetado. Antes cada módulo que quería respetar
+esa prioridad volvía a ejecutar el archivo por su cuenta; ahora se ejecuta
+una sola vez y queda registrado como el módulo `config`, así que cualquier
+`from config import X` posterior recibe los mismos valores.
+
+Uso:
+    from configuracion import cargar_config
+    config = cargar_config()
+    MIID_CONFIG = config.MIID_CONFIG
+"""
+
+import importlib
+import sys
+import threading
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+from types import ModuleType
+from typing import Optional
+
+_config: Optional[ModuleType] = None
+_lock = threading.Lock()
+
+
+def ruta_config_externo() -> Path:
+    """config.py junto al ejecutable / en el directorio de trabajo."""
+    return Path.cwd() / "config.py"
+
+
+def ruta_datos(nombre: str) -> Path:
+    """
+    Ruta de un archivo que debe sobrevivir al reinicio (cola, outbox, registros).
+
+    En el ejecutable de PyInstaller (onefile) `Path(__file__).parent` es la
+    carpeta temporal _MEIPASS, que se borra al salir: los datos van junto al
+    ejecutable. Desde el código fuente, junto a los módulos como hasta ahora.
+    """
+    if getattr(sys, 'frozen', False):
+        return Path(sys.executable).resolve().parent / nombre
+    return Path(__file__).resolve().parent / nombre
+
+
+def _mismo_archivo(modulo: Optional[ModuleType], ruta: Path) -> bool:
+    archivo = getattr(modulo, '__file__', None)
+    try:
+        return bool(archivo) and Path(archivo).resolve() == ruta.resolve()
+    except OSError:
+        return False
+
+
+def cargar_config(recargar: bool = False) -> ModuleType:
+    """
+    Devuelve el módulo de configuración, cargándolo solo la primera vez (o
+    de nuevo si `recargar`, p. ej. después de que la GUI guarda config.py).
+
+    Raises:
+        ImportError: Si no hay config.py externo ni empaquetado.
+    """
+    global _config
+    if _config is not None and not recargar:
+        return _config
+
+    with _lock:
+        if _config is not None and not recargar:
+            return _config
+
+        externo = ruta_config_externo()
+        actual = sys.modules.get("config")
+        if externo.exists() and (recargar or not _mismo_archivo(actual, externo)):
+            spec = spec_from_file_location("config", str(externo))
+            if spec is None or spec.loader is None:
+                raise ImportError(f"No se pudo cargar {externo}")
+            modulo = module_from_spec(spec)
+            spec.loader.exec_module(modulo)
+            sys.modules["config"] = modulo
+        elif actual is not None:
+            modulo = importlib.reload(actual) if recargar else actual
+        else:
+            modulo = importlib.import_module("config")
+
+        _config = modulo
+        return modulo
+
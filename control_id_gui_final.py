@@ -5,14 +5,16 @@ GUI final para ControlId con CustomTkinter - Versión robusta con distribución
 """
 
 import customtkinter as ctk
+import multiprocessing
 import threading
 import time
 import logging
-from datetime import datetime
+import importlib
+from datetime import datetime, timedelta
 from pathlib import Path
 import json
 import sys
-from PIL import Image, ImageTk
+from configuracion import cargar_config, ruta_datos
 
 def resource_path(rel_path: str) -> str:
     try:
@@ -30,6 +32,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Workers que consumen la cola de sincronización
+WORKERS_SINCRONIZACION = 2
+
+# Filas del historial de actividad dibujadas (el resto del historial no tiene widgets)
+FILAS_ACTIVIDAD = 9
+
 """Diagnóstico fino de imports para evitar 'Modo Prueba' silencioso.
 Registramos exactamente qué módulo falla al empaquetar/ejecutar.
 """
@@ -49,99 +57,91 @@ def _safe_import(label, import_callable):
         IMPORT_ERRORS.append(msg)
         return None
 
-# Imports protegidos
-Safe_GetUserMiID = _safe_import("GetUserMiID", lambda: __import__("GetUserMiID", fromlist=["obtener_ultimo_usuario_midd"]))
-if Safe_GetUserMiID:
-    obtener_ultimo_usuario_midd = Safe_GetUserMiID.obtener_ultimo_usuario_midd
+# Configuración: config.py externo (junto al exe o cwd) o el empaquetado, una sola vez
+def _leer_config():
+    config = cargar_config()
+    return config.AZURE_CONFIG, config.CARPETAS_CONFIG, config.CONTROL_ID_CONFIG
 
-Safe_GetUserByDocument = _safe_import("GetUserByDocument", lambda: __import__("GetUserByDocument", fromlist=["buscar_usuario_por_documento"]))
-if Safe_GetUserByDocument:
-    buscar_usuario_por_documento = Safe_GetUserByDocument.buscar_usuario_por_documento
+_secciones_config = _safe_import("config", _leer_config)
+if _secciones_config is None and getattr(sys, "_MEIPASS", None):
+    # Fallback: config.py colocado como dato junto al ejecutable
+    sys.path.insert(0, sys._MEIPASS)
+    MODULES_LOADED = True
+    _secciones_config = _safe_import("config", _leer_config)
+if _secciones_config:
+    AZURE_CONFIG, CARPETAS_CONFIG, CONTROL_ID_CONFIG = _secciones_config
 
-Safe_flujo = _safe_import(
-    "flujo_usuario_inteligente",
-    lambda: __import__(
-        "flujo_usuario_inteligente",
-        fromlist=["obtener_sesion", "procesar_usuario_inteligente", "buscar_usuario_por_registration", "set_control_id_config", "crear_grupo_para_usuario"]
-    ),
+from cola_trabajos import ColaTrabajos, CARRIL_FONDO, CARRIL_INTERACTIVO
+from planificador import PlanificadorPrioridad
+from outbox_dispositivo import OutboxDispositivo, DrenadorOutbox
+from trazas import iniciar_traza
+from metricas import (
+    DURACION_CICLO,
+    PENDIENTES_OUTBOX,
+    PROFUNDIDAD_COLA,
+    USUARIOS_SINCRONIZADOS,
+    PublicadorInstantaneas,
+    iniciar_servidor_metricas,
 )
-if Safe_flujo:
-    obtener_sesion = Safe_flujo.obtener_sesion
-    procesar_usuario_inteligente = Safe_flujo.procesar_usuario_inteligente
-    buscar_usuario_por_registration = Safe_flujo.buscar_usuario_por_registration
-    set_control_id_config = Safe_flujo.set_control_id_config
-    crear_grupo_para_usuario = Safe_flujo.crear_grupo_para_usuario
+from slo_enrolamiento import crear_slo
+from intervalo_adaptativo import crear_intervalo
+from cache_negativa import IMAGEN_INVALIDA, SIN_IMAGEN, SIN_NOMBRE, crear_cache_negativa
+from validacion_imagen import motivo_rechazo
+from miniaturas import TAMANO_FILA, CacheMiniaturas
+from historial import EntradaHistorial, HistorialActividad
+from conexiones import abrir_y_devolver, medir_en_paralelo, probar_conexiones, tabla_sondeos
 
-Safe_download = _safe_import(
-    "download_image_to_sql_temp",
-    lambda: __import__(
-        "download_image_to_sql_temp",
-        fromlist=["conectar_base_datos", "ejecutar_stored_procedure", "procesar_resultado_sp", "descargar_imagen"]
-    ),
-)
-if Safe_download:
-    conectar_base_datos = Safe_download.conectar_base_datos
-    ejecutar_stored_procedure = Safe_download.ejecutar_stored_procedure
-    procesar_resultado_sp = Safe_download.procesar_resultado_sp
-    descargar_imagen = Safe_download.descargar_imagen
+# Módulos del proyecto que arrastran drivers pesados (mysql.connector, pyodbc,
+# requests). Se importan en cargar_modulos(), después de mostrar la ventana.
+# módulo -> {nombre global: atributo del módulo}
+IMPORTS_DIFERIDOS = {
+    "GetUserMiID": {"obtener_ultimo_usuario_midd": "obtener_ultimo_usuario_midd", "conectar_miid": "conectar_miid"},
+    "GetUserByDocument": {"buscar_usuario_por_documento": "buscar_usuario_por_documento"},
+    "flujo_usuario_inteligente": {
+        "obtener_sesion": "obtener_sesion",
+        "procesar_usuario_inteligente": "procesar_usuario_inteligente",
+        "buscar_usuario_por_registration": "buscar_usuario_por_registration",
+        "set_control_id_config": "set_control_id_config",
+        "crear_grupo_para_usuario": "crear_grupo_para_usuario",
+        "asignar_imagen_controlid": "asignar_imagen_usuario",
+    },
+    "download_image_to_sql_temp": {
+        "conectar_base_datos": "conectar_base_datos",
+        "ejecutar_stored_procedure": "ejecutar_stored_procedure",
+        "procesar_resultado_sp": "procesar_resultado_sp",
+        "descargar_imagen": "descargar_imagen",
+        "descargar_imagen_por_lpid": "descargar_imagen_por_lpid",
+        "obtener_url_imagen": "obtener_url_imagen",
+        "descargar_imagen_documento": "descargar_imagen_documento",
+        "ruta_imagen_documento": "ruta_imagen_documento",
+    },
+    "dispositivos": {"RegistroDispositivos": "RegistroDispositivos", "EjecutorFanOut": "EjecutorFanOut"},
+    "resiliencia": {"equipo_inalcanzable": "equipo_inalcanzable"},
+}
 
-Safe_config = _safe_import("config", lambda: __import__("config", fromlist=["AZURE_CONFIG", "CARPETAS_CONFIG", "CONTROL_ID_CONFIG"]))
-if Safe_config:
-    AZURE_CONFIG = Safe_config.AZURE_CONFIG
-    CARPETAS_CONFIG = Safe_config.CARPETAS_CONFIG
-    CONTROL_ID_CONFIG = Safe_config.CONTROL_ID_CONFIG
-    
-    # Intentar sobrescribir con un config externo (al lado del exe o cwd)
-    try:
-        from importlib.util import spec_from_file_location, module_from_spec
-        cfg_path = Path.cwd() / "config.py"
-        if cfg_path.exists():
-            spec = spec_from_file_location("config_external", str(cfg_path))
-            if spec and spec.loader:
-                mod = module_from_spec(spec)
-                spec.loader.exec_module(mod)
-                AZURE_CONFIG = getattr(mod, 'AZURE_CONFIG', AZURE_CONFIG)
-                CARPETAS_CONFIG = getattr(mod, 'CARPETAS_CONFIG', CARPETAS_CONFIG)
-                CONTROL_ID_CONFIG = getattr(mod, 'CONTROL_ID_CONFIG', CONTROL_ID_CONFIG)
-    except Exception as _e:
-        IMPORT_ERRORS.append(f"No se pudo cargar config externo: {_e}")
-else:
-    # Fallback: intentar cargar módulos .py colocados como datos junto al ejecutable
-    try:
-        meipass = getattr(sys, "_MEIPASS", None)
-        if meipass:
-            sys.path.insert(0, meipass)
-            # Reintentar imports locales
-            Safe_GetUserMiID = _safe_import("GetUserMiID", lambda: __import__("GetUserMiID", fromlist=["obtener_ultimo_usuario_midd"]))
-            if Safe_GetUserMiID:
-                obtener_ultimo_usuario_midd = Safe_GetUserMiID.obtener_ultimo_usuario_midd
-            Safe_GetUserByDocument = _safe_import("GetUserByDocument", lambda: __import__("GetUserByDocument", fromlist=["buscar_usuario_por_documento"]))
-            if Safe_GetUserByDocument:
-                buscar_usuario_por_documento = Safe_GetUserByDocument.buscar_usuario_por_documento
-            Safe_flujo = _safe_import(
-                "flujo_usuario_inteligente",
-                lambda: __import__("flujo_usuario_inteligente", fromlist=["obtener_sesion", "procesar_usuario_inteligente", "buscar_usuario_por_registration", "set_control_id_config", "crear_grupo_para_usuario"]))
-            if Safe_flujo:
-                obtener_sesion = Safe_flujo.obtener_sesion
-                procesar_usuario_inteligente = Safe_flujo.procesar_usuario_inteligente
-                buscar_usuario_por_registration = Safe_flujo.buscar_usuario_por_registration
-                set_control_id_config = Safe_flujo.set_control_id_config
-                crear_grupo_para_usuario = Safe_flujo.crear_grupo_para_usuario
-            Safe_download = _safe_import(
-                "download_image_to_sql_temp",
-                lambda: __import__("download_image_to_sql_temp", fromlist=["conectar_base_datos", "ejecutar_stored_procedure", "procesar_resultado_sp", "descargar_imagen"]))
-            if Safe_download:
-                conectar_base_datos = Safe_download.conectar_base_datos
-                ejecutar_stored_procedure = Safe_download.ejecutar_stored_procedure
-                procesar_resultado_sp = Safe_download.procesar_resultado_sp
-                descargar_imagen = Safe_download.descargar_imagen
-            Safe_config_retry = _safe_import("config", lambda: __import__("config", fromlist=["AZURE_CONFIG", "CARPETAS_CONFIG", "CONTROL_ID_CONFIG"]))
-            if Safe_config_retry:
-                AZURE_CONFIG = Safe_config_retry.AZURE_CONFIG
-                CARPETAS_CONFIG = Safe_config_retry.CARPETAS_CONFIG
-                CONTROL_ID_CONFIG = Safe_config_retry.CONTROL_ID_CONFIG
-    except Exception as _exc:
-        IMPORT_ERRORS.append(f"Fallback de _MEIPASS falló: {_exc}")
+_modulos_cargados = False
+
+def _importar_diferidos():
+    for modulo, nombres in IMPORTS_DIFERIDOS.items():
+        cargado = _safe_import(modulo, lambda modulo=modulo: importlib.import_module(modulo))
+        if cargado:
+            for nombre, atributo in nombres.items():
+                globals()[nombre] = getattr(cargado, atributo)
+
+def cargar_modulos():
+    """Importar (una sola vez) los módulos con drivers y publicar sus funciones
+    como globales de este módulo. Devuelve MODULES_LOADED."""
+    global MODULES_LOADED, _modulos_cargados
+    if _modulos_cargados:
+        return MODULES_LOADED
+    _importar_diferidos()
+    if not MODULES_LOADED and getattr(sys, "_MEIPASS", None):
+        # Fallback: módulos .py colocados como datos junto al ejecutable
+        sys.path.insert(0, sys._MEIPASS)
+        MODULES_LOADED = _secciones_config is not None
+        _importar_diferidos()
+    _modulos_cargados = True
+    return MODULES_LOADED
 
 class ControlIdGUI:
     def __init__(self):
@@ -155,13 +155,13 @@ class ControlIdGUI:
             # Crear ventana principal
             self.root = ctk.CTk()
             self.root.title("ControlId - Gestión de Usuarios")
-            self.root.geometry("1000x700")
+            self.root.geometry("1380x700")
             
             # Centrar la ventana en la pantalla
             self.root.update_idletasks()
-            x = (self.root.winfo_screenwidth() // 2) - (1000 // 2)
+            x = (self.root.winfo_screenwidth() // 2) - (1380 // 2)
             y = (self.root.winfo_screenheight() // 2) - (700 // 2)
-            self.root.geometry(f"1000x700+{x}+{y}")
+            self.root.geometry(f"1380x700+{x}+{y}")
             
             # Variables de control
             self.sync_running = False
@@ -170,28 +170,88 @@ class ControlIdGUI:
             self.current_user = None
             self.user_image = None
             
+            # Registro de equipos y fan-out (solo si hay más de uno configurado)
+            self.registro = None
+            self.fan_out = None
+            
+            # Outbox de usuarios pendientes para equipos caídos; se drena a tasa
+            # controlada cuando el equipo vuelve
+            self.outbox = OutboxDispositivo(ruta_datos("outbox_equipos.db"))
+            self.drenador_outbox = DrenadorOutbox(self.outbox, self.enviar_desde_outbox, log=self.log_message)
+            
+            # Tiempo desde el enrolamiento en MiID hasta la imagen en un equipo
+            self.slo = crear_slo(log=self.log_message)
+            # Espera entre consultas a MiID: mínima con enrolamientos, crece sin novedades
+            self.intervalo = crear_intervalo()
+            self.ultimo_enrolamiento_visto = None
+            # Registros sin nombre o sin imagen: no se reintentan en cada ciclo
+            self.cache_negativa = crear_cache_negativa()
+            
+            # Instantánea de métricas para el panel de rendimiento (1 por segundo)
+            self.publicador_metricas = PublicadorInstantaneas()
+            
+            # Miniaturas de la vista previa (memoria + disco), decodificadas fuera del hilo de Tk
+            self.miniaturas = CacheMiniaturas(ruta_datos("cache_miniaturas"))
+            self.imagen_pedida = None
+            
+            # Historial de usuarios sincronizados; la lista solo dibuja las filas visibles
+            self.historial = HistorialActividad()
+            self.actividad_inicio = 0
+            self.actividad_agregadas = 0
+            
+            # Cola persistente de usuarios pendientes de sincronizar, consumida
+            # por un pool de workers con carril interactivo y carril de fondo (más un
+            # worker reservado para el interactivo, ver planificador.WORKERS_INTERACTIVOS)
+            self.cola = ColaTrabajos(ruta_datos("cola_sincronizacion.db"))
+            self.planificador = PlanificadorPrioridad(
+                self.cola,
+                self.procesar_usuario,
+                workers=WORKERS_SINCRONIZACION,
+                puede_procesar=lambda: bool(self.session),
+                log=self.log_message,
+            )
+            
             print("Creando interfaz...")
             # Crear interfaz
             self.create_widgets()
             
+            # Los drivers de base de datos se cargan con la ventana ya visible
+            self.root.after(100, self.iniciar_servicios)
+            
+            print("GUI iniciada correctamente.")
+            
+        except Exception as e:
+            print(f"Error al inicializar GUI: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+    
+    def iniciar_servicios(self):
+        """Cargar los módulos con drivers, obtener la sesión inicial y arrancar los workers."""
+        try:
+            print("Cargando módulos...")
+            cargar_modulos()
+            
             print("Obteniendo sesión inicial...")
             # Obtener sesión inicial
             if MODULES_LOADED:
-                self.obtener_sesion_inicial()
+                self.configurar_dispositivos()
+                self.calentar_conexiones()
+                # Workers que consumen la cola (retoman lo que quedó pendiente)
+                self.planificador.iniciar()
+                self.drenador_outbox.iniciar()
+                self.iniciar_metricas()
+                pendientes = self.outbox.pendientes()
+                if pendientes:
+                    self.log_message(f"Outbox: {pendientes} envíos pendientes a equipos sin conexión")
             else:
                 self.log_message("Modo de prueba - Módulos no cargados")
                 if IMPORT_ERRORS:
                     for err in IMPORT_ERRORS:
                         self.log_message(err)
                 self.status_label.configure(text="Modo Prueba", text_color="orange")
-            
-            print("GUI iniciada correctamente.")
-            
         except Exception as e:
-            print(f"Error al inicializar GUI: {e}")
-            import traceback
-            traceback.print_exc()
-            sys.exit(1)
+            self.log_message(f"Error al iniciar servicios: {str(e)}")
     
     def create_widgets(self):
         """Crear todos los widgets de la interfaz."""
@@ -212,6 +272,11 @@ class ControlIdGUI:
         self.left_column = ctk.CTkFrame(self.main_container)
         self.left_column.pack(side="left", fill="both", expand=True, padx=(0, 10))
         
+        # Columna de actividad reciente (a la derecha de todo)
+        self.activity_column = ctk.CTkFrame(self.main_container, width=360)
+        self.activity_column.pack(side="right", fill="y", padx=(10, 0))
+        self.activity_column.pack_propagate(False)
+        
         # Columna derecha - Información del usuario
         self.right_column = ctk.CTkFrame(self.main_container)
         self.right_column.pack(side="right", fill="both", expand=True, padx=(10, 0))
@@ -220,12 +285,16 @@ class ControlIdGUI:
         self.create_connection_section()
         self.create_user_options_section()
         self.create_sync_section()
+        self.create_dashboard_section()
         
         # Crear sección de información del usuario en la columna derecha
         self.create_user_info_section()
         
         # Crear sección de logs debajo de la información del usuario
         self.create_log_section()
+        
+        # Historial de actividad reciente
+        self.create_activity_section()
     
     def create_connection_section(self):
         """Crear sección de estado de conexión."""
@@ -255,6 +324,15 @@ class ControlIdGUI:
         )
         self.status_desc_label.pack(pady=2)
         
+        # Latencia de cada conexión del calentamiento inicial
+        self.conexiones_label = ctk.CTkLabel(
+            self.connection_frame,
+            text="",
+            text_color="gray",
+            font=ctk.CTkFont(size=12)
+        )
+        self.conexiones_label.pack(pady=2)
+        
         self.refresh_btn = ctk.CTkButton(
             self.connection_frame,
             text="Actualizar Conexión",
@@ -340,12 +418,21 @@ class ControlIdGUI:
         # Descripción
         self.sync_desc_label = ctk.CTkLabel(
             self.sync_frame,
-            text="Ejecuta el proceso cada 5 segundos automáticamente.",
+            text=self.texto_intervalo(),
             text_color="gray",
             font=ctk.CTkFont(size=12)
         )
         self.sync_desc_label.pack(pady=2)
         
+        # SLO enrolamiento-puerta (ver slo_enrolamiento.py)
+        self.slo_label = ctk.CTkLabel(
+            self.sync_frame,
+            text=self.slo.resumen(),
+            text_color="gray",
+            font=ctk.CTkFont(size=12)
+        )
+        self.slo_label.pack(pady=2)
+        
         # Botón de sincronización
         self.sync_btn = ctk.CTkButton(
             self.sync_frame,
@@ -357,6 +444,82 @@ class ControlIdGUI:
         )
         self.sync_btn.pack(pady=10)
     
+    def create_dashboard_section(self):
+        """Crear panel de rendimiento (se refresca una vez por segundo)."""
+        self.dashboard_frame = ctk.CTkFrame(self.left_column)
+        self.dashboard_frame.pack(fill="x", padx=15, pady=10)
+        
+        self.dashboard_label = ctk.CTkLabel(
+            self.dashboard_frame,
+            text="Rendimiento",
+            font=ctk.CTkFont(size=18, weight="bold")
+        )
+        self.dashboard_label.pack(pady=10)
+        
+        self.dashboard_labels = {}
+        for clave in ("throughput", "pendientes", "ciclo", "etapas", "caches", "equipos"):
+            label = ctk.CTkLabel(
+                self.dashboard_frame,
+                text="",
+                justify="left",
+                anchor="w",
+                font=ctk.CTkFont(size=12)
+            )
+            label.pack(fill="x", padx=15, pady=1)
+            self.dashboard_labels[clave] = label
+        
+        self.actualizar_dashboard()
+    
+    def texto_intervalo(self):
+        """Intervalo actual de consulta a MiID para la sección de sincronización."""
+        return (
+            f"Consulta MiID cada {self.intervalo.actual:.0f} s "
+            f"(adaptativo {self.intervalo.minimo:g}-{self.intervalo.maximo:g} s)"
+        )
+    
+    def actualizar_dashboard(self):
+        """Mostrar la última instantánea de métricas (no consulta el registro ni la cola)."""
+        try:
+            self.sync_desc_label.configure(text=self.texto_intervalo())
+            instantanea = self.publicador_metricas.instantanea()
+            if not instantanea:
+                self.dashboard_labels['throughput'].configure(text="Sin datos todavía")
+            else:
+                por_minuto = instantanea['usuarios_por_minuto']
+                self.dashboard_labels['throughput'].configure(
+                    text=f"Throughput: {por_minuto or 0:.1f} usuarios/min "
+                         f"(total {instantanea['usuarios_total']:.0f}, {instantanea['usuarios_error']:.0f} con error)"
+                )
+                self.dashboard_labels['pendientes'].configure(
+                    text=f"Pendientes: cola {instantanea['pendientes_cola']:.0f}, outbox {instantanea['pendientes_outbox']:.0f}"
+                )
+                ciclo = instantanea['duracion_ultimo_ciclo']
+                self.dashboard_labels['ciclo'].configure(
+                    text=f"Último ciclo: {ciclo:.2f} s" if ciclo is not None else "Último ciclo: -"
+                )
+                etapas = sorted(instantanea['etapas'].items())
+                self.dashboard_labels['etapas'].configure(
+                    text="Etapas (promedio):\n" + "\n".join(
+                        f"  {etapa}: {segundos * 1000:.0f} ms" for etapa, segundos in etapas
+                    ) if etapas else "Etapas (promedio): -"
+                )
+                caches = [
+                    f"{cache} {tasa * 100:.0f}%" for cache, (tasa, total) in sorted(instantanea['caches'].items())
+                    if tasa is not None
+                ]
+                self.dashboard_labels['caches'].configure(
+                    text="Aciertos de caché: " + (", ".join(caches) if caches else "-")
+                )
+                equipos = sorted(instantanea['errores_equipo'].items())
+                self.dashboard_labels['equipos'].configure(
+                    text="Errores por equipo (último minuto):\n" + "\n".join(
+                        f"  {equipo}: {tasa * 100:.1f}% de {total:.0f}" for equipo, (tasa, total) in equipos
+                    ) if equipos else "Errores por equipo: -"
+                )
+        except Exception as e:
+            print(f"Error al actualizar panel de rendimiento: {e}")
+        self.root.after(1000, self.actualizar_dashboard)
+    
     def create_user_info_section(self):
         """Crear sección de información del usuario."""
         self.user_info_frame = ctk.CTkFrame(self.right_column)
@@ -493,6 +656,158 @@ class ControlIdGUI:
         """Crear sección de log/resultados - Ya no se usa, los logs están en el panel de usuario."""
         pass
     
+    def create_activity_section(self):
+        """Crear la lista de actividad reciente.
+        
+        Se crean FILAS_ACTIVIDAD filas una sola vez y al desplazarse se les
+        cambia el contenido: el costo de memoria y de dibujo no depende de
+        cuántas entradas tenga el historial.
+        """
+        self.activity_label = ctk.CTkLabel(
+            self.activity_column,
+            text="Actividad Reciente",
+            font=ctk.CTkFont(size=18, weight="bold")
+        )
+        self.activity_label.pack(pady=10)
+        
+        self.activity_count_label = ctk.CTkLabel(
+            self.activity_column,
+            text="Sin usuarios sincronizados",
+            text_color="gray",
+            font=ctk.CTkFont(size=12)
+        )
+        self.activity_count_label.pack(pady=(0, 5))
+        
+        self.activity_list_frame = ctk.CTkFrame(self.activity_column)
+        self.activity_list_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        
+        self.activity_scrollbar = ctk.CTkScrollbar(self.activity_list_frame, command=self.desplazar_actividad)
+        self.activity_scrollbar.pack(side="right", fill="y")
+        
+        self.activity_rows = []
+        for _ in range(FILAS_ACTIVIDAD):
+            fila_frame = ctk.CTkFrame(self.activity_list_frame, height=50)
+            fila_frame.pack(fill="x", padx=5, pady=2)
+            
+            imagen_label = ctk.CTkLabel(fila_frame, text="", width=TAMANO_FILA[0], height=TAMANO_FILA[1])
+            imagen_label.pack(side="left", padx=5, pady=3)
+            
+            texto_label = ctk.CTkLabel(
+                fila_frame,
+                text="",
+                anchor="w",
+                justify="left",
+                font=ctk.CTkFont(size=11)
+            )
+            texto_label.pack(side="left", fill="x", expand=True, padx=5)
+            
+            for widget in (fila_frame, imagen_label, texto_label):
+                widget.bind("<MouseWheel>", self.rueda_actividad)
+                widget.bind("<Button-4>", self.rueda_actividad)
+                widget.bind("<Button-5>", self.rueda_actividad)
+            
+            self.activity_rows.append({
+                'frame': fila_frame,
+                'imagen': imagen_label,
+                'texto': texto_label,
+                'entrada': None,
+                'foto': None,
+            })
+        
+        self.activity_list_frame.bind("<MouseWheel>", self.rueda_actividad)
+        self.activity_list_frame.bind("<Button-4>", self.rueda_actividad)
+        self.activity_list_frame.bind("<Button-5>", self.rueda_actividad)
+        
+        self.root.after(500, self.actualizar_actividad)
+    
+    def actualizar_actividad(self):
+        """Redibujar la lista si llegaron entradas nuevas (dos veces por segundo)."""
+        try:
+            agregadas = self.historial.agregadas
+            if agregadas != self.actividad_agregadas:
+                # Desplazado hacia abajo: la vista sigue en las mismas entradas
+                if self.actividad_inicio > 0:
+                    self.actividad_inicio += agregadas - self.actividad_agregadas
+                self.actividad_agregadas = agregadas
+                self.refrescar_actividad()
+        except Exception as e:
+            print(f"Error al actualizar actividad reciente: {e}")
+        self.root.after(500, self.actualizar_actividad)
+    
+    def refrescar_actividad(self):
+        """Dibujar solo el tramo visible del historial."""
+        total = len(self.historial)
+        self.actividad_inicio = max(0, min(self.actividad_inicio, total - FILAS_ACTIVIDAD))
+        entradas = self.historial.tramo(self.actividad_inicio, FILAS_ACTIVIDAD)
+        
+        for fila, entrada in zip(self.activity_rows, entradas + [None] * (FILAS_ACTIVIDAD - len(entradas))):
+            if fila['entrada'] is entrada:
+                continue
+            fila['entrada'] = entrada
+            fila['foto'] = None
+            fila['imagen'].configure(image=None, text="")
+            if entrada is None:
+                fila['texto'].configure(text="")
+                continue
+            
+            estado = "OK" if entrada.exito else "ERROR"
+            fila['texto'].configure(
+                text=f"{estado}  {entrada.nombre}\n"
+                     f"{entrada.documento} · {datetime.fromtimestamp(entrada.momento).strftime('%H:%M:%S')}"
+                     f" · {entrada.duracion:.2f} s",
+                text_color="green" if entrada.exito else "red"
+            )
+            if entrada.ruta_imagen:
+                # Miniatura perezosa: solo para filas visibles y desde la caché de vista previa
+                self.miniaturas.obtener_async(
+                    entrada.ruta_imagen,
+                    lambda imagen, fila=fila, entrada=entrada: self.root.after(
+                        0, lambda: self.mostrar_miniatura_fila(fila, entrada, imagen)
+                    ),
+                    tamano=TAMANO_FILA,
+                    vigente=lambda fila=fila, entrada=entrada: fila['entrada'] is entrada
+                )
+            else:
+                fila['imagen'].configure(text="-")
+        
+        if total:
+            self.activity_count_label.configure(
+                text=f"{total} usuarios · {self.actividad_inicio + 1}-{self.actividad_inicio + len(entradas)}"
+            )
+            self.activity_scrollbar.set(self.actividad_inicio / total, (self.actividad_inicio + len(entradas)) / total)
+        else:
+            self.activity_scrollbar.set(0, 1)
+    
+    def mostrar_miniatura_fila(self, fila, entrada, imagen):
+        """Poner la miniatura en la fila si todavía muestra la misma entrada (hilo de Tk)."""
+        try:
+            if fila['entrada'] is not entrada or imagen is None:
+                return
+            from PIL import ImageTk
+            
+            foto = ImageTk.PhotoImage(imagen)
+            fila['imagen'].configure(image=foto, text="")
+            fila['foto'] = foto  # Mantener referencia
+        except Exception as e:
+            print(f"Error al mostrar miniatura: {e}")
+    
+    def desplazar_actividad(self, accion, cantidad, unidad=None):
+        """Comando de la barra de desplazamiento ('moveto' o 'scroll')."""
+        total = len(self.historial)
+        if accion == "moveto":
+            self.actividad_inicio = int(float(cantidad) * total)
+        elif accion == "scroll":
+            paso = FILAS_ACTIVIDAD if unidad == "pages" else 1
+            self.actividad_inicio += int(cantidad) * paso
+        self.refrescar_actividad()
+    
+    def rueda_actividad(self, event):
+        """Desplazar la lista con la rueda del mouse."""
+        if getattr(event, 'num', None) == 4 or getattr(event, 'delta', 0) > 0:
+            self.desplazar_actividad("scroll", -1, "units")
+        else:
+            self.desplazar_actividad("scroll", 1, "units")
+    
     def log_message(self, message):
         """Agregar mensaje al log."""
         try:
@@ -556,6 +871,57 @@ class ControlIdGUI:
         
         threading.Thread(target=obtener_sesion_thread, daemon=True).start()
     
+    def calentar_conexiones(self):
+        """Conectar a la vez a MiID, Azure SQL y los equipos ControlId, dejando
+        las conexiones en sus pools y la sesión lista para el primer ciclo."""
+        tareas = {
+            "ControlId": obtener_sesion,
+            "MiID": lambda: abrir_y_devolver(conectar_miid),
+            "Azure SQL": lambda: abrir_y_devolver(lambda: conectar_base_datos(
+                AZURE_CONFIG['servidor'],
+                AZURE_CONFIG['base_datos'],
+                AZURE_CONFIG['usuario'],
+                AZURE_CONFIG['contraseña']
+            )),
+        }
+        if self.fan_out:
+            # Varios equipos: cada uno guarda su sesión en el registro
+            for dispositivo in self.registro.dispositivos:
+                tareas[dispositivo['nombre']] = lambda dispositivo=dispositivo: self.registro.sesion(dispositivo)
+        
+        def calentar_thread():
+            try:
+                self.log_message("Conectando a MiID, Azure SQL y ControlId en paralelo...")
+                inicio = time.perf_counter()
+                resultados = medir_en_paralelo(tareas)
+                total = time.perf_counter() - inicio
+                
+                self.session = resultados['ControlId']['valor']
+                if self.session:
+                    self.status_label.configure(text="Conectado", text_color="green")
+                    self.log_message("Sesión obtenida exitosamente")
+                else:
+                    self.status_label.configure(text="Error de Conexión", text_color="red")
+                    self.log_message("Error al obtener sesión")
+                
+                partes = []
+                for nombre, resultado in resultados.items():
+                    if resultado['exito']:
+                        partes.append(f"{nombre} {resultado['latencia'] * 1000:.0f} ms")
+                    else:
+                        partes.append(f"{nombre} ERROR")
+                        self.log_message(f"  {nombre}: {resultado['error']}")
+                self.conexiones_label.configure(
+                    text=" · ".join(partes),
+                    text_color="gray" if all(r['exito'] for r in resultados.values()) else "orange"
+                )
+                self.log_message(f"Conexiones listas en {total:.2f} s: {', '.join(partes)}")
+            except Exception as e:
+                self.log_message(f"Error al calentar conexiones: {str(e)}")
+                self.status_label.configure(text="Error", text_color="red")
+        
+        threading.Thread(target=calentar_thread, daemon=True).start()
+    
     def cargar_ultimo_usuario(self):
         """Cargar el último usuario de MiID."""
         if not MODULES_LOADED:
@@ -576,7 +942,9 @@ class ControlIdGUI:
                         return
                     
                     self.log_message(f"Usuario obtenido: {usuario['nombre']} - {usuario['documento']}")
-                    self.procesar_usuario_completo(usuario)
+                    # El operador lo pide explícitamente: se reintenta aunque esté en la caché negativa
+                    self.cache_negativa.olvidar(usuario)
+                    self.procesar_usuario_completo(usuario, CARRIL_INTERACTIVO)
                 else:
                     self.log_message("No se pudo obtener usuario de MiID")
             except Exception as e:
@@ -610,7 +978,9 @@ class ControlIdGUI:
                         return
                     
                     self.log_message(f"Usuario encontrado: {usuario['nombre']} - {usuario['documento']}")
-                    self.procesar_usuario_completo(usuario)
+                    # El operador lo pide explícitamente: se reintenta aunque esté en la caché negativa
+                    self.cache_negativa.olvidar(usuario)
+                    self.procesar_usuario_completo(usuario, CARRIL_INTERACTIVO)
                 else:
                     self.log_message(f"No se encontró usuario con documento: {documento}")
             except Exception as e:
@@ -630,62 +1000,255 @@ class ControlIdGUI:
         self.update_user_info(usuario_simulado)
         self.log_message(f"Usuario simulado: {usuario_simulado['nombre']}")
     
-    def procesar_usuario_completo(self, usuario):
-        """Procesar usuario completo: descargar imagen, crear/modificar en ControlId."""
-        def procesar_thread():
-            try:
-                # Paso 1: Descargar imagen
-                self.log_message("Descargando imagen del usuario...")
-                ruta_imagen = self.descargar_imagen_usuario(usuario['lpid'], usuario['documento'])
-                
-                if ruta_imagen:
-                    self.log_message(f"Imagen descargada: {ruta_imagen}")
-                else:
-                    self.log_message("No se pudo descargar imagen")
-                
-                # Actualizar información del usuario en la interfaz (con imagen si está disponible)
-                self.update_user_info(usuario, ruta_imagen)
-                
-                # Paso 2: Procesar usuario en ControlId
-                self.log_message("Procesando usuario en ControlId...")
-                user_id = procesar_usuario_inteligente(
-                    self.session, 
-                    usuario['nombre'], 
-                    usuario['documento']
+    def procesar_usuario_completo(self, usuario, carril=CARRIL_FONDO):
+        """Encolar el usuario en la cola persistente para que lo procese un worker.
+        
+        Las acciones del operador usan CARRIL_INTERACTIVO para adelantarse al fondo.
+        Si el documento ya tiene un trabajo pendiente, el pedido se fusiona con él.
+        """
+        try:
+            trabajo_id, fusionado = self.planificador.encolar_o_fusionar(
+                usuario, clave=str(usuario['documento']), carril=carril
+            )
+            if fusionado:
+                self.log_message(f"Usuario {usuario['documento']} ya estaba pendiente (trabajo {trabajo_id}, {carril})")
+            else:
+                self.log_message(f"Usuario {usuario['documento']} encolado (trabajo {trabajo_id}, {carril})")
+        except Exception as e:
+            self.log_message(f"Error al encolar usuario: {str(e)}")
+    
+    def configurar_dispositivos(self, dispositivos=None, config_base=None):
+        """Crear el registro de equipos; con más de un equipo se activa el fan-out."""
+        try:
+            registro = RegistroDispositivos(dispositivos, config_base)
+            if self.fan_out:
+                self.fan_out.cerrar()
+            self.registro = registro
+            if len(registro) > 1:
+                self.fan_out = EjecutorFanOut(registro)
+                nombres = ", ".join(d['nombre'] for d in registro.dispositivos)
+                self.log_message(f"Sincronización a {len(registro)} equipos: {nombres}")
+            else:
+                self.fan_out = None
+        except Exception as e:
+            self.fan_out = None
+            self.log_message(f"Error al configurar equipos ControlId: {str(e)}")
+    
+    def guardar_en_outbox(self, nombre, usuario, ruta_imagen, motivo="sin conexión"):
+        """Dejar el usuario pendiente para un equipo sin conexión.
+        
+        Devuelve la marca de la fila guardada (ver OutboxDispositivo.descartar)
+        o None si no se pudo guardar.
+        """
+        try:
+            marca = self.outbox.guardar(nombre, usuario, str(ruta_imagen) if ruta_imagen else None)
+            self.log_message(f"  {nombre}: {motivo}, usuario {usuario['documento']} queda en el outbox")
+            return marca
+        except Exception as e:
+            self.log_message(f"Error al guardar en outbox: {str(e)}")
+            return None
+    
+    def enviar_desde_outbox(self, nombre, usuario, ruta_imagen):
+        """Enviar a un equipo un usuario pendiente del outbox (lo llama el drenador)."""
+        dispositivo = self.registro.obtener(nombre) if self.registro else None
+        if not dispositivo:
+            return None
+        if self.fan_out and self.fan_out.en_curso(nombre, usuario['documento']):
+            # Un envío rezagado del fan-out sigue en curso: se reintenta más tarde
+            return {'exito': False, 'inalcanzable': True, 'error': "envío en curso"}
+        if ruta_imagen and not Path(ruta_imagen).exists():
+            self.log_message(f"Outbox: falta la copia de la imagen de {usuario['documento']}, se envía sin imagen")
+            ruta_imagen = None
+        resultado = self.registro.sincronizar_usuario(dispositivo, usuario, ruta_imagen)
+        if resultado['exito'] and ruta_imagen:
+            self.registrar_llegada_a_puerta(usuario)
+        return resultado
+    
+    def procesar_usuario_en_dispositivos(self, usuario, ruta_imagen):
+        """Enviar el usuario a todos los equipos configurados en paralelo.
+        
+        Los equipos caídos o que no respondieron a tiempo quedan en el outbox;
+        si al menos un equipo recibió el usuario, los que fallaron también, para
+        reintentar solo esos equipos en lugar de todo el trabajo.
+        """
+        self.log_message(f"Procesando usuario en {len(self.fan_out.registro)} equipos ControlId...")
+        inicio = datetime.now()
+        # Con una operación pendiente en el outbox, el envío se fusiona en ella:
+        # así el drenador nunca aplica los datos viejos después de los nuevos
+        excluir = {
+            d['nombre'] for d in self.fan_out.registro.dispositivos
+            if self.outbox.pendiente(d['nombre'], usuario['documento'])
+        }
+        resultados = self.fan_out.sincronizar(usuario, ruta_imagen, excluir)
+        
+        latencias = [resultado['latencia'] for resultado in resultados.values() if resultado['exito']]
+        if latencias and ruta_imagen:
+            # La persona puede pasar desde que el primer equipo tiene su imagen
+            self.registrar_llegada_a_puerta(usuario, inicio + timedelta(seconds=min(latencias)))
+        
+        fallidos = []
+        for nombre, resultado in resultados.items():
+            if resultado['exito']:
+                self.log_message(f"  {nombre}: OK (ID {resultado['user_id']}, {resultado['latencia']:.2f} s)")
+            elif resultado['inalcanzable']:
+                # El equipo caído, lento o con pendientes recibirá el usuario desde el outbox
+                marca = self.guardar_en_outbox(nombre, usuario, ruta_imagen, resultado['error'])
+                if marca is None:
+                    fallidos.append(nombre)
+                elif 'futuro' in resultado:
+                    resultado['futuro'].add_done_callback(
+                        lambda futuro, nombre=nombre, marca=marca: self.rezagado_terminado(nombre, usuario, marca, futuro)
+                    )
+            else:
+                self.log_message(f"  {nombre}: ERROR {resultado['error']} ({resultado['latencia']:.2f} s)")
+                fallidos.append(nombre)
+        
+        if fallidos and not latencias:
+            # Ningún equipo lo recibió: se reintenta el trabajo completo
+            return False
+        for nombre in fallidos:
+            if self.guardar_en_outbox(nombre, usuario, ruta_imagen, "falló") is None:
+                return False
+        
+        self.log_message("Proceso completado exitosamente en todos los equipos disponibles")
+        return True
+    
+    def rezagado_terminado(self, nombre, usuario, marca, futuro):
+        """Un equipo que no respondió a tiempo terminó: si tuvo éxito, ya no hace falta el outbox."""
+        try:
+            resultado = futuro.result()
+            if resultado['exito']:
+                self.outbox.descartar(nombre, usuario['documento'], marca)
+                self.log_message(f"  {nombre}: OK tardío (ID {resultado['user_id']}, {resultado['latencia']:.2f} s)")
+        except Exception as e:
+            print(f"Error al cerrar envío rezagado: {e}")
+    
+    def procesar_usuario(self, usuario):
+        """Procesar usuario completo dentro de su propia traza (ver trazas.py).
+        
+        Devuelve True si el usuario quedó sincronizado.
+        """
+        inicio = time.perf_counter()
+        with iniciar_traza(documento=str(usuario['documento']), lpid=str(usuario.get('lpid', ''))):
+            exito = self.sincronizar_usuario(usuario)
+        USUARIOS_SINCRONIZADOS.incrementar(resultado="exito" if exito else "error")
+        self.registrar_actividad(usuario, exito, time.perf_counter() - inicio)
+        return exito
+    
+    def registrar_actividad(self, usuario, exito, duracion):
+        """Agregar el resultado al historial de actividad reciente."""
+        try:
+            ruta_imagen = None
+            if 'ruta_imagen_documento' in globals():
+                ruta = ruta_imagen_documento(usuario['documento'], CARPETAS_CONFIG)
+                ruta_imagen = str(ruta) if ruta.exists() else None
+            self.historial.agregar(EntradaHistorial(
+                str(usuario['documento']), usuario.get('nombre', ''), bool(exito), duracion, ruta_imagen
+            ))
+        except Exception as e:
+            print(f"Error al registrar actividad: {e}")
+    
+    def registrar_llegada_a_puerta(self, usuario, fin=None):
+        """Medir el tiempo enrolamiento-puerta del usuario y actualizar el SLO en pantalla.
+        
+        Solo para enrolamientos nuevos detectados por la sincronización automática;
+        las recargas y búsquedas del operador no se miden.
+        """
+        if not usuario.get('enrolamiento_nuevo'):
+            return
+        try:
+            if self.slo.registrar(usuario, fin) is not None:
+                self.slo_label.configure(
+                    text=self.slo.resumen(),
+                    text_color="orange" if self.slo.incumplido else "green"
                 )
-                
-                if user_id:
-                    self.log_message(f"Usuario procesado exitosamente. ID: {user_id}")
-                    
-                    # Paso 3: Crear relación user_groups (grupo 1002)
-                    self.log_message("Asignando grupo 1002 al usuario...")
-                    if 'set_control_id_config' in globals():
-                        # Asegurar que el flujo use la configuración actual
-                        set_control_id_config(CONTROL_ID_CONFIG)
-                    if 'crear_grupo_para_usuario' in globals():
-                        if crear_grupo_para_usuario(self.session, user_id, 1002):
-                            self.log_message("Grupo asignado exitosamente")
-                        else:
-                            self.log_message("Advertencia: no se pudo asignar grupo al usuario")
-                    
-                    # Paso 4: Asignar imagen al usuario si está disponible
-                    if ruta_imagen and Path(ruta_imagen).exists():
-                        self.log_message("Asignando imagen al usuario...")
-                        if self.asignar_imagen_usuario(user_id, ruta_imagen):
-                            self.log_message("Imagen asignada exitosamente")
-                        else:
-                            self.log_message("Error al asignar imagen")
-                    else:
-                        self.log_message("No hay imagen para asignar")
-                    
-                    self.log_message("Proceso completado exitosamente")
-                else:
-                    self.log_message("Error al procesar usuario en ControlId")
-                    
-            except Exception as e:
-                self.log_message(f"Error en el procesamiento: {str(e)}")
+        except Exception as e:
+            print(f"Error al registrar SLO de enrolamiento: {e}")
+    
+    def iniciar_metricas(self):
+        """Publicar cola y outbox como métricas y abrir el endpoint Prometheus (ver metricas.py)"""
+        PROFUNDIDAD_COLA.desde_funcion(lambda: [
+            ({'carril': carril}, self.cola.pendientes(carril)) for carril in (CARRIL_INTERACTIVO, CARRIL_FONDO)
+        ])
+        PENDIENTES_OUTBOX.desde_funcion(lambda: [
+            ({'equipo': nombre}, self.outbox.pendientes(nombre)) for nombre in self.outbox.dispositivos_pendientes()
+        ])
+        self.publicador_metricas.iniciar()
+        url = iniciar_servidor_metricas()
+        if url:
+            self.log_message(f"Métricas disponibles en {url}")
+    
+    def sincronizar_usuario(self, usuario):
+        """Sincronizar un usuario: descargar imagen, crear/modificar en ControlId.
+        
+        Devuelve True si el usuario quedó sincronizado.
+        """
+        # Paso 1: Descargar imagen
+        self.log_message("Descargando imagen del usuario...")
+        ruta_imagen = self.descargar_imagen_usuario(usuario)
+        
+        if ruta_imagen:
+            self.log_message(f"Imagen descargada: {ruta_imagen}")
+        else:
+            self.log_message("No se pudo descargar imagen")
+        
+        # Actualizar información del usuario en la interfaz (con imagen si está disponible)
+        self.update_user_info(usuario, ruta_imagen)
+        
+        # Varios equipos: la imagen ya descargada se envía a todos en paralelo
+        if self.fan_out:
+            return self.procesar_usuario_en_dispositivos(usuario, ruta_imagen)
+        
+        # Con una operación pendiente en el outbox, se fusiona en ella (ver outbox_dispositivo.py)
+        if self.registro and self.outbox.pendiente(self.registro.dispositivos[0]['nombre'], usuario['documento']):
+            return self.guardar_en_outbox(
+                self.registro.dispositivos[0]['nombre'], usuario, ruta_imagen, "pendiente en el outbox"
+            ) is not None
+        
+        # Paso 2: Procesar usuario en ControlId
+        self.log_message("Procesando usuario en ControlId...")
+        user_id = procesar_usuario_inteligente(
+            self.session, 
+            usuario['nombre'], 
+            usuario['documento']
+        )
+        
+        if not user_id:
+            if self.registro and equipo_inalcanzable(CONTROL_ID_CONFIG['base_url']):
+                # Equipo caído: el drenador lo enviará cuando vuelva
+                return self.guardar_en_outbox(self.registro.dispositivos[0]['nombre'], usuario, ruta_imagen) is not None
+            self.log_message("Error al procesar usuario en ControlId")
+            return False
+        
+        self.log_message(f"Usuario procesado exitosamente. ID: {user_id}")
+        
+        # Paso 3: Crear relación user_groups (grupo 1002)
+        self.log_message("Asignando grupo 1002 al usuario...")
+        if 'set_control_id_config' in globals():
+            # Asegurar que el flujo use la configuración actual
+            set_control_id_config(CONTROL_ID_CONFIG)
+        if 'crear_grupo_para_usuario' in globals():
+            if crear_grupo_para_usuario(self.session, user_id, 1002):
+                self.log_message("Grupo asignado exitosamente")
+            else:
+                self.log_message("Advertencia: no se pudo asignar grupo al usuario")
+        
+        # Paso 4: Asignar imagen al usuario si está disponible
+        if ruta_imagen and Path(ruta_imagen).exists():
+            self.log_message("Asignando imagen al usuario...")
+            if self.asignar_imagen_usuario(user_id, ruta_imagen):
+                self.log_message("Imagen asignada exitosamente")
+                self.registrar_llegada_a_puerta(usuario)
+            else:
+                if self.registro and equipo_inalcanzable(CONTROL_ID_CONFIG['base_url']):
+                    return self.guardar_en_outbox(self.registro.dispositivos[0]['nombre'], usuario, ruta_imagen) is not None
+                self.log_message("Error al asignar imagen")
+                return False
+        else:
+            self.log_message("No hay imagen para asignar")
         
-        threading.Thread(target=procesar_thread, daemon=True).start()
+        self.log_message("Proceso completado exitosamente")
+        return True
     
     def update_user_info(self, usuario, ruta_imagen=None):
         """Actualizar la información del usuario en el panel derecho."""
@@ -711,20 +1274,40 @@ class ControlIdGUI:
             self.log_message(f"Error al actualizar información del usuario: {str(e)}")
     
     def load_user_image(self, ruta_imagen):
-        """Cargar y mostrar la imagen del usuario."""
+        """Cargar y mostrar la imagen del usuario.
+        
+        La miniatura se obtiene de la caché en su propio hilo (ver miniaturas.py);
+        en el hilo de Tk solo se crea el PhotoImage.
+        """
         try:
             if not Path(ruta_imagen).exists():
                 self.user_image_label.configure(text="Imagen no encontrada")
                 return
-                
-            # Cargar imagen con PIL
-            image = Image.open(ruta_imagen)
             
-            # Redimensionar imagen manteniendo proporción
-            image.thumbnail((180, 180), Image.Resampling.LANCZOS)
+            self.imagen_pedida = str(ruta_imagen)
+            self.miniaturas.obtener_async(
+                ruta_imagen,
+                lambda imagen: self.root.after(0, lambda: self.mostrar_imagen_usuario(ruta_imagen, imagen))
+            )
+            
+        except Exception as e:
+            self.log_message(f"Error al cargar imagen: {str(e)}")
+            self.user_image_label.configure(text="Error al cargar imagen")
+    
+    def mostrar_imagen_usuario(self, ruta_imagen, imagen):
+        """Mostrar la miniatura ya decodificada (se ejecuta en el hilo de Tk)."""
+        try:
+            # Si mientras tanto se pidió otra imagen, esta llegó tarde
+            if str(ruta_imagen) != self.imagen_pedida:
+                return
+            if imagen is None:
+                self.user_image_label.configure(text="Error al cargar imagen")
+                return
+            
+            from PIL import ImageTk
             
             # Convertir a PhotoImage para tkinter
-            photo = ImageTk.PhotoImage(image)
+            photo = ImageTk.PhotoImage(imagen)
             
             # Actualizar label con la imagen
             self.user_image_label.configure(image=photo, text="")
@@ -736,10 +1319,20 @@ class ControlIdGUI:
             self.log_message(f"Error al cargar imagen: {str(e)}")
             self.user_image_label.configure(text="Error al cargar imagen")
     
-    def descargar_imagen_usuario(self, lpid, numero_documento):
-        """Descargar imagen del usuario desde BykeeperDesarrollo."""
+    def descargar_imagen_usuario(self, usuario):
+        """Descargar imagen del usuario desde BykeeperDesarrollo.
+        
+        Si el SP no devuelve URL, o la imagen descargada no pasa la validación,
+        el registro pasa a la caché negativa y no se vuelve a consultar Azure
+        por él hasta que venza.
+        """
         if not MODULES_LOADED:
             return None
+        
+        motivo = self.cache_negativa.motivo(usuario)
+        if motivo:
+            self.log_message(f"Usuario {usuario['documento']} {motivo} (caché negativa), no se consulta Azure")
+            return None
             
         try:
             # Conectar a la base de datos
@@ -751,38 +1344,21 @@ class ControlIdGUI:
             )
             
             try:
-                # Ejecutar Stored Procedure
-                cursor = ejecutar_stored_procedure(
-                    conexion,
-                    AZURE_CONFIG['stored_procedure'],
-                    lpid,
-                    AZURE_CONFIG['business_context']
-                )
+                # Ejecutar SP y resolver URL
+                image_url = obtener_url_imagen(conexion, usuario['lpid'], AZURE_CONFIG)
+                if not image_url:
+                    self.cache_negativa.registrar(usuario, SIN_IMAGEN)
+                    return None
                 
-                if cursor:
-                    # Procesar resultado para obtener URL de imagen
-                    image_url = procesar_resultado_sp(cursor)
-                    
-                    if image_url:
-                        # Preparar ruta de destino
-                        ruta_local = Path(CARPETAS_CONFIG['carpeta_local_temp'])
-                        ruta_local.mkdir(parents=True, exist_ok=True)
-                        extension = CARPETAS_CONFIG.get('extension_imagen', '.jpg')
-                        nombre_archivo = f"{numero_documento}{extension}"
-                        ruta_imagen = ruta_local / nombre_archivo
-                        
-                        # Descargar imagen
-                        if descargar_imagen(image_url, ruta_imagen):
-                            return str(ruta_imagen)
-                        else:
-                            return None
-                    else:
-                        return None
-                        
-                    cursor.close()
-                else:
+                ruta_imagen = descargar_imagen_documento(image_url, usuario['documento'], CARPETAS_CONFIG)
+                if not ruta_imagen:
+                    rechazo = motivo_rechazo(usuario['documento'])
+                    if rechazo:
+                        self.log_message(f"Imagen de {usuario['documento']} rechazada ({rechazo}), no se envía al equipo")
+                        self.cache_negativa.registrar(usuario, IMAGEN_INVALIDA)
                     return None
-                    
+                return str(ruta_imagen)
+
             finally:
                 conexion.close()
                 
@@ -796,26 +1372,11 @@ class ControlIdGUI:
             return False
             
         try:
-            import requests
-            from config import CONTROL_ID_CONFIG
-            
             self.log_message(f"Asignando imagen al usuario ID: {user_id}")
             
-            url = f"{CONTROL_ID_CONFIG['base_url']}/user_set_image.fcgi"
-            params = {
-                'user_id': user_id,
-                'match': '1',
-                'timestamp': str(int(Path(ruta_imagen).stat().st_mtime)),
-                'session': self.session
-            }
-            headers = {'Content-Type': 'application/octet-stream'}
-            
-            # Leer la imagen como datos binarios
-            with open(ruta_imagen, 'rb') as image_file:
-                image_data = image_file.read()
-            
-            response = requests.post(url, params=params, headers=headers, data=image_data, timeout=30)
-            response.raise_for_status()
+            # Pasa por el cliente de flujo_usuario_inteligente (límites por equipo)
+            if not asignar_imagen_controlid(self.session, str(user_id), ruta_imagen):
+                return False
             
             self.log_message("Imagen asignada exitosamente al usuario")
             return True
@@ -840,7 +1401,11 @@ class ControlIdGUI:
         self.sync_running = True
         self.sync_btn.configure(text="Detener Sincronización")
         self.sync_status_label.configure(text="Ejecutando", text_color="green")
-        self.log_message("Sincronización automática iniciada (cada 5 segundos)")
+        self.intervalo.reiniciar()
+        self.log_message(
+            f"Sincronización automática iniciada (cada {self.intervalo.minimo:g} s con enrolamientos nuevos, "
+            f"hasta {self.intervalo.maximo:g} s sin novedades)"
+        )
         
         # Iniciar hilo de sincronización
         self.sync_thread = threading.Thread(target=self.sincronizacion_loop, daemon=True)
@@ -849,6 +1414,7 @@ class ControlIdGUI:
     def detener_sincronizacion(self):
         """Detener sincronización automática."""
         self.sync_running = False
+        self.intervalo.despertar()
         self.sync_btn.configure(text="Iniciar Sincronización")
         self.sync_status_label.configure(text="Detenido", text_color="red")
         self.log_message("Sincronización automática detenida")
@@ -856,65 +1422,76 @@ class ControlIdGUI:
     def sincronizacion_loop(self):
         """Loop de sincronización automática."""
         while self.sync_running:
+            hubo_novedades = False
             try:
-                self.log_message("Ejecutando sincronización automática...")
-                
-                if MODULES_LOADED:
-                    # Obtener último usuario de MiID
-                    usuario = obtener_ultimo_usuario_midd()
-                    
-                    if usuario:
-                        # Validar que el usuario tenga nombre válido
-                        nombre_usuario = usuario.get('nombre', '').strip()
-                        if not nombre_usuario:
-                            self.log_message(f"Advertencia: Usuario con documento {usuario['documento']} no tiene nombre válido. Saltando procesamiento.")
-                            continue
-                        
-                        # Verificar si el usuario ya existe en ControlId
-                        usuario_existente = buscar_usuario_por_registration(self.session, usuario['documento'])
-                        
-                        if not usuario_existente:
-                            # Usuario no existe, procesarlo
-                            self.log_message(f"Nuevo usuario detectado: {usuario['nombre']} - {usuario['documento']}")
-                            self.procesar_usuario_completo(usuario)
-                        else:
-                            # Usuario ya existe, pero verificar si necesita actualización de imagen y grupo
-                            self.log_message(f"Usuario ya existe: {usuario['nombre']} - {usuario['documento']}")
-                            self.log_message("Verificando si necesita actualización de imagen y grupo...")
-                            
-                            # Asegurar que el usuario tenga el grupo 1002
-                            if 'set_control_id_config' in globals():
-                                set_control_id_config(CONTROL_ID_CONFIG)
-                            if 'crear_grupo_para_usuario' in globals():
-                                if crear_grupo_para_usuario(self.session, str(usuario_existente['id']), 1002):
-                                    self.log_message("Grupo 1002 verificado/actualizado")
-                                else:
-                                    self.log_message("Advertencia: no se pudo verificar grupo del usuario")
-                            
-                            # Descargar imagen y asignarla
-                            ruta_imagen = self.descargar_imagen_usuario(usuario['lpid'], usuario['documento'])
-                            if ruta_imagen:
-                                self.log_message("Asignando imagen actualizada...")
-                                if self.asignar_imagen_usuario(usuario_existente['id'], ruta_imagen):
-                                    self.log_message("Imagen actualizada exitosamente")
-                                else:
-                                    self.log_message("Error al actualizar imagen")
-                            else:
-                                self.log_message("No se pudo descargar imagen para actualización")
-                    else:
-                        self.log_message("No hay usuarios nuevos en MiID")
-                else:
-                    self.log_message("Modo de prueba - No hay usuarios nuevos")
-                
-                # Esperar 5 segundos
-                for i in range(50):  # 50 * 0.1 = 5 segundos
-                    if not self.sync_running:
-                        break
-                    time.sleep(0.1)
-                    
+                inicio_ciclo = time.perf_counter()
+                hubo_novedades = self.ciclo_sincronizacion()
+                DURACION_CICLO.fijar(time.perf_counter() - inicio_ciclo)
             except Exception as e:
                 self.log_message(f"Error en sincronización: {str(e)}")
-                time.sleep(5)  # Esperar 5 segundos antes de reintentar
+            
+            # Siempre se espera el intervalo adaptativo, termine el ciclo como termine:
+            # ningún camino puede volver a consultar MiID sin pausa (un error cuenta
+            # como ciclo sin novedades). detener_sincronizacion corta la espera.
+            self.intervalo.esperar(self.intervalo.registrar(hubo_novedades))
+    
+    def ciclo_sincronizacion(self):
+        """Un ciclo de sincronización automática.
+        
+        Devuelve True si MiID tenía un enrolamiento distinto al último visto.
+        """
+        self.log_message("Ejecutando sincronización automática...")
+        
+        if not MODULES_LOADED:
+            self.log_message("Modo de prueba - No hay usuarios nuevos")
+            return False
+        
+        # Obtener último usuario de MiID
+        usuario = obtener_ultimo_usuario_midd()
+        if not usuario:
+            self.log_message("No hay usuarios nuevos en MiID")
+            return False
+        
+        # Un enrolamiento distinto al último visto mantiene el intervalo mínimo
+        enrolamiento = (str(usuario['documento']), str(usuario.get('fecha_creacion')))
+        hubo_novedades = enrolamiento != self.ultimo_enrolamiento_visto
+        self.ultimo_enrolamiento_visto = enrolamiento
+        
+        # Registro ya conocido como inválido: no se reprocesa hasta que venza
+        motivo = self.cache_negativa.motivo(usuario)
+        if motivo == SIN_NOMBRE:
+            if hubo_novedades:
+                self.log_message(f"Usuario con documento {usuario['documento']} {motivo} (caché negativa). Saltando procesamiento.")
+            return hubo_novedades
+        
+        # Validar que el usuario tenga nombre válido
+        nombre_usuario = (usuario.get('nombre') or '').strip()
+        if not nombre_usuario:
+            self.log_message(f"Advertencia: Usuario con documento {usuario['documento']} no tiene nombre válido. Saltando procesamiento.")
+            self.cache_negativa.registrar(usuario, SIN_NOMBRE)
+            return hubo_novedades
+        
+        # Verificar si el usuario ya existe en ControlId
+        usuario_existente = buscar_usuario_por_registration(self.session, usuario['documento'])
+        
+        if not usuario_existente:
+            # Usuario no existe, procesarlo
+            self.log_message(f"Nuevo usuario detectado: {usuario['nombre']} - {usuario['documento']}")
+            # Solo la primera sincronización de un enrolamiento nuevo cuenta para el SLO
+            usuario['enrolamiento_nuevo'] = hubo_novedades
+            self.procesar_usuario_completo(usuario)
+            return hubo_novedades
+        
+        # Usuario ya existe, pero verificar si necesita actualización de imagen y grupo
+        self.log_message(f"Usuario ya existe: {usuario['nombre']} - {usuario['documento']}")
+        if motivo in (SIN_IMAGEN, IMAGEN_INVALIDA):
+            # Ya se verificó que no tiene imagen (o que la que tiene no sirve): nada que actualizar hasta que venza
+            return hubo_novedades
+        # Grupo e imagen se actualizan en un worker, como un usuario nuevo: así pasa por la
+        # fusión de duplicados, el fan-out a todos los equipos y el outbox
+        self.log_message("Encolando actualización de imagen y grupo...")
+        self.procesar_usuario_completo(usuario)
+        return hubo_novedades
     
     def run(self):
         """Ejecutar la aplicación."""
@@ -926,8 +1503,6 @@ class ControlIdGUI:
             self.log_message("  • Búsqueda por número de documento")
             self.log_message("  • Visualización de información de usuario")
             self.log_message("  • Log en tiempo real")
-            if not MODULES_LOADED:
-                self.log_message("  • Modo de prueba activado")
             self.root.mainloop()
         except Exception as e:
             print(f"Error al ejecutar GUI: {e}")
@@ -945,14 +1520,14 @@ class ConfiguracionWindow:
         # Crear ventana modal
         self.window = ctk.CTkToplevel(parent)
         self.window.title("Configuración del Sistema")
-        self.window.geometry("600x700")
+        self.window.geometry("600x760")
         self.window.resizable(False, False)
         
         # Centrar ventana
         self.window.update_idletasks()
         x = (self.window.winfo_screenwidth() // 2) - (600 // 2)
-        y = (self.window.winfo_screenheight() // 2) - (700 // 2)
-        self.window.geometry(f"600x700+{x}+{y}")
+        y = (self.window.winfo_screenheight() // 2) - (760 // 2)
+        self.window.geometry(f"600x760+{x}+{y}")
         
         # Cargar configuración actual
         self.cargar_configuracion()
@@ -967,13 +1542,13 @@ class ConfiguracionWindow:
     def cargar_configuracion(self):
         """Cargar configuración actual desde config.py."""
         try:
-            from config import MIID_CONFIG, AZURE_CONFIG, CONTROL_ID_CONFIG, CARPETAS_CONFIG
+            _cfg = cargar_config()
             
             self.config_data = {
-                'miid': MIID_CONFIG.copy(),
-                'azure': AZURE_CONFIG.copy(),
-                'control_id': CONTROL_ID_CONFIG.copy(),
-                'carpetas': CARPETAS_CONFIG.copy()
+                'miid': _cfg.MIID_CONFIG.copy(),
+                'azure': _cfg.AZURE_CONFIG.copy(),
+                'control_id': _cfg.CONTROL_ID_CONFIG.copy(),
+                'carpetas': _cfg.CARPETAS_CONFIG.copy()
             }
         except Exception as e:
             print(f"Error al cargar configuración: {e}")
@@ -992,7 +1567,8 @@ class ConfiguracionWindow:
                     'usuario': 'usuario',
                     'contraseña': 'contraseña',
                     'stored_procedure': 'dbo.GetMatchIDImgFaceByCASBid',
-                    'business_context': 'MatchId'
+                    'business_context': 'MatchId',
+                    'url_imagenes': ''
                 },
                 'control_id': {
                     'base_url': 'http://192.168.3.37',
@@ -1031,6 +1607,9 @@ class ConfiguracionWindow:
         # Pestaña Carpetas
         self.crear_pestana_carpetas()
         
+        # Pestaña Diagnóstico (resultado de Probar Conexiones)
+        self.crear_pestana_diagnostico()
+        
         # Botones de acción
         self.crear_botones_accion()
     
@@ -1115,6 +1694,12 @@ class ConfiguracionWindow:
         self.azure_context = ctk.CTkEntry(tab, width=400, height=30)
         self.azure_context.pack(padx=20, pady=(0, 5))
         self.azure_context.insert(0, self.config_data['azure']['business_context'])
+        
+        # URL de una imagen (blob) para probar el host de imágenes
+        ctk.CTkLabel(tab, text="URL de imágenes (opcional, para pruebas):", font=ctk.CTkFont(size=12, weight="bold")).pack(anchor="w", padx=20, pady=(10, 0))
+        self.azure_url_imagenes = ctk.CTkEntry(tab, width=400, height=30)
+        self.azure_url_imagenes.pack(padx=20, pady=(0, 5))
+        self.azure_url_imagenes.insert(0, self.config_data['azure'].get('url_imagenes', ''))
     
     def crear_pestana_control_id(self):
         """Crear pestaña de configuración ControlId."""
@@ -1200,36 +1785,58 @@ class ConfiguracionWindow:
         )
         test_btn.pack(side="left", padx=10, pady=10)
     
+    def crear_pestana_diagnostico(self):
+        """Crear pestaña con la tabla de tiempos de Probar Conexiones."""
+        tab = self.notebook.add("Diagnóstico")
+        
+        # Título
+        title = ctk.CTkLabel(tab, text="Diagnóstico de Conexiones", font=ctk.CTkFont(size=16, weight="bold"))
+        title.pack(pady=10)
+        
+        self.diagnostico_text = ctk.CTkTextbox(
+            tab,
+            font=ctk.CTkFont(family="Courier", size=11),
+            wrap="none"
+        )
+        self.diagnostico_text.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.diagnostico_text.insert("1.0", "Use \"Probar Conexiones\" para medir cada fase con los valores del formulario.")
+        self.diagnostico_text.configure(state="disabled")
+    
+    def leer_formulario(self):
+        """Valores actuales de los campos (guardados o no)."""
+        return {
+            'miid': {
+                'host': self.miid_host.get(),
+                'port': int(self.miid_port.get()),
+                'user': self.miid_user.get(),
+                'password': self.miid_password.get(),
+                'database': self.miid_database.get()
+            },
+            'azure': {
+                'servidor': self.azure_servidor.get(),
+                'base_datos': self.azure_database.get(),
+                'usuario': self.azure_user.get(),
+                'contraseña': self.azure_password.get(),
+                'stored_procedure': self.azure_sp.get(),
+                'business_context': self.azure_context.get(),
+                'url_imagenes': self.azure_url_imagenes.get()
+            },
+            'control_id': {
+                'base_url': self.control_url.get(),
+                'login': self.control_user.get(),
+                'password': self.control_password.get()
+            },
+            'carpetas': {
+                'carpeta_local_temp': self.carpeta_temp.get(),
+                'extension_imagen': self.extension_img.get()
+            }
+        }
+    
     def guardar_configuracion(self):
         """Guardar configuración en archivo config.py."""
         try:
             # Recopilar datos de los campos
-            nueva_config = {
-                'miid': {
-                    'host': self.miid_host.get(),
-                    'port': int(self.miid_port.get()),
-                    'user': self.miid_user.get(),
-                    'password': self.miid_password.get(),
-                    'database': self.miid_database.get()
-                },
-                'azure': {
-                    'servidor': self.azure_servidor.get(),
-                    'base_datos': self.azure_database.get(),
-                    'usuario': self.azure_user.get(),
-                    'contraseña': self.azure_password.get(),
-                    'stored_procedure': self.azure_sp.get(),
-                    'business_context': self.azure_context.get()
-                },
-                'control_id': {
-                    'base_url': self.control_url.get(),
-                    'login': self.control_user.get(),
-                    'password': self.control_password.get()
-                },
-                'carpetas': {
-                    'carpeta_local_temp': self.carpeta_temp.get(),
-                    'extension_imagen': self.extension_img.get()
-                }
-            }
+            nueva_config = self.leer_formulario()
             
             # Generar contenido del archivo config.py
             config_content = f'''#!/usr/bin/env python3
@@ -1255,7 +1862,8 @@ AZURE_CONFIG = {{
     "usuario": "{nueva_config['azure']['usuario']}",
     "contraseña": "{nueva_config['azure']['contraseña']}",
     "stored_procedure": "{nueva_config['azure']['stored_procedure']}",
-    "business_context": "{nueva_config['azure']['business_context']}"
+    "business_context": "{nueva_config['azure']['business_context']}",
+    "url_imagenes": "{nueva_config['azure']['url_imagenes']}"
 }}
 
 # Configuración ControlId
@@ -1270,7 +1878,7 @@ CARPETAS_CONFIG = {{
     "carpeta_local_temp": r"{nueva_config['carpetas']['carpeta_local_temp']}",
     "extension_imagen": "{nueva_config['carpetas']['extension_imagen']}"
 }}
-'''
+''' + self.secciones_adicionales()
             
             # Escribir archivo
             with open('config.py', 'w', encoding='utf-8') as f:
@@ -1278,9 +1886,7 @@ CARPETAS_CONFIG = {{
             
             # Recargar dinámicamente el módulo de configuración y propagar cambios
             try:
-                import importlib
-                import config as _cfg
-                _cfg = importlib.reload(_cfg)
+                _cfg = cargar_config(recargar=True)
                 # Actualizar variables globales utilizadas en la app
                 global AZURE_CONFIG, CARPETAS_CONFIG
                 AZURE_CONFIG = _cfg.AZURE_CONFIG
@@ -1288,6 +1894,14 @@ CARPETAS_CONFIG = {{
                 # Actualizar configuración usada por el flujo (peticiones HTTP)
                 if 'set_control_id_config' in globals():
                     set_control_id_config(_cfg.CONTROL_ID_CONFIG)
+                # Aplicar límites de carga por equipo
+                from limites_dispositivo import configurar_limites
+                configurar_limites(getattr(_cfg, 'CONTROL_ID_LIMITES', {}))
+                # Reconstruir el registro de equipos con la nueva configuración
+                if hasattr(self.main_app, 'configurar_dispositivos'):
+                    self.main_app.configurar_dispositivos(
+                        getattr(_cfg, 'CONTROL_ID_DISPOSITIVOS', []), _cfg.CONTROL_ID_CONFIG
+                    )
                 # Invalidar sesión actual para forzar re-login con nueva IP/credenciales
                 if hasattr(self, 'main_app') and hasattr(self.main_app, 'session'):
                     self.main_app.session = None
@@ -1305,21 +1919,71 @@ CARPETAS_CONFIG = {{
         except Exception as e:
             self.mostrar_mensaje(f"Error al guardar configuración: {str(e)}", "Error")
     
+    def secciones_adicionales(self):
+        """Conservar las secciones de config.py que esta ventana no edita
+        (p. ej. CONTROL_ID_DISPOSITIVOS) para no perderlas al guardar."""
+        try:
+            _cfg = cargar_config()
+        except Exception:
+            return ""
+        
+        editadas = {'MIID_CONFIG', 'AZURE_CONFIG', 'CONTROL_ID_CONFIG', 'CARPETAS_CONFIG'}
+        lineas = []
+        for nombre in dir(_cfg):
+            if nombre.isupper() and nombre not in editadas:
+                lineas.append(f"\n{nombre} = {getattr(_cfg, nombre)!r}\n")
+        return "".join(lineas)
+    
     def cancelar(self):
         """Cancelar y cerrar ventana."""
         self.window.destroy()
     
     def probar_conexiones(self):
-        """Probar conexiones con la configuración actual."""
+        """Probar MiID, Azure SQL, el host de imágenes y ControlId con los
+        valores del formulario (sin guardar), midiendo cada fase."""
         try:
-            self.mostrar_mensaje("Probando conexiones...", "Info")
-            
-            # Aquí podrías agregar lógica para probar las conexiones
-            # Por ahora solo mostramos un mensaje
-            self.mostrar_mensaje("Pruebas de conexión completadas", "Éxito")
-            
+            formulario = self.leer_formulario()
         except Exception as e:
             self.mostrar_mensaje(f"Error en pruebas: {str(e)}", "Error")
+            return
+        
+        self.mostrar_diagnostico("Probando conexiones...")
+        self.notebook.set("Diagnóstico")
+        if hasattr(self.main_app, 'log_message'):
+            self.main_app.log_message("Probando conexiones con los valores del formulario...")
+        
+        def probar():
+            try:
+                sondeos = probar_conexiones(
+                    miid=formulario['miid'],
+                    azure=formulario['azure'],
+                    url_imagenes=formulario['azure']['url_imagenes'],
+                    control=formulario['control_id']
+                )
+                tabla = tabla_sondeos(sondeos) if sondeos else "No hay servicios configurados para probar."
+                fallidos = [s.servicio for s in sondeos if not s.exito]
+                resumen = f"Fallaron: {', '.join(fallidos)}" if fallidos else "Todas las conexiones respondieron"
+            except Exception as e:
+                tabla = f"Error en pruebas: {e}"
+                resumen = tabla
+            self.window.after(0, lambda: self.mostrar_resultado_pruebas(tabla, resumen))
+        
+        threading.Thread(target=probar, daemon=True).start()
+    
+    def mostrar_resultado_pruebas(self, tabla, resumen):
+        """Mostrar la tabla de tiempos y el resumen en el log."""
+        self.mostrar_diagnostico(tabla)
+        if hasattr(self.main_app, 'log_message'):
+            self.main_app.log_message(f"Pruebas de conexión completadas. {resumen}")
+    
+    def mostrar_diagnostico(self, texto):
+        """Reemplazar el contenido de la pestaña Diagnóstico."""
+        if not self.window.winfo_exists():
+            return
+        self.diagnostico_text.configure(state="normal")
+        self.diagnostico_text.delete("1.0", "end")
+        self.diagnostico_text.insert("1.0", texto)
+        self.diagnostico_text.configure(state="disabled")
     
     def mostrar_mensaje(self, mensaje, tipo):
         """Mostrar mensaje en la ventana principal."""
@@ -1348,4 +2012,6 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # El pool de procesos del preprocesado de imágenes en el ejecutable empaquetado
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fuentes de datos locales (SQLite) para correr la sincronización sin MiID ni
+Azure.
+
+El esquema local tiene la misma forma que el de producción:
+- `person` y `log_process_enroll` (MiID, MySQL)
+- `match_id_img_face`, que reemplaza al stored procedure de Azure
+  `dbo.GetMatchIDImgFaceByCASBid` y devuelve la URL de la imagen
+
+Con la fuente local activa, `GetUserMiID`, `GetUserByDocument` y
+`download_image_to_sql_temp` ejecutan sus mismas consultas contra el archivo
+SQLite: la conexión traduce los parámetros `%s` de MySQL, la función CONCAT y
+las llamadas `EXEC` a los stored procedures.
+
+Las URLs de imagen apuntan a un servidor de archivos estáticos local
+(`servir`), así que la descarga también se ejercita por HTTP.
+
+Configuración en config.py:
+    FUENTE_DATOS = {"tipo": "sqlite", "ruta": "datos_locales.db"}
+
+Uso:
+    python datos_locales.py sembrar --usuarios 1000
+    python datos_locales.py servir --puerto 8082
+"""
+
+import argparse
+import logging
+import random
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    from config import FUENTE_DATOS
+except ImportError:
+    FUENTE_DATOS = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+RUTA_POR_DEFECTO = Path(__file__).parent / "datos_locales.db"
+CARPETA_IMAGENES = Path(__file__).parent / "imagenes_locales"
+PUERTO_IMAGENES = 8082
+
+# Formato en que MySQL/pyodbc devuelven las fechas
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+_PATRON_FECHA = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+
+# Stored procedures de Azure y su equivalente en el esquema local
+PROCEDIMIENTOS_LOCALES = {
+    "dbo.GetMatchIDImgFaceByCASBid": (
+        "SELECT LP_ID, IMAGE_URL FROM match_id_img_face WHERE LP_ID = ? AND BUSINESS_CONTEXT = ?"
+    ),
+}
+_PATRON_EXEC = re.compile(r"^\s*EXEC\s+(\S+)", re.IGNORECASE)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS person (
+    PER_ID INTEGER PRIMARY KEY,
+    PER_DOCUMENT_NUMBER TEXT NOT NULL,
+    PER_ANI_FIRST_NAME TEXT
+);
+CREATE TABLE IF NOT EXISTS log_process_enroll (
+    LP_ID INTEGER PRIMARY KEY,
+    PER_ID INTEGER NOT NULL REFERENCES person (PER_ID),
+    EC_ID INTEGER NOT NULL,
+    LP_STATUS_PROCESS INTEGER NOT NULL,
+    LP_CREATION_DATE TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_lpe_estado_fecha
+    ON log_process_enroll (EC_ID, LP_STATUS_PROCESS, LP_CREATION_DATE);
+CREATE INDEX IF NOT EXISTS idx_person_documento ON person (PER_DOCUMENT_NUMBER);
+CREATE TABLE IF NOT EXISTS match_id_img_face (
+    LP_ID INTEGER NOT NULL,
+    BUSINESS_CONTEXT TEXT NOT NULL,
+    IMAGE_URL TEXT,
+    PRIMARY KEY (LP_ID, BUSINESS_CONTEXT)
+);
+"""
+
+
+def usar_fuente_local() -> bool:
+    """Indica si config.py pide usar la fuente SQLite local."""
+    return FUENTE_DATOS.get('tipo') == "sqlite"
+
+
+def _adaptar_parametro(valor: Any) -> Any:
+    if isinstance(valor, datetime):
+        return valor.strftime(FORMATO_FECHA)
+    return valor
+
+
+def _convertir_valor(valor: Any) -> Any:
+    # SQLite guarda las fechas como texto; se devuelven como datetime igual que MySQL
+    if isinstance(valor, str) and _PATRON_FECHA.match(valor):
+        return datetime.strptime(valor, FORMATO_FECHA)
+    return valor
+
+
+class CursorLocal:
+    """
+    Cursor SQLite con la interfaz que usan los scripts (DB-API): acepta
+    parámetros `%s` (MySQL) o `?` (pyodbc) y sentencias `EXEC` de los stored
+    procedures conocidos.
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query: str, parametros=()) -> "CursorLocal":
+        exec_sp = _PATRON_EXEC.match(query)
+        if exec_sp:
+            nombre = exec_sp.group(1)
+            if nombre not in PROCEDIMIENTOS_LOCALES:
+                raise sqlite3.OperationalError(f"Stored procedure sin equivalente local: {nombre}")
+            query = PROCEDIMIENTOS_LOCALES[nombre]
+        else:
+            query = query.replace("%s", "?")
+        self._cursor.execute(query, tuple(_adaptar_parametro(p) for p in parametros))
+        return self
+
+    def fetchone(self):
+        fila = self._cursor.fetchone()
+        return tuple(_convertir_valor(v) for v in fila) if fila else fila
+
+    def fetchall(self):
+        return [tuple(_convertir_valor(v) for v in fila) for fila in self._cursor.fetchall()]
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class ConexionLocal:
+    """Conexión SQLite con la interfaz de las conexiones MySQL/pyodbc usadas."""
+
+    def __init__(self, ruta: Path):
+        self._conexion = sqlite3.connect(str(ruta), check_same_thread=False)
+        self._conexion.create_function("CONCAT", -1, lambda *partes: "".join("" if p is None else str(p) for p in partes))
+
+    def cursor(self) -> CursorLocal:
+        return CursorLocal(self._conexion.cursor())
+
+    def commit(self) -> None:
+        self._conexion.commit()
+
+    def close(self) -> None:
+        self._conexion.close()
+
+
+def ruta_fuente_local() -> Path:
+    return Path(FUENTE_DATOS.get('ruta') or RUTA_POR_DEFECTO)
+
+
+def conectar_local(ruta: Optional[Path] = None) -> Optional[ConexionLocal]:
+    """
+    Abre la base SQLite local (reemplaza tanto a MiID como a Azure SQL).
+
+    Returns:
+        Conexión o None si el archivo no existe (hay que sembrarlo primero).
+    """
+    ruta = Path(ruta or ruta_fuente_local())
+    if not ruta.exists():
+        logger.error(f"No existe la base local {ruta}; ejecuta: python datos_locales.py sembrar")
+        return None
+    logger.info(f"Usando fuente de datos local: {ruta}")
+    return ConexionLocal(ruta)
+
+
+def _crear_imagen(ruta: Path, semilla: int, ancho: int, alto: int) -> None:
+    """Imagen JPEG sintética (color y ruido distintos por usuario)."""
+    from PIL import Image
+
+    generador = random.Random(semilla)
+    color = tuple(generador.randrange(256) for _ in range(3))
+    ruido = Image.effect_noise((ancho, alto), 40).convert("RGB")
+    Image.blend(Image.new("RGB", (ancho, alto), color), ruido, 0.3).save(ruta, "JPEG", quality=85)
+
+
+def sembrar(usuarios: int, ruta: Optional[Path] = None, carpeta_imagenes: Path = CARPETA_IMAGENES,
+            url_imagenes: Optional[str] = None, business_context: str = "",
+            dias: int = 365, proporcion_fallidos: float = 0.05, ancho: int = 480, alto: int = 640,
+            semilla: int = 42) -> Dict[str, Any]:
+    """
+    Crea (o recrea) la base local con N enrolamientos sintéticos y sus imágenes.
+
+    Args:
+        usuarios: Cantidad de enrolamientos exitosos
+        ruta: Archivo SQLite destino
+        carpeta_imagenes: Carpeta servida por el servidor de imágenes
+        url_imagenes: URL base de las imágenes (por defecto el servidor local)
+        business_context: Valor de @BusinessContext (por defecto el de AZURE_CONFIG)
+        dias: Los enrolamientos se reparten en los últimos `dias` días
+        proporcion_fallidos: Proporción extra de enrolamientos con LP_STATUS_PROCESS = 0
+        ancho, alto: Tamaño de las imágenes
+        semilla: Semilla para que la siembra sea reproducible
+
+    Returns:
+        Resumen con usuarios, fallidos, ruta y rango de fechas.
+    """
+    ruta = Path(ruta or ruta_fuente_local())
+    url_imagenes = (url_imagenes or f"http://127.0.0.1:{PUERTO_IMAGENES}").rstrip('/')
+    if not business_context:
+        try:
+            from config import AZURE_CONFIG
+            business_context = AZURE_CONFIG.get('business_context', "")
+        except ImportError:
+            business_context = ""
+
+    generador = random.Random(semilla)
+    carpeta_imagenes = Path(carpeta_imagenes)
+    carpeta_imagenes.mkdir(parents=True, exist_ok=True)
+    if ruta.exists():
+        ruta.unlink()
+
+    fin = datetime.now().replace(microsecond=0)
+    inicio = fin - timedelta(days=dias)
+    total = usuarios + int(usuarios * proporcion_fallidos)
+
+    # Fechas ordenadas para que LP_ID crezca con la fecha, como en MiID
+    segundos = sorted(generador.randrange(dias * 86400) for _ in range(total))
+    fallidos = set(generador.sample(range(total), total - usuarios))
+
+    conexion = sqlite3.connect(str(ruta))
+    try:
+        conexion.executescript(_ESQUEMA)
+        personas, enrolamientos, imagenes = [], [], []
+        for indice in range(total):
+            per_id = lp_id = indice + 1
+            documento = str(10000000 + indice)
+            nombre = "" if generador.random() < 0.02 else f"Usuario {indice}"
+            estado = 0 if indice in fallidos else 1
+            fecha = (inicio + timedelta(seconds=segundos[indice])).strftime(FORMATO_FECHA)
+            personas.append((per_id, documento, nombre))
+            enrolamientos.append((lp_id, per_id, 11000, estado, fecha))
+            if estado:
+                imagenes.append((lp_id, business_context, f"{url_imagenes}/{documento}.jpg"))
+                archivo = carpeta_imagenes / f"{documento}.jpg"
+                if not archivo.exists():
+                    _crear_imagen(archivo, semilla + indice, ancho, alto)
+
+        conexion.executemany("INSERT INTO person VALUES (?, ?, ?)", personas)
+        conexion.executemany("INSERT INTO log_process_enroll VALUES (?, ?, ?, ?, ?)", enrolamientos)
+        conexion.executemany("INSERT INTO match_id_img_face VALUES (?, ?, ?)", imagenes)
+        conexion.commit()
+    finally:
+        conexion.close()
+
+    resumen = {
+        'usuarios': usuarios,
+        'fallidos': len(fallidos),
+        'ruta': str(ruta),
+        'carpeta_imagenes': str(carpeta_imagenes),
+        'desde': inicio.strftime(FORMATO_FECHA),
+        'hasta': fin.strftime(FORMATO_FECHA),
+    }
+    logger.info(f"Base local sembrada: {resumen}")
+    return resumen
+
+
+class ServidorImagenes:
+    """
+    Servidor HTTP de archivos estáticos para las URLs de imagen sembradas.
+
+    Uso:
+        with ServidorImagenes(puerto=8082):
+            ...
+    """
+
+    def __init__(self, carpeta: Path = CARPETA_IMAGENES, host: str = "127.0.0.1", puerto: int = PUERTO_IMAGENES):
+        # http.server solo hace falta aquí: no se carga al importar el módulo
+        from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+        class _ManejadorImagenes(SimpleHTTPRequestHandler):
+            def log_message(self, formato, *args):
+                # Silenciar el log por solicitud de http.server
+                pass
+
+        manejador = partial(_ManejadorImagenes, directory=str(carpeta))
+        self._servidor = ThreadingHTTPServer((host, puerto), manejador)
+        self._servidor.daemon_threads = True
+        self._hilo = None
+
+    @property
+    def url(self) -> str:
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def iniciar(self) -> "ServidorImagenes":
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name="servidor-imagenes", daemon=True)
+        self._hilo.start()
+        logger.info(f"Servidor de imágenes en {self.url}")
+        return self
+
+    def detener(self) -> None:
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self) -> "ServidorImagenes":
+        return self.iniciar()
+
+    def __exit__(self, *args) -> None:
+        self.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Datos locales (SQLite + imágenes) para pruebas sin MiID ni Azure")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    sembrar_parser = subparsers.add_parser("sembrar", help="Crear la base local con N enrolamientos e imágenes")
+    sembrar_parser.add_argument("--usuarios", type=int, default=1000)
+    sembrar_parser.add_argument("--ruta", type=Path, default=None, help="Archivo SQLite (por defecto FUENTE_DATOS['ruta'])")
+    sembrar_parser.add_argument("--carpeta-imagenes", type=Path, default=CARPETA_IMAGENES)
+    sembrar_parser.add_argument("--url-imagenes", default=None, help="URL base de las imágenes")
+    sembrar_parser.add_argument("--dias", type=int, default=365)
+    sembrar_parser.add_argument("--ancho", type=int, default=480)
+    sembrar_parser.add_argument("--alto", type=int, default=640)
+    sembrar_parser.add_argument("--semilla", type=int, default=42)
+
+    servir_parser = subparsers.add_parser("servir", help="Servir las imágenes por HTTP")
+    servir_parser.add_argument("--carpeta-imagenes", type=Path, default=CARPETA_IMAGENES)
+    servir_parser.add_argument("--puerto", type=int, default=PUERTO_IMAGENES)
+
+    args = parser.parse_args()
+
+    if args.comando == "sembrar":
+        sembrar(
+            args.usuarios,
+            ruta=args.ruta,
+            carpeta_imagenes=args.carpeta_imagenes,
+            url_imagenes=args.url_imagenes,
+            dias=args.dias,
+            ancho=args.ancho,
+            alto=args.alto,
+            semilla=args.semilla,
+        )
+    else:
+        servidor = ServidorImagenes(args.carpeta_imagenes, puerto=args.puerto).iniciar()
+        print(f"Sirviendo {args.carpeta_imagenes} en {servidor.url}. Ctrl+C para detener.")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            servidor.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro de equipos ControlId y ejecutor de fan-out.
+
+Una sede puede tener varios torniquetes y lectores que necesitan los mismos
+usuarios. El registro lee la lista de equipos de `CONTROL_ID_DISPOSITIVOS`
+(o usa `CONTROL_ID_CONFIG` como único equipo) y el ejecutor envía un mismo
+enrolamiento a todos los equipos en paralelo: la imagen se descarga y se lee
+una sola vez, cada equipo tiene su propio límite de concurrencia y un equipo
+lento o apagado no detiene a los demás: un equipo con el circuito abierto no se
+intenta, y una vez que responde el primero los demás tienen `espera_rezagados`
+segundos; los que no terminan se devuelven como pendientes y siguen en segundo
+plano en su propio pool (ver EjecutorFanOut.sincronizar).
+
+Ejemplo en config.py:
+    CONTROL_ID_DISPOSITIVOS = [
+        {"nombre": "Torniquete 1", "base_url": "http://192.168.5.8", "login": "admin", "password": "admin"},
+        {"nombre": "Lector Parqueadero", "base_url": "http://192.168.5.9", "login": "admin",
+         "password": "admin", "max_concurrencia": 1},
+    ]
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from flujo_usuario_inteligente import (
+    asignar_imagen_usuario,
+    obtener_sesion,
+    procesar_usuario_inteligente,
+)
+from metricas import registrar_cache
+from resiliencia import equipo_inalcanzable
+from config import CONTROL_ID_CONFIG
+try:
+    from config import CONTROL_ID_DISPOSITIVOS
+except ImportError:
+    CONTROL_ID_DISPOSITIVOS = []
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Trabajos simultáneos por equipo si el equipo no define max_concurrencia
+MAX_CONCURRENCIA_POR_DISPOSITIVO = 2
+
+# Segundos máximos que el fan-out espera si ningún equipo responde
+TIMEOUT_FAN_OUT = 20
+
+# Segundos que se espera a los demás equipos después de que responde el primero
+ESPERA_REZAGADOS = 5
+
+
+def cargar_dispositivos(dispositivos: Optional[List[Dict[str, Any]]] = None,
+                        config_base: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Normaliza la lista de equipos configurados.
+
+    Args:
+        dispositivos: Lista de equipos (por defecto CONTROL_ID_DISPOSITIVOS)
+        config_base: Configuración de respaldo (por defecto CONTROL_ID_CONFIG)
+
+    Returns:
+        Lista de equipos con nombre, base_url, login, password y max_concurrencia.
+    """
+    config_base = config_base or CONTROL_ID_CONFIG
+    origen = dispositivos if dispositivos is not None else CONTROL_ID_DISPOSITIVOS
+    if not origen:
+        origen = [dict(config_base, nombre="principal")]
+
+    normalizados = []
+    for indice, dispositivo in enumerate(origen, start=1):
+        normalizados.append({
+            'nombre': dispositivo.get('nombre') or f"equipo_{indice}",
+            'base_url': dispositivo['base_url'].rstrip('/'),
+            'login': dispositivo.get('login', config_base.get('login')),
+            'password': dispositivo.get('password', config_base.get('password')),
+            'max_concurrencia': int(dispositivo.get('max_concurrencia', MAX_CONCURRENCIA_POR_DISPOSITIVO)),
+        })
+    return normalizados
+
+
+class EstadisticasDispositivo:
+    """Contadores de éxito y latencia de un equipo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.exitos = 0
+        self.fallos = 0
+        self.latencia_ultima = 0.0
+        self.latencia_total = 0.0
+        self.ultimo_error = ""
+
+    def registrar(self, exito: bool, latencia: float, error: str = "") -> None:
+        with self._lock:
+            if exito:
+                self.exitos += 1
+            else:
+                self.fallos += 1
+                self.ultimo_error = error
+            self.latencia_ultima = latencia
+            self.latencia_total += latencia
+
+    def resumen(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.exitos + self.fallos
+            return {
+                'exitos': self.exitos,
+                'fallos': self.fallos,
+                'latencia_ultima': self.latencia_ultima,
+                'latencia_promedio': self.latencia_total / total if total else 0.0,
+                'ultimo_error': self.ultimo_error,
+            }
+
+
+class RegistroDispositivos:
+    """
+    Equipos ControlId conocidos, con su sesión y sus estadísticas.
+    """
+
+    def __init__(self, dispositivos: Optional[List[Dict[str, Any]]] = None,
+                 config_base: Optional[Dict[str, Any]] = None):
+        self.dispositivos = cargar_dispositivos(dispositivos, config_base)
+        self._lock = threading.Lock()
+        self._sesiones: Dict[str, Optional[str]] = {}
+        self.estadisticas = {d['nombre']: EstadisticasDispositivo() for d in self.dispositivos}
+
+    def __len__(self) -> int:
+        return len(self.dispositivos)
+
+    def sesion(self, dispositivo: Dict[str, Any]) -> Optional[str]:
+        """Devuelve la sesión del equipo, iniciando sesión si no hay una."""
+        nombre = dispositivo['nombre']
+        with self._lock:
+            sesion = self._sesiones.get(nombre)
+        registrar_cache("sesiones", bool(sesion))
+        if sesion:
+            return sesion
+
+        sesion = obtener_sesion(dispositivo)
+        with self._lock:
+            self._sesiones[nombre] = sesion
+        return sesion
+
+    def invalidar_sesion(self, nombre: str) -> None:
+        """Olvida la sesión de un equipo (p. ej. tras un error) para forzar re-login."""
+        with self._lock:
+            self._sesiones.pop(nombre, None)
+
+    def obtener(self, nombre: str) -> Optional[Dict[str, Any]]:
+        """Devuelve el equipo con ese nombre, o None si ya no está configurado."""
+        for dispositivo in self.dispositivos:
+            if dispositivo['nombre'] == nombre:
+                return dispositivo
+        return None
+
+    def sincronizar_usuario(self, dispositivo: Dict[str, Any], usuario: Dict[str, Any],
+                            ruta_imagen: Optional[str] = None, image_data: Optional[bytes] = None) -> Dict[str, Any]:
+        """
+        Crea o modifica el usuario (con grupo e imagen) en un equipo.
+
+        Returns:
+            Diccionario con exito, user_id, latencia, error e inalcanzable
+            (True si el fallo se debe a que el equipo no responde).
+        """
+        nombre = dispositivo['nombre']
+        inicio = time.monotonic()
+        error = ""
+        user_id = None
+        try:
+            session = self.sesion(dispositivo)
+            if not session:
+                error = "sin sesión"
+            else:
+                user_id = procesar_usuario_inteligente(
+                    session, usuario['nombre'], usuario['documento'], dispositivo['base_url']
+                )
+                if not user_id:
+                    error = "no se pudo crear/modificar el usuario"
+                elif ruta_imagen and not asignar_imagen_usuario(
+                    session, user_id, ruta_imagen, dispositivo['base_url'], image_data
+                ):
+                    error = "no se pudo asignar la imagen"
+        except Exception as e:
+            error = str(e)
+
+        exito = user_id is not None and not error
+        if not exito:
+            # La sesión pudo haber expirado o el equipo reiniciado
+            self.invalidar_sesion(nombre)
+        latencia = time.monotonic() - inicio
+        self.estadisticas[nombre].registrar(exito, latencia, error)
+        return {
+            'exito': exito,
+            'user_id': user_id,
+            'latencia': latencia,
+            'error': error,
+            'inalcanzable': not exito and equipo_inalcanzable(dispositivo['base_url']),
+        }
+
+    def resumen(self) -> Dict[str, Dict[str, Any]]:
+        """Estadísticas por equipo."""
+        return {nombre: estadisticas.resumen() for nombre, estadisticas in self.estadisticas.items()}
+
+
+class EjecutorFanOut:
+    """
+    Envía un enrolamiento a todos los equipos del registro en paralelo.
+
+    Cada equipo tiene su propio pool de hilos del tamaño de su max_concurrencia:
+    así el trabajo acumulado de un equipo lento queda en su propia fila y nunca
+    ocupa los hilos de los demás.
+
+    Args:
+        registro: Registro de equipos
+        timeout: Espera máxima si ningún equipo responde
+        espera_rezagados: Espera a los demás equipos una vez que respondió el primero
+    """
+
+    def __init__(self, registro: RegistroDispositivos, timeout: float = TIMEOUT_FAN_OUT,
+                 espera_rezagados: float = ESPERA_REZAGADOS):
+        self.registro = registro
+        self.timeout = timeout
+        self.espera_rezagados = espera_rezagados
+        self._lock = threading.Lock()
+        # (equipo, documento) con un envío todavía en curso
+        self._en_curso: Set[Tuple[str, str]] = set()
+        self._executors = {
+            d['nombre']: ThreadPoolExecutor(max_workers=max(1, d['max_concurrencia']),
+                                            thread_name_prefix=f"fan-out-{d['nombre']}")
+            for d in registro.dispositivos
+        }
+
+    def en_curso(self, nombre: str, documento: str) -> bool:
+        """True si todavía hay un envío del documento a ese equipo (p. ej. un rezagado)."""
+        with self._lock:
+            return (nombre, str(documento)) in self._en_curso
+
+    def _terminado(self, clave: Tuple[str, str], futuro: Future) -> None:
+        with self._lock:
+            self._en_curso.discard(clave)
+
+    def sincronizar(self, usuario: Dict[str, Any], ruta_imagen: Optional[str] = None,
+                    excluir: Optional[Set[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Sincroniza un usuario en todos los equipos.
+
+        No espera a los equipos lentos o caídos: los que tienen el circuito
+        abierto no se intentan, y los que no terminan `espera_rezagados`
+        segundos después del primero que respondió (o dentro del timeout, si
+        ninguno respondió) se devuelven como rezagados y siguen en segundo plano.
+
+        Args:
+            usuario: Diccionario con nombre y documento
+            ruta_imagen: Ruta de la imagen ya descargada (opcional)
+            excluir: Equipos a los que no se envía (p. ej. con el documento
+                pendiente en el outbox: el envío se fusiona allí)
+
+        Returns:
+            Resultado por nombre de equipo. Los equipos no intentados y los
+            rezagados aparecen con inalcanzable=True, para dejarlos en el
+            outbox; los rezagados traen además `futuro`, con el resultado del
+            envío que sigue en curso.
+        """
+        image_data = None
+        if ruta_imagen and Path(ruta_imagen).exists():
+            # Leer la imagen una sola vez para todos los equipos
+            image_data = Path(ruta_imagen).read_bytes()
+        else:
+            ruta_imagen = None
+
+        documento = str(usuario['documento'])
+        resultados = {}
+        futuros = {}
+        for dispositivo in self.registro.dispositivos:
+            nombre = dispositivo['nombre']
+            if excluir and nombre in excluir:
+                resultados[nombre] = {
+                    'exito': False, 'user_id': None, 'latencia': 0.0,
+                    'error': "pendiente en el outbox", 'inalcanzable': True,
+                }
+                continue
+            if equipo_inalcanzable(dispositivo['base_url']):
+                resultados[nombre] = {
+                    'exito': False, 'user_id': None, 'latencia': 0.0,
+                    'error': "equipo inalcanzable", 'inalcanzable': True,
+                }
+                continue
+            clave = (nombre, documento)
+            with self._lock:
+                self._en_curso.add(clave)
+            # Cada equipo corre en su propio hilo con una copia del contexto, para
+            # que sus spans queden dentro de la traza del usuario
+            futuro = self._executors[nombre].submit(
+                contextvars.copy_context().run, self.registro.sincronizar_usuario,
+                dispositivo, usuario, ruta_imagen, image_data
+            )
+            futuro.add_done_callback(lambda f, clave=clave: self._terminado(clave, f))
+            futuros[futuro] = nombre
+
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        pendientes = set(futuros)
+        while pendientes:
+            hechos, pendientes = wait(pendientes, timeout=max(0.0, limite - time.monotonic()),
+                                      return_when=FIRST_COMPLETED)
+            if not hechos:
+                break
+            # Respondió un equipo: los demás tienen espera_rezagados como máximo
+            limite = min(limite, time.monotonic() + self.espera_rezagados)
+
+        for futuro, nombre in futuros.items():
+            if futuro not in pendientes:
+                resultados[nombre] = futuro.result()
+                continue
+            resultados[nombre] = {
+                'exito': False, 'user_id': None, 'latencia': time.monotonic() - inicio,
+                'error': "sin respuesta a tiempo", 'inalcanzable': True, 'futuro': futuro,
+            }
+        return resultados
+
+    def cerrar(self) -> None:
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
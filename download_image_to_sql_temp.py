@@ -5,11 +5,23 @@ Descargo la imagen desde Azure SQL vía SP y la guardo localmente
 para que UpdatePhoto se encargue de cargarla a ControlId.
 """
 
-import pyodbc
 import requests
 import json
-from typing import Optional
+import time
+from typing import Any, Dict, Optional
 from pathlib import Path
+from resiliencia import solicitud_http
+from datos_locales import conectar_local, usar_fuente_local
+from metricas import BYTES_DESCARGADOS, DESCARGAS, LATENCIA_DESCARGA
+from preprocesado import preprocesar_imagen
+from trazas import trazar
+from validacion_imagen import aceptar_imagen, olvidar_rechazo
+
+try:
+    import pyodbc
+except ImportError:
+    # Solo hace falta contra Azure SQL; la fuente local usa SQLite
+    pyodbc = None
 
 # Importar configuración
 try:
@@ -18,7 +30,7 @@ except ImportError:
     print("  Error: No se pudo importar config.py")
     exit(1)
 
-def conectar_base_datos(servidor: str, base_datos: str, usuario: str, contraseña: str) -> pyodbc.Connection:
+def conectar_base_datos(servidor: str, base_datos: str, usuario: str, contraseña: str) -> "pyodbc.Connection":
     """
     Abro conexión a Azure SQL con ODBC 17 y TLS y devuelvo la conexión lista
     para ejecutar SPs.
@@ -33,8 +45,15 @@ def conectar_base_datos(servidor: str, base_datos: str, usuario: str, contraseñ
         Conexión activa a la base de datos.
     
     Raises:
+        ImportError: Si pyodbc no está instalado (y la fuente no es local).
         pyodbc.Error: Si falla la conexión.
     """
+    if usar_fuente_local():
+        return conectar_local()
+
+    if pyodbc is None:
+        raise ImportError("pyodbc no instalado: se necesita para conectar a Azure SQL (pip install pyodbc)")
+
     try:
         # Cadena de conexión para SQL Server en Azure
         connection_string = (
@@ -56,8 +75,9 @@ def conectar_base_datos(servidor: str, base_datos: str, usuario: str, contraseñ
         print(f"Error al conectar a la base de datos: {e}")
         raise
 
-def ejecutar_stored_procedure(conexion: pyodbc.Connection, nombre_sp: str, 
-                             lpid: str, business_context: str) -> Optional[pyodbc.Cursor]:
+@trazar("azure.sp")
+def ejecutar_stored_procedure(conexion: "pyodbc.Connection", nombre_sp: str, 
+                             lpid: str, business_context: str) -> Optional["pyodbc.Cursor"]:
     """
     Ejecuto el SP con parámetros y regreso el cursor para procesar la salida.
     
@@ -87,11 +107,11 @@ def ejecutar_stored_procedure(conexion: pyodbc.Connection, nombre_sp: str,
         print("Stored Procedure ejecutado exitosamente")
         return cursor
         
-    except pyodbc.Error as e:
+    except Exception as e:
         print(f"Error al ejecutar el Stored Procedure: {e}")
         raise
 
-def procesar_resultado_sp(cursor: pyodbc.Cursor) -> Optional[str]:
+def procesar_resultado_sp(cursor: "pyodbc.Cursor") -> Optional[str]:
     """
     Reviso el resultset para encontrar la columna que contenga la URL de la
     imagen y devuelvo la primera encontrada.
@@ -140,6 +160,7 @@ def procesar_resultado_sp(cursor: pyodbc.Cursor) -> Optional[str]:
         return None
 
 
+@trazar("descarga.imagen")
 def descargar_imagen(url: str, ruta_destino: Path) -> bool:
     """
     Descargo la imagen de la URL y la guardo localmente.
@@ -151,12 +172,15 @@ def descargar_imagen(url: str, ruta_destino: Path) -> bool:
     Returns:
         True si se descargó correctamente; False si falló.
     """
+    inicio = time.perf_counter()
     try:
         print(f"Descargando imagen desde: {url}")
         
-        # Realizar la descarga
-        response = requests.get(url, timeout=30)
+        # Realizar la descarga (con reintentos y circuit breaker por host)
+        response = solicitud_http("GET", url)
         response.raise_for_status()
+        LATENCIA_DESCARGA.observar(time.perf_counter() - inicio)
+        BYTES_DESCARGADOS.incrementar(len(response.content))
         
         # Guardar la imagen
         with open(ruta_destino, 'wb') as f:
@@ -166,18 +190,115 @@ def descargar_imagen(url: str, ruta_destino: Path) -> bool:
         if ruta_destino.exists():
             file_size = ruta_destino.stat().st_size
             print(f"Imagen descargada exitosamente. Tamaño: {file_size} bytes")
+            DESCARGAS.incrementar(resultado="exito")
             return True
         else:
             print("  Error: La imagen no se guardó correctamente")
+            DESCARGAS.incrementar(resultado="error_guardado")
             return False
             
     except requests.RequestException as e:
         print(f"Error al descargar imagen: {e}")
+        DESCARGAS.incrementar(resultado="error_http")
         return False
     except Exception as e:
         print(f"Error inesperado al guardar imagen: {e}")
+        DESCARGAS.incrementar(resultado="error_guardado")
         return False
 
+def obtener_url_imagen(conexion: "pyodbc.Connection", lpid: str,
+                       azure_config: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Ejecuto el SP para el LPID y devuelvo la URL de la imagen.
+
+    Args:
+        conexion: Conexión activa a Azure SQL
+        lpid: LP_ID del enrolamiento
+        azure_config: SP y business_context a usar; por defecto los de config.py
+            al importar (la GUI pasa los vigentes después de guardar la configuración)
+
+    Returns:
+        URL de la imagen, o None si el SP no devuelve una.
+
+    Raises:
+        pyodbc.Error: Si falla la ejecución del SP (error transitorio, no
+            significa que el registro no tenga imagen).
+    """
+    azure_config = azure_config or AZURE_CONFIG
+    cursor = ejecutar_stored_procedure(
+        conexion,
+        azure_config['stored_procedure'],
+        lpid,
+        azure_config['business_context']
+    )
+    if not cursor:
+        return None
+
+    try:
+        return procesar_resultado_sp(cursor)
+    finally:
+        cursor.close()
+
+
+def ruta_imagen_documento(documento: str, carpetas_config: Optional[Dict[str, Any]] = None) -> Path:
+    """
+    Ruta local de la imagen de un documento: <carpeta temporal>/<documento><extensión>.
+    `carpetas_config` por defecto es CARPETAS_CONFIG de config.py al importar.
+    """
+    carpetas_config = carpetas_config or CARPETAS_CONFIG
+    extension = carpetas_config.get('extension_imagen', '.jpg')
+    return Path(carpetas_config['carpeta_local_temp']) / f"{documento}{extension}"
+
+
+def descargar_imagen_documento(image_url: str, documento: str,
+                               carpetas_config: Optional[Dict[str, Any]] = None) -> Optional[Path]:
+    """
+    Descargo la imagen en la carpeta temporal (de `carpetas_config`, ver
+    ruta_imagen_documento) como <documento><extensión>.
+
+    Returns:
+        Ruta de la imagen descargada o None si falla o no pasa la validación
+        (solo en ese caso hay motivo en validacion_imagen.motivo_rechazo).
+    """
+    # Un rechazo de un intento anterior no debe atribuirse a un fallo de red de este
+    olvidar_rechazo(documento)
+    ruta_imagen = ruta_imagen_documento(documento, carpetas_config)
+    ruta_imagen.parent.mkdir(parents=True, exist_ok=True)
+
+    if not descargar_imagen(image_url, ruta_imagen):
+        return None
+    # Corrupta, truncada o diminuta: se descarta antes de cualquier envío
+    if not aceptar_imagen(ruta_imagen, documento, image_url):
+        return None
+    # Resolución y calidad acotadas antes de enviarla a los equipos
+    preprocesar_imagen(ruta_imagen)
+    return ruta_imagen
+
+
+@trazar("descarga.por_lpid", falla_si_none=True)
+def descargar_imagen_por_lpid(conexion: "pyodbc.Connection", lpid: str, documento: str,
+                              azure_config: Optional[Dict[str, Any]] = None,
+                              carpetas_config: Optional[Dict[str, Any]] = None) -> Optional[Path]:
+    """
+    Ejecuto el SP para el LPID, resuelvo la URL y descargo la imagen en la
+    carpeta temporal usando una conexión ya abierta (así un proceso por lotes
+    reutiliza la misma conexión para muchos usuarios).
+
+    Args:
+        conexion: Conexión activa a Azure SQL
+        lpid: LP_ID del enrolamiento
+        documento: Número de documento (nombre del archivo)
+        azure_config: Ver obtener_url_imagen
+        carpetas_config: Ver ruta_imagen_documento
+
+    Returns:
+        Ruta de la imagen descargada o None si no hay imagen o falla.
+    """
+    image_url = obtener_url_imagen(conexion, lpid, azure_config)
+    if not image_url:
+        return None
+    return descargar_imagen_documento(image_url, documento, carpetas_config)
+
 def obtener_usuario_actual():
     """
     Obtiene el usuario desde el archivo JSON generado por GetUserMiID.py
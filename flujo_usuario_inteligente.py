@@ -10,9 +10,14 @@ Script que implementa el flujo inteligente de usuarios:
 import requests
 import json
 import logging
+import time
 from pathlib import Path
 from typing import Optional, Dict, Any
 from GetUserMiID import obtener_ultimo_usuario_midd
+from limites_dispositivo import clave_dispositivo, obtener_limitador
+from metricas import LATENCIA_EQUIPO, RELOGINS, SOLICITUDES_EQUIPO
+from resiliencia import TIMEOUT_HTTP, solicitud_http
+from trazas import span, trazar
 from config import CONTROL_ID_CONFIG
 
 # Configuración de logging
@@ -31,13 +36,46 @@ def set_control_id_config(new_config: Dict[str, Any]) -> None:
     global CONTROL_ID_CONFIG
     CONTROL_ID_CONFIG = new_config
 
-def buscar_usuario_por_registration(session: str, registration: str) -> Optional[Dict[str, Any]]:
+def _base_url(base_url: Optional[str] = None) -> str:
+    """Devuelve la URL del equipo indicado o la del equipo configurado por defecto."""
+    return base_url or CONTROL_ID_CONFIG['base_url']
+
+def _post_controlid(url: str, idempotente: bool = True, **kwargs) -> requests.Response:
+    """
+    Envía un POST a un equipo ControlId respetando su límite de solicitudes
+    en vuelo y su tasa máxima (ver limites_dispositivo), protegido por el
+    circuit breaker del equipo y con reintentos si la operación es idempotente
+    (ver resiliencia).
+    """
+    limitador = obtener_limitador(url)
+
+    def _enviar(metodo, url, **kw):
+        with limitador.turno():
+            return requests.request(metodo, url, **kw)
+
+    equipo = clave_dispositivo(url)
+    endpoint = url.split('?')[0].rsplit('/', 1)[-1].replace('.fcgi', '')
+    inicio = time.perf_counter()
+    estado = "error"
+    try:
+        with span("controlid.http", url=url.split('?')[0]) as s:
+            response = solicitud_http("POST", url, idempotente=idempotente, enviar=_enviar, **kwargs)
+            s.atributo("status", response.status_code)
+            estado = str(response.status_code)
+            return response
+    finally:
+        SOLICITUDES_EQUIPO.incrementar(equipo=equipo, endpoint=endpoint, estado=estado)
+        LATENCIA_EQUIPO.observar(time.perf_counter() - inicio, equipo=equipo, endpoint=endpoint)
+
+@trazar("controlid.buscar")
+def buscar_usuario_por_registration(session: str, registration: str, base_url: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
     Busca un usuario por su número de documento (registration).
     
     Args:
         session: Token de sesión
         registration: Número de documento a buscar
+        base_url: URL del equipo (por defecto CONTROL_ID_CONFIG['base_url'])
         
     Returns:
         Diccionario con datos del usuario si existe, None si no existe
@@ -45,14 +83,14 @@ def buscar_usuario_por_registration(session: str, registration: str) -> Optional
     try:
         logger.info(f"Buscando usuario con documento: {registration}")
         
-        url = f"{CONTROL_ID_CONFIG['base_url']}/load_objects.fcgi"
+        url = f"{_base_url(base_url)}/load_objects.fcgi"
         params = {'session': session}
         payload = {
             "object": "users"
         }
         headers = {"Content-Type": "application/json"}
         
-        response = requests.post(url, params=params, headers=headers, json=payload, timeout=30)
+        response = _post_controlid(url, params=params, headers=headers, json=payload, timeout=TIMEOUT_HTTP)
         response.raise_for_status()
         
         # Parsear respuesta
@@ -81,7 +119,8 @@ def buscar_usuario_por_registration(session: str, registration: str) -> Optional
         logger.error(f"Error inesperado al buscar usuario: {e}")
         return None
 
-def crear_usuario_nuevo(session: str, nombre: str, documento: str) -> Optional[str]:
+@trazar("controlid.crear", falla_si_none=True)
+def crear_usuario_nuevo(session: str, nombre: str, documento: str, base_url: Optional[str] = None) -> Optional[str]:
     """
     Crea un nuevo usuario en ControlId.
     
@@ -89,6 +128,7 @@ def crear_usuario_nuevo(session: str, nombre: str, documento: str) -> Optional[s
         session: Token de sesión
         nombre: Nombre del usuario
         documento: Número de documento
+        base_url: URL del equipo (por defecto CONTROL_ID_CONFIG['base_url'])
         
     Returns:
         ID del usuario creado o None si falla
@@ -96,7 +136,7 @@ def crear_usuario_nuevo(session: str, nombre: str, documento: str) -> Optional[s
     try:
         logger.info(f"Creando nuevo usuario: {nombre} ({documento})")
         
-        url = f"{CONTROL_ID_CONFIG['base_url']}/create_objects.fcgi"
+        url = f"{_base_url(base_url)}/create_objects.fcgi"
         params = {'session': session}
         payload = {
             "object": "users",
@@ -111,7 +151,8 @@ def crear_usuario_nuevo(session: str, nombre: str, documento: str) -> Optional[s
         }
         headers = {"Content-Type": "application/json"}
         
-        response = requests.post(url, params=params, headers=headers, json=payload, timeout=30)
+        # create_objects no es idempotente: un reintento podría duplicar el usuario
+        response = _post_controlid(url, idempotente=False, params=params, headers=headers, json=payload, timeout=TIMEOUT_HTTP)
         response.raise_for_status()
         
         response_data = response.json()
@@ -137,7 +178,8 @@ def crear_usuario_nuevo(session: str, nombre: str, documento: str) -> Optional[s
         logger.error(f"Error al crear usuario: {e}")
         return None
 
-def crear_grupo_para_usuario(session: str, user_id: str, group_id: int = 1002) -> bool:
+@trazar("controlid.grupo", falla_si_none=True)
+def crear_grupo_para_usuario(session: str, user_id: str, group_id: int = 1002, base_url: Optional[str] = None) -> bool:
     """
     Crea la relación user_groups para asignar un grupo fijo al usuario.
 
@@ -145,6 +187,7 @@ def crear_grupo_para_usuario(session: str, user_id: str, group_id: int = 1002) -
         session: Token de sesión
         user_id: ID del usuario
         group_id: ID del grupo (por defecto 1001)
+        base_url: URL del equipo (por defecto CONTROL_ID_CONFIG['base_url'])
 
     Returns:
         True si se creó correctamente o ya existía; False si falla.
@@ -152,12 +195,12 @@ def crear_grupo_para_usuario(session: str, user_id: str, group_id: int = 1002) -
     try:
         # Verificar si ya existe la relación
         try:
-            url_check = f"{CONTROL_ID_CONFIG['base_url']}/load_objects.fcgi"
+            url_check = f"{_base_url(base_url)}/load_objects.fcgi"
             params_check = {'session': session}
             payload_check = {"object": "user_groups"}
             headers_check = {"Content-Type": "application/json"}
-            resp_check = requests.post(
-                url_check, params=params_check, headers=headers_check, json=payload_check, timeout=30
+            resp_check = _post_controlid(
+                url_check, params=params_check, headers=headers_check, json=payload_check, timeout=TIMEOUT_HTTP
             )
             resp_check.raise_for_status()
             data_check = resp_check.json()
@@ -177,7 +220,7 @@ def crear_grupo_para_usuario(session: str, user_id: str, group_id: int = 1002) -
 
         logger.info(f"Asignando grupo {group_id} al usuario ID {user_id}")
 
-        url = f"{CONTROL_ID_CONFIG['base_url']}/create_objects.fcgi"
+        url = f"{_base_url(base_url)}/create_objects.fcgi"
         params = {'session': session}
         payload = {
             "object": "user_groups",
@@ -190,7 +233,7 @@ def crear_grupo_para_usuario(session: str, user_id: str, group_id: int = 1002) -
         }
         headers = {"Content-Type": "application/json"}
 
-        response = requests.post(url, params=params, headers=headers, json=payload, timeout=30)
+        response = _post_controlid(url, idempotente=False, params=params, headers=headers, json=payload, timeout=TIMEOUT_HTTP)
         # Algunos equipos devuelven 409/400 si ya existe; lo tratamos como éxito idempotente
         if response.status_code >= 200 and response.status_code < 300:
             logger.info("Grupo asignado correctamente")
@@ -222,7 +265,8 @@ def crear_grupo_para_usuario(session: str, user_id: str, group_id: int = 1002) -
         logger.error(f"Error inesperado al crear usuario: {e}")
         return None
 
-def modificar_usuario_existente(session: str, user_id: str, nombre: str, documento: str) -> bool:
+@trazar("controlid.modificar")
+def modificar_usuario_existente(session: str, user_id: str, nombre: str, documento: str, base_url: Optional[str] = None) -> bool:
     """
     Modifica un usuario existente en ControlId.
     
@@ -231,6 +275,7 @@ def modificar_usuario_existente(session: str, user_id: str, nombre: str, documen
         user_id: ID del usuario a modificar
         nombre: Nuevo nombre del usuario
         documento: Número de documento
+        base_url: URL del equipo (por defecto CONTROL_ID_CONFIG['base_url'])
         
     Returns:
         True si se modificó correctamente, False si falla
@@ -238,7 +283,7 @@ def modificar_usuario_existente(session: str, user_id: str, nombre: str, documen
     try:
         logger.info(f"Modificando usuario ID {user_id}: {nombre} ({documento})")
         
-        url = f"{CONTROL_ID_CONFIG['base_url']}/create_or_modify_objects.fcgi"
+        url = f"{_base_url(base_url)}/create_or_modify_objects.fcgi"
         params = {'session': session}
         payload = {
             "object": "users",
@@ -254,7 +299,7 @@ def modificar_usuario_existente(session: str, user_id: str, nombre: str, documen
         }
         headers = {"Content-Type": "application/json"}
         
-        response = requests.post(url, params=params, headers=headers, json=payload, timeout=30)
+        response = _post_controlid(url, params=params, headers=headers, json=payload, timeout=TIMEOUT_HTTP)
         response.raise_for_status()
         
         response_data = response.json()
@@ -270,7 +315,9 @@ def modificar_usuario_existente(session: str, user_id: str, nombre: str, documen
         logger.error(f"Error inesperado al modificar usuario: {e}")
         return False
 
-def asignar_imagen_usuario(session: str, user_id: str, ruta_imagen: str) -> bool:
+@trazar("controlid.foto")
+def asignar_imagen_usuario(session: str, user_id: str, ruta_imagen: str, base_url: Optional[str] = None,
+                           image_data: Optional[bytes] = None) -> bool:
     """
     Asigna una imagen a un usuario en ControlId.
     
@@ -278,6 +325,9 @@ def asignar_imagen_usuario(session: str, user_id: str, ruta_imagen: str) -> bool
         session: Token de sesión
         user_id: ID del usuario
         ruta_imagen: Ruta de la imagen a asignar
+        base_url: URL del equipo (por defecto CONTROL_ID_CONFIG['base_url'])
+        image_data: Bytes de la imagen ya leídos (evita releer el archivo al
+            enviar la misma imagen a varios equipos)
         
     Returns:
         True si se asignó correctamente, False si falla.
@@ -285,7 +335,7 @@ def asignar_imagen_usuario(session: str, user_id: str, ruta_imagen: str) -> bool
     try:
         logger.info(f"Asignando imagen al usuario ID: {user_id}")
         
-        url = f"{CONTROL_ID_CONFIG['base_url']}/user_set_image.fcgi"
+        url = f"{_base_url(base_url)}/user_set_image.fcgi"
         params = {
             'user_id': user_id,
             'match': '1',
@@ -295,10 +345,11 @@ def asignar_imagen_usuario(session: str, user_id: str, ruta_imagen: str) -> bool
         headers = {'Content-Type': 'application/octet-stream'}
         
         # Leer la imagen como datos binarios
-        with open(ruta_imagen, 'rb') as image_file:
-            image_data = image_file.read()
+        if image_data is None:
+            with open(ruta_imagen, 'rb') as image_file:
+                image_data = image_file.read()
         
-        response = requests.post(url, params=params, headers=headers, data=image_data, timeout=30)
+        response = _post_controlid(url, params=params, headers=headers, data=image_data, timeout=TIMEOUT_HTTP)
         response.raise_for_status()
         
         logger.info("Imagen asignada exitosamente al usuario")
@@ -311,7 +362,8 @@ def asignar_imagen_usuario(session: str, user_id: str, ruta_imagen: str) -> bool
         logger.error(f"Error inesperado al asignar imagen: {e}")
         return False
 
-def procesar_usuario_inteligente(session: str, nombre: str, documento: str) -> Optional[str]:
+@trazar("controlid.usuario", falla_si_none=True)
+def procesar_usuario_inteligente(session: str, nombre: str, documento: str, base_url: Optional[str] = None) -> Optional[str]:
     """
     Procesa un usuario de manera inteligente: busca si existe, si no existe lo crea,
     si existe lo modifica.
@@ -320,6 +372,7 @@ def procesar_usuario_inteligente(session: str, nombre: str, documento: str) -> O
         session: Token de sesión
         nombre: Nombre del usuario
         documento: Número de documento
+        base_url: URL del equipo (por defecto CONTROL_ID_CONFIG['base_url'])
         
     Returns:
         ID del usuario (creado o modificado) o None si falla
@@ -337,16 +390,16 @@ def procesar_usuario_inteligente(session: str, nombre: str, documento: str) -> O
         logger.info(f"Procesando usuario: '{nombre}' ({documento})")
         
         # Paso 1: Buscar usuario existente
-        usuario_existente = buscar_usuario_por_registration(session, documento)
+        usuario_existente = buscar_usuario_por_registration(session, documento, base_url)
         
         if usuario_existente:
             # Usuario existe: modificar
             logger.info("Usuario existe, procediendo a modificar...")
             user_id = usuario_existente.get('id')
-            if modificar_usuario_existente(session, str(user_id), nombre, documento):
+            if modificar_usuario_existente(session, str(user_id), nombre, documento, base_url):
                 logger.info(f"Usuario modificado exitosamente. ID: {user_id}")
                 # Asegurar asignación de grupo fijo 1002
-                if not crear_grupo_para_usuario(session, str(user_id), 1002):
+                if not crear_grupo_para_usuario(session, str(user_id), 1002, base_url):
                     logger.warning("No se pudo asignar el grupo al usuario modificado")
                 return str(user_id)
             else:
@@ -355,11 +408,11 @@ def procesar_usuario_inteligente(session: str, nombre: str, documento: str) -> O
         else:
             # Usuario no existe: crear
             logger.info("Usuario no existe, procediendo a crear...")
-            user_id = crear_usuario_nuevo(session, nombre, documento)
+            user_id = crear_usuario_nuevo(session, nombre, documento, base_url)
             if user_id:
                 logger.info(f"Usuario creado exitosamente. ID: {user_id}")
                 # Asignar grupo fijo 1002 al usuario recién creado
-                if not crear_grupo_para_usuario(session, user_id, 1002):
+                if not crear_grupo_para_usuario(session, user_id, 1002, base_url):
                     logger.warning("No se pudo asignar el grupo al nuevo usuario")
                 return user_id
             else:
@@ -370,7 +423,8 @@ def procesar_usuario_inteligente(session: str, nombre: str, documento: str) -> O
         logger.error(f"Error en el procesamiento inteligente: {e}")
         return None
 
-def procesar_usuario_con_imagen(session: str, nombre: str, documento: str, ruta_imagen: str) -> Optional[str]:
+def procesar_usuario_con_imagen(session: str, nombre: str, documento: str, ruta_imagen: str,
+                                base_url: Optional[str] = None, image_data: Optional[bytes] = None) -> Optional[str]:
     """
     Procesa un usuario de manera inteligente y le asigna una imagen.
     
@@ -379,6 +433,8 @@ def procesar_usuario_con_imagen(session: str, nombre: str, documento: str, ruta_
         nombre: Nombre del usuario
         documento: Número de documento
         ruta_imagen: Ruta de la imagen a asignar
+        base_url: URL del equipo (por defecto CONTROL_ID_CONFIG['base_url'])
+        image_data: Bytes de la imagen ya leídos (opcional)
         
     Returns:
         ID del usuario (creado o modificado) o None si falla
@@ -387,14 +443,14 @@ def procesar_usuario_con_imagen(session: str, nombre: str, documento: str, ruta_
         logger.info(f"Procesando usuario con imagen: {nombre} ({documento})")
         
         # Paso 1: Procesar usuario (crear o modificar)
-        user_id = procesar_usuario_inteligente(session, nombre, documento)
+        user_id = procesar_usuario_inteligente(session, nombre, documento, base_url)
         
         if not user_id:
             logger.error("Error al procesar usuario")
             return None
         
         # Paso 2: Asignar imagen
-        if asignar_imagen_usuario(session, user_id, ruta_imagen):
+        if asignar_imagen_usuario(session, user_id, ruta_imagen, base_url, image_data):
             logger.info(f"Usuario procesado y imagen asignada exitosamente. ID: {user_id}")
             return user_id
         else:
@@ -405,34 +461,44 @@ def procesar_usuario_con_imagen(session: str, nombre: str, documento: str, ruta_
         logger.error(f"Error en el procesamiento con imagen: {e}")
         return None
 
-def obtener_sesion():
+@trazar("controlid.login", falla_si_none=True)
+def obtener_sesion(dispositivo: Optional[Dict[str, Any]] = None):
     """
     Obtiene una sesión válida de ControlId.
+    
+    Args:
+        dispositivo: Diccionario con base_url, login y password de un equipo;
+            por defecto se usa CONTROL_ID_CONFIG
     """
+    dispositivo = dispositivo or CONTROL_ID_CONFIG
+    equipo = clave_dispositivo(dispositivo.get('base_url', ""))
     try:
         logger.info("Obteniendo sesión de ControlId...")
         
-        url = f"{CONTROL_ID_CONFIG['base_url']}/login.fcgi"
+        url = f"{dispositivo['base_url']}/login.fcgi"
         payload = {
-            "login": CONTROL_ID_CONFIG['login'],
-            "password": CONTROL_ID_CONFIG['password']
+            "login": dispositivo['login'],
+            "password": dispositivo['password']
         }
         headers = {"Content-Type": "application/json"}
         
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        response = _post_controlid(url, json=payload, headers=headers, timeout=TIMEOUT_HTTP)
         response.raise_for_status()
         
         response_data = response.json()
         if 'session' in response_data:
             session = response_data['session']
             logger.info(f"Sesión obtenida exitosamente: {session}")
+            RELOGINS.incrementar(equipo=equipo, resultado="exito")
             return session
         else:
             logger.error("No se encontró sesión en la respuesta del login")
+            RELOGINS.incrementar(equipo=equipo, resultado="error")
             return None
             
     except Exception as e:
         logger.error(f"Error al obtener sesión: {e}")
+        RELOGINS.incrementar(equipo=equipo, resultado="error")
         return None
 
 def main():
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Historial de actividad reciente de la sincronización.
+
+Buffer circular de tamaño fijo: agregar y leer cualquier tramo cuesta lo
+mismo con 50 o con 50.000 entradas, y la GUI solo pide el tramo visible
+(ver ControlIdGUI.refrescar_actividad), así que tampoco el redibujado crece
+con el historial.
+"""
+
+import threading
+import time
+from typing import List, Optional
+
+# Entradas recordadas (las más viejas se descartan)
+HISTORIAL_MAXIMO = 50000
+
+
+class EntradaHistorial:
+    """Resultado de la sincronización de un usuario."""
+
+    __slots__ = ('momento', 'documento', 'nombre', 'exito', 'duracion', 'ruta_imagen')
+
+    def __init__(self, documento: str, nombre: str, exito: bool, duracion: float,
+                 ruta_imagen: Optional[str] = None, momento: Optional[float] = None):
+        self.momento = momento if momento is not None else time.time()
+        self.documento = documento
+        self.nombre = nombre
+        self.exito = exito
+        self.duracion = duracion
+        self.ruta_imagen = ruta_imagen
+
+
+class HistorialActividad:
+    """
+    Últimas `maximo` entradas, de la más nueva a la más vieja.
+
+    Args:
+        maximo: Capacidad del buffer
+    """
+
+    def __init__(self, maximo: int = HISTORIAL_MAXIMO):
+        self.maximo = max(1, int(maximo))
+        self._buffer: List[EntradaHistorial] = []
+        self._lock = threading.Lock()
+        # Entradas agregadas desde el inicio (también sirve como versión)
+        self.agregadas = 0
+
+    def agregar(self, entrada: EntradaHistorial) -> None:
+        with self._lock:
+            if len(self._buffer) < self.maximo:
+                self._buffer.append(entrada)
+            else:
+                self._buffer[self.agregadas % self.maximo] = entrada
+            self.agregadas += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def tramo(self, desde: int, cantidad: int) -> List[EntradaHistorial]:
+        """
+        Entradas desde la posición `desde` (0 = la más nueva), como máximo `cantidad`.
+        """
+        with self._lock:
+            total = len(self._buffer)
+            hasta = min(total, desde + cantidad)
+            return [self._buffer[(self.agregadas - 1 - i) % self.maximo] for i in range(max(0, desde), hasta)]
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Intervalo adaptativo para el sondeo de MiID.
+
+Mientras siguen llegando enrolamientos nuevos el loop de sincronización
+consulta a MiID con el intervalo mínimo; cada ciclo sin novedades duplica
+(por `factor`) la espera hasta el máximo, y el primer enrolamiento nuevo la
+vuelve al mínimo. Así de noche no se consulta MiID cada pocos segundos y en
+una ráfaga de enrolamientos la latencia queda acotada por el mínimo.
+
+Configuración opcional en config.py:
+    SONDEO_CONFIG = {"intervalo_minimo": 1, "intervalo_maximo": 60, "factor": 2}
+"""
+
+import logging
+import threading
+from typing import Optional
+
+from metricas import INTERVALO_SONDEO
+
+try:
+    from config import SONDEO_CONFIG
+except ImportError:
+    SONDEO_CONFIG = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+INTERVALO_MINIMO = 1.0
+INTERVALO_MAXIMO = 60.0
+FACTOR = 2.0
+
+
+class IntervaloAdaptativo:
+    """
+    Espera entre consultas con retroceso exponencial mientras no hay novedades.
+
+    Args:
+        minimo: Segundos entre consultas mientras llegan enrolamientos
+        maximo: Techo de la espera cuando no hay novedades
+        factor: Multiplicador de la espera por cada ciclo sin novedades
+    """
+
+    def __init__(self, minimo: float = INTERVALO_MINIMO, maximo: float = INTERVALO_MAXIMO,
+                 factor: float = FACTOR):
+        self.minimo = max(0.1, float(minimo))
+        self.maximo = max(self.minimo, float(maximo))
+        self.factor = max(1.0, float(factor))
+        self.actual = self.minimo
+        self._despertar = threading.Event()
+        INTERVALO_SONDEO.fijar(self.actual)
+
+    def registrar(self, hubo_novedades: bool) -> float:
+        """
+        Ajusta la espera según el resultado del ciclo.
+
+        Returns:
+            Segundos hasta la próxima consulta.
+        """
+        if hubo_novedades:
+            self.actual = self.minimo
+        else:
+            self.actual = min(self.maximo, self.actual * self.factor)
+        INTERVALO_SONDEO.fijar(self.actual)
+        return self.actual
+
+    def reiniciar(self) -> None:
+        """Vuelve al intervalo mínimo (p. ej. al iniciar la sincronización)."""
+        self.actual = self.minimo
+        INTERVALO_SONDEO.fijar(self.actual)
+
+    def esperar(self, segundos: Optional[float] = None) -> bool:
+        """
+        Espera el intervalo actual (o `segundos`) salvo que se llame a despertar().
+
+        Returns:
+            True si se interrumpió la espera.
+        """
+        interrumpido = self._despertar.wait(self.actual if segundos is None else segundos)
+        self._despertar.clear()
+        return interrumpido
+
+    def despertar(self) -> None:
+        """Corta la espera en curso (detener la sincronización, consultar ya)."""
+        self._despertar.set()
+
+
+def crear_intervalo() -> IntervaloAdaptativo:
+    """Intervalo con la configuración de SONDEO_CONFIG."""
+    return IntervaloAdaptativo(
+        minimo=float(SONDEO_CONFIG.get('intervalo_minimo', INTERVALO_MINIMO)),
+        maximo=float(SONDEO_CONFIG.get('intervalo_maximo', INTERVALO_MAXIMO)),
+        factor=float(SONDEO_CONFIG.get('factor', FACTOR)),
+    )
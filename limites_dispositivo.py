@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Control de carga hacia los equipos ControlId.
+
+Los equipos son cajas embebidas con un servidor fcgi pequeño: si paralelizamos
+la sincronización sin control los saturamos. Cada equipo (identificado por
+scheme://host:puerto) tiene:
+- un límite de solicitudes en vuelo (semáforo), y
+- un token bucket que limita las solicitudes por segundo con una ráfaga máxima.
+
+El tiempo que una solicitud espera turno (semáforo + token) se acumula como
+"demora de cola" por equipo, para poder ajustar los límites al máximo
+throughput seguro.
+
+Configuración opcional en config.py:
+    CONTROL_ID_LIMITES = {
+        "max_en_vuelo": 2,
+        "solicitudes_por_segundo": 10,
+        "rafaga": 5,
+        "por_equipo": {
+            "http://192.168.5.9": {"max_en_vuelo": 1, "solicitudes_por_segundo": 4},
+        },
+    }
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+try:
+    from config import CONTROL_ID_LIMITES
+except ImportError:
+    CONTROL_ID_LIMITES = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Valores por defecto si config.py no define CONTROL_ID_LIMITES
+MAX_EN_VUELO = 2
+SOLICITUDES_POR_SEGUNDO = 10.0
+RAFAGA = 5
+
+
+class TokenBucket:
+    """
+    Token bucket con reserva: cada solicitud toma un token (el saldo puede
+    quedar negativo) y espera lo que falte para que ese token se genere. Así
+    las solicitudes se atienden en orden de llegada sin sondeos.
+
+    Args:
+        tasa: Tokens por segundo (<= 0 desactiva el límite)
+        capacidad: Tokens máximos acumulables (tamaño de ráfaga)
+    """
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = float(tasa)
+        self.capacidad = max(1.0, float(capacidad))
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self) -> float:
+        """
+        Toma un token, esperando si hace falta.
+
+        Returns:
+            Segundos esperados.
+        """
+        if self.tasa <= 0:
+            return 0.0
+
+        with self._lock:
+            ahora = time.monotonic()
+            self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+            self._ultimo = ahora
+            self._tokens -= 1
+            espera = -self._tokens / self.tasa if self._tokens < 0 else 0.0
+
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+
+class LimitadorDispositivo:
+    """
+    Límite de solicitudes en vuelo + token bucket de un equipo, con
+    estadísticas de demora de cola.
+    """
+
+    def __init__(self, clave: str, max_en_vuelo: int = MAX_EN_VUELO,
+                 solicitudes_por_segundo: float = SOLICITUDES_POR_SEGUNDO, rafaga: int = RAFAGA):
+        self.clave = clave
+        self.max_en_vuelo = max(1, int(max_en_vuelo))
+        self._semaforo = threading.BoundedSemaphore(self.max_en_vuelo)
+        self._bucket = TokenBucket(solicitudes_por_segundo, rafaga)
+        self._lock = threading.Lock()
+        self.en_vuelo = 0
+        self.en_espera = 0
+        self.solicitudes = 0
+        self.demora_total = 0.0
+        self.demora_maxima = 0.0
+        self.demora_ultima = 0.0
+
+    @contextmanager
+    def turno(self):
+        """
+        Espera turno para enviar una solicitud al equipo.
+
+        Uso:
+            with limitador.turno():
+                requests.post(...)
+        """
+        inicio = time.monotonic()
+        with self._lock:
+            self.en_espera += 1
+        self._semaforo.acquire()
+        try:
+            self._bucket.adquirir()
+            demora = time.monotonic() - inicio
+            with self._lock:
+                self.en_espera -= 1
+                self.en_vuelo += 1
+                self.solicitudes += 1
+                self.demora_total += demora
+                self.demora_ultima = demora
+                self.demora_maxima = max(self.demora_maxima, demora)
+            try:
+                yield demora
+            finally:
+                with self._lock:
+                    self.en_vuelo -= 1
+        finally:
+            self._semaforo.release()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_en_vuelo': self.max_en_vuelo,
+                'en_vuelo': self.en_vuelo,
+                'en_espera': self.en_espera,
+                'solicitudes': self.solicitudes,
+                'demora_ultima': self.demora_ultima,
+                'demora_maxima': self.demora_maxima,
+                'demora_promedio': self.demora_total / self.solicitudes if self.solicitudes else 0.0,
+            }
+
+
+_limitadores: Dict[str, LimitadorDispositivo] = {}
+_limitadores_lock = threading.Lock()
+
+
+def clave_dispositivo(url: str) -> str:
+    """Clave de un equipo a partir de cualquier URL suya (scheme://host:puerto)."""
+    partes = urlsplit(url)
+    return f"{partes.scheme}://{partes.netloc}"
+
+
+def obtener_limitador(url: str, limites: Optional[Dict[str, Any]] = None) -> LimitadorDispositivo:
+    """
+    Devuelve (creándolo si hace falta) el limitador del equipo de la URL.
+
+    Args:
+        url: URL de cualquier endpoint del equipo
+        limites: Configuración (por defecto CONTROL_ID_LIMITES)
+    """
+    clave = clave_dispositivo(url)
+    limitador = _limitadores.get(clave)
+    if limitador:
+        return limitador
+
+    with _limitadores_lock:
+        limitador = _limitadores.get(clave)
+        if limitador:
+            return limitador
+
+        limites = CONTROL_ID_LIMITES if limites is None else limites
+        propios = dict(limites)
+        propios.update(limites.get('por_equipo', {}).get(clave, {}))
+        limitador = LimitadorDispositivo(
+            clave,
+            max_en_vuelo=propios.get('max_en_vuelo', MAX_EN_VUELO),
+            solicitudes_por_segundo=propios.get('solicitudes_por_segundo', SOLICITUDES_POR_SEGUNDO),
+            rafaga=propios.get('rafaga', RAFAGA),
+        )
+        _limitadores[clave] = limitador
+        logger.info(
+            f"Limitador para {clave}: {limitador.max_en_vuelo} en vuelo, "
+            f"{propios.get('solicitudes_por_segundo', SOLICITUDES_POR_SEGUNDO)} solicitudes/s"
+        )
+        return limitador
+
+
+def configurar_limites(limites: Dict[str, Any]) -> None:
+    """Aplica una nueva configuración; los limitadores se recrean en el próximo uso."""
+    global CONTROL_ID_LIMITES
+    with _limitadores_lock:
+        CONTROL_ID_LIMITES = limites or {}
+        _limitadores.clear()
+
+
+def estadisticas_limitadores() -> Dict[str, Dict[str, Any]]:
+    """Estadísticas (incluida la demora de cola) de todos los equipos."""
+    with _limitadores_lock:
+        limitadores = list(_limitadores.values())
+    return {limitador.clave: limitador.estadisticas() for limitador in limitadores}
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Métricas del motor de sincronización en formato Prometheus.
+
+Registro en memoria de contadores, histogramas e indicadores (gauges) con
+etiquetas, y un servidor HTTP local que los expone en /metrics con el formato
+de texto de Prometheus. Lo arrancan la GUI y los modos sin interfaz
+(backfill).
+
+Los indicadores que reflejan estado de otros módulos (profundidad de la cola,
+outbox, circuitos, limitadores) se calculan al momento de exportar a partir
+de funciones registradas con `Indicador.desde_funcion`.
+
+Para la GUI, `PublicadorInstantaneas` arma una vez por segundo (en su propio
+hilo) un resumen inmutable: throughput, pendientes, duración del último
+ciclo, latencia promedio por etapa, aciertos de caché y tasa de error por
+equipo. Leerlo no toma locks ni consulta SQLite.
+
+Configuración opcional en config.py:
+    METRICAS_CONFIG = {"habilitado": True, "host": "127.0.0.1", "puerto": 9108}
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from config import METRICAS_CONFIG
+except ImportError:
+    METRICAS_CONFIG = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PUERTO_METRICAS = 9108
+
+# Límites (segundos) de los histogramas de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _etiquetas_texto(nombres: Sequence[str], valores: Sequence[str]) -> str:
+    if not nombres:
+        return ""
+    pares = []
+    for nombre, valor in zip(nombres, valores):
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pares.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+def _numero(valor: float) -> str:
+    if valor == float('inf'):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(etiquetas.get(nombre, "")) for nombre in self.etiquetas)
+
+    def encabezado(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    """Valor que solo crece (p. ej. usuarios sincronizados)."""
+
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def incrementar(self, cantidad: float = 1, **etiquetas: Any) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def valores(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._valores)
+
+    def exportar(self) -> List[str]:
+        lineas = self.encabezado()
+        for clave, valor in sorted(self.valores().items()):
+            lineas.append(f"{self.nombre}{_etiquetas_texto(self.etiquetas, clave)} {_numero(valor)}")
+        return lineas
+
+
+class Indicador(_Metrica):
+    """Valor que sube y baja (gauge)."""
+
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+        self._funcion: Optional[Callable[[], Iterable[Tuple[Dict[str, Any], float]]]] = None
+
+    def fijar(self, valor: float, **etiquetas: Any) -> None:
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+    def desde_funcion(self, funcion: Callable[[], Iterable[Tuple[Dict[str, Any], float]]]) -> None:
+        """El valor se calcula al exportar: `funcion` devuelve pares (etiquetas, valor)."""
+        self._funcion = funcion
+
+    def valores(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            valores = dict(self._valores)
+        if self._funcion:
+            try:
+                for etiquetas, valor in self._funcion():
+                    valores[self._clave(etiquetas)] = valor
+            except Exception as e:
+                logger.debug(f"No se pudo calcular {self.nombre}: {e}")
+        return valores
+
+    def exportar(self) -> List[str]:
+        lineas = self.encabezado()
+        for clave, valor in sorted(self.valores().items()):
+            lineas.append(f"{self.nombre}{_etiquetas_texto(self.etiquetas, clave)} {_numero(valor)}")
+        return lineas
+
+
+class Histograma(_Metrica):
+    """Distribución de valores (latencias, tamaños) en buckets acumulados."""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        # Por serie: [conteos por bucket (+Inf al final), suma, cantidad]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observar(self, valor: float, **etiquetas: Any) -> None:
+        clave = self._clave(etiquetas)
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[clave] = serie
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def series(self) -> Dict[Tuple[str, ...], Tuple[List[int], float, int]]:
+        with self._lock:
+            return {clave: (list(serie[0]), serie[1], serie[2]) for clave, serie in self._series.items()}
+
+    def exportar(self) -> List[str]:
+        lineas = self.encabezado()
+        nombres_bucket = self.etiquetas + ("le",)
+        for clave, (conteos, suma, cantidad) in sorted(self.series().items()):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float('inf'),), conteos):
+                acumulado += conteo
+                etiquetas = _etiquetas_texto(nombres_bucket, clave + (_numero(limite),))
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            texto = _etiquetas_texto(self.etiquetas, clave)
+            lineas.append(f"{self.nombre}_sum{texto} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{texto} {cantidad}")
+        return lineas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas del proceso."""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            existente = self._metricas.get(metrica.nombre)
+            if existente:
+                return existente
+            self._metricas[metrica.nombre] = metrica
+            return metrica
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def indicador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Indicador:
+        return self._registrar(Indicador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                   buckets: Sequence[float] = BUCKETS_LATENCIA) -> Histograma:
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def obtener(self, nombre: str) -> Optional[_Metrica]:
+        return self._metricas.get(nombre)
+
+    def exportar(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus."""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas = []
+        for metrica in metricas:
+            lineas.extend(metrica.exportar())
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = RegistroMetricas()
+
+# Métricas del motor de sincronización
+USUARIOS_SINCRONIZADOS = REGISTRO.contador(
+    "controlid_usuarios_sincronizados_total", "Usuarios procesados por resultado", ("resultado",))
+SOLICITUDES_EQUIPO = REGISTRO.contador(
+    "controlid_solicitudes_total", "Solicitudes a equipos ControlId por equipo, endpoint y estado",
+    ("equipo", "endpoint", "estado"))
+LATENCIA_EQUIPO = REGISTRO.histograma(
+    "controlid_solicitud_segundos", "Latencia de las solicitudes a equipos ControlId", ("equipo", "endpoint"))
+RELOGINS = REGISTRO.contador(
+    "controlid_logins_total", "Inicios de sesión en equipos ControlId por resultado", ("equipo", "resultado"))
+DESCARGAS = REGISTRO.contador(
+    "controlid_descargas_imagen_total", "Descargas de imagen por resultado", ("resultado",))
+BYTES_DESCARGADOS = REGISTRO.contador(
+    "controlid_descarga_bytes_total", "Bytes de imagen descargados")
+BYTES_IMAGEN = REGISTRO.contador(
+    "controlid_imagen_bytes_total", "Bytes de imagen antes y después de normalizar", ("etapa",))
+IMAGENES_RECHAZADAS = REGISTRO.contador(
+    "controlid_imagenes_rechazadas_total", "Imágenes descargadas rechazadas antes de enviarlas, por motivo", ("motivo",))
+LATENCIA_DESCARGA = REGISTRO.histograma(
+    "controlid_descarga_segundos", "Latencia de descarga de imágenes")
+PROFUNDIDAD_COLA = REGISTRO.indicador(
+    "controlid_cola_pendientes", "Trabajos pendientes en la cola por carril", ("carril",))
+PENDIENTES_OUTBOX = REGISTRO.indicador(
+    "controlid_outbox_pendientes", "Usuarios pendientes en el outbox por equipo", ("equipo",))
+ESTADO_CIRCUITO = REGISTRO.indicador(
+    "controlid_circuito_abierto", "1 si el circuito del equipo no está cerrado", ("equipo",))
+EN_VUELO = REGISTRO.indicador(
+    "controlid_solicitudes_en_vuelo", "Solicitudes en curso por equipo", ("equipo",))
+DEMORA_LIMITADOR = REGISTRO.indicador(
+    "controlid_demora_cola_promedio_segundos", "Espera promedio por turno en el limitador del equipo", ("equipo",))
+
+# Tiempo desde LP_CREATION_DATE hasta que el rostro quedó cargado en un equipo
+BUCKETS_ENROLAMIENTO = (5, 15, 30, 60, 120, 300, 600, 1800, 3600, 4 * 3600, 24 * 3600)
+ENROLAMIENTO_A_PUERTA = REGISTRO.histograma(
+    "controlid_enrolamiento_a_puerta_segundos",
+    "Segundos desde el enrolamiento en MiID hasta la imagen cargada en un equipo",
+    buckets=BUCKETS_ENROLAMIENTO)
+PERCENTIL_ENROLAMIENTO = REGISTRO.indicador(
+    "controlid_enrolamiento_a_puerta_percentil_segundos",
+    "Percentil móvil del tiempo enrolamiento-puerta", ("percentil",))
+SLO_ENROLAMIENTO_UMBRAL = REGISTRO.indicador(
+    "controlid_slo_enrolamiento_umbral_segundos", "Umbral del SLO enrolamiento-puerta")
+SLO_ENROLAMIENTO_INCUMPLIDO = REGISTRO.indicador(
+    "controlid_slo_enrolamiento_incumplido", "1 si el percentil móvil supera el umbral del SLO")
+USUARIOS_FUERA_DE_SLO = REGISTRO.contador(
+    "controlid_slo_enrolamiento_usuarios_fuera_total", "Usuarios que llegaron a la puerta después del umbral")
+LATENCIA_ETAPA = REGISTRO.histograma(
+    "controlid_etapa_segundos", "Duración de cada etapa de la sincronización (ver trazas.py)", ("etapa",))
+DURACION_CICLO = REGISTRO.indicador(
+    "controlid_ciclo_sincronizacion_segundos", "Duración del último ciclo de sincronización automática")
+INTERVALO_SONDEO = REGISTRO.indicador(
+    "controlid_intervalo_sondeo_segundos", "Espera actual entre consultas a MiID (intervalo adaptativo)")
+TRABAJOS_FUSIONADOS = REGISTRO.contador(
+    "controlid_trabajos_fusionados_total", "Pedidos duplicados del mismo documento fusionados", ("modo",))
+CACHE = REGISTRO.contador(
+    "controlid_cache_total", "Consultas a cachés por resultado (acierto/fallo)", ("cache", "resultado"))
+
+
+def registrar_cache(cache: str, acierto: bool) -> None:
+    """Cuenta un acierto o un fallo de la caché indicada."""
+    CACHE.incrementar(cache=cache, resultado="acierto" if acierto else "fallo")
+
+
+def _estado_circuitos():
+    from resiliencia import CERRADO, estadisticas_circuitos
+    for equipo, estadisticas in estadisticas_circuitos().items():
+        yield {'equipo': equipo}, 0 if estadisticas['estado'] == CERRADO else 1
+
+
+def _en_vuelo():
+    from limites_dispositivo import estadisticas_limitadores
+    for equipo, estadisticas in estadisticas_limitadores().items():
+        yield {'equipo': equipo}, estadisticas['en_vuelo']
+
+
+def _demora_limitadores():
+    from limites_dispositivo import estadisticas_limitadores
+    for equipo, estadisticas in estadisticas_limitadores().items():
+        yield {'equipo': equipo}, estadisticas['demora_promedio']
+
+
+ESTADO_CIRCUITO.desde_funcion(_estado_circuitos)
+EN_VUELO.desde_funcion(_en_vuelo)
+DEMORA_LIMITADOR.desde_funcion(_demora_limitadores)
+
+
+def _lectura() -> Dict[str, Any]:
+    """Totales acumulados necesarios para calcular tasas por ventana."""
+    usuarios = USUARIOS_SINCRONIZADOS.valores()
+    solicitudes: Dict[str, List[float]] = {}
+    for (equipo, _endpoint, estado), valor in SOLICITUDES_EQUIPO.valores().items():
+        totales = solicitudes.setdefault(equipo, [0, 0])
+        totales[1] += valor
+        if not estado.startswith("2"):
+            totales[0] += valor
+    caches: Dict[str, List[float]] = {}
+    for (cache, resultado), valor in CACHE.valores().items():
+        totales = caches.setdefault(cache, [0, 0])
+        totales[1] += valor
+        if resultado == "acierto":
+            totales[0] += valor
+    return {
+        'momento': time.monotonic(),
+        'usuarios': sum(usuarios.values()),
+        'usuarios_error': usuarios.get(("error",), 0),
+        'etapas': {clave[0]: (suma, cantidad) for clave, (_c, suma, cantidad) in LATENCIA_ETAPA.series().items()},
+        'solicitudes': solicitudes,
+        'caches': caches,
+    }
+
+
+def _diferencia(actual: Dict[str, Any], anterior: Dict[str, Any], clave: str) -> Dict[str, Tuple[float, float]]:
+    """Diferencia por elemento de pares (parcial, total) entre dos lecturas."""
+    previos = anterior.get(clave, {})
+    resultado = {}
+    for nombre, (parcial, total) in actual.get(clave, {}).items():
+        parcial_previo, total_previo = previos.get(nombre, (0, 0))
+        resultado[nombre] = (parcial - parcial_previo, total - total_previo)
+    return resultado
+
+
+class PublicadorInstantaneas:
+    """
+    Publica periódicamente una instantánea de las métricas para la GUI.
+
+    El hilo publicador es el único que lee el registro (y los indicadores que
+    consultan SQLite); la instantánea es un diccionario nuevo en cada ciclo y
+    se publica reemplazando una referencia, así que `instantanea()` no toma
+    locks ni bloquea a los workers.
+
+    Args:
+        intervalo: Segundos entre instantáneas
+        ventana: Segundos considerados para tasas y promedios "actuales"
+    """
+
+    def __init__(self, intervalo: float = 1.0, ventana: float = 60.0):
+        self.intervalo = intervalo
+        self.ventana = ventana
+        self._lecturas = deque()
+        self._instantanea: Dict[str, Any] = {}
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def instantanea(self) -> Dict[str, Any]:
+        """Última instantánea publicada (vacía hasta el primer ciclo)."""
+        return self._instantanea
+
+    def iniciar(self) -> None:
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="instantaneas-metricas", daemon=True)
+        self._hilo.start()
+
+    def detener(self) -> None:
+        self._detener.set()
+
+    def _bucle(self) -> None:
+        while not self._detener.is_set():
+            try:
+                self._instantanea = self.construir()
+            except Exception as e:
+                logger.debug(f"No se pudo construir la instantánea de métricas: {e}")
+            self._detener.wait(self.intervalo)
+
+    def construir(self) -> Dict[str, Any]:
+        actual = _lectura()
+        self._lecturas.append(actual)
+        while len(self._lecturas) > 2 and actual['momento'] - self._lecturas[1]['momento'] >= self.ventana:
+            self._lecturas.popleft()
+        anterior = self._lecturas[0]
+        segundos = actual['momento'] - anterior['momento']
+
+        usuarios_por_minuto = None
+        if segundos > 0:
+            usuarios_por_minuto = (actual['usuarios'] - anterior['usuarios']) * 60 / segundos
+
+        # Promedio por etapa en la ventana; si no hubo llamadas, el acumulado
+        etapas = {}
+        for etapa, (suma, cantidad) in _diferencia(actual, anterior, 'etapas').items():
+            suma_total, cantidad_total = actual['etapas'][etapa]
+            if cantidad > 0:
+                etapas[etapa] = suma / cantidad
+            elif cantidad_total:
+                etapas[etapa] = suma_total / cantidad_total
+
+        errores_equipo = {
+            equipo: (errores / total if total else 0.0, total)
+            for equipo, (errores, total) in _diferencia(actual, anterior, 'solicitudes').items()
+        }
+        # Aciertos de caché acumulados desde el arranque
+        caches = {
+            cache: (aciertos / total if total else None, total)
+            for cache, (aciertos, total) in actual['caches'].items()
+        }
+
+        return {
+            'momento': time.time(),
+            'ventana_segundos': segundos,
+            'usuarios_por_minuto': usuarios_por_minuto,
+            'usuarios_total': actual['usuarios'],
+            'usuarios_error': actual['usuarios_error'],
+            'pendientes_cola': sum(PROFUNDIDAD_COLA.valores().values()),
+            'pendientes_outbox': sum(PENDIENTES_OUTBOX.valores().values()),
+            'duracion_ultimo_ciclo': DURACION_CICLO.valores().get((), None),
+            'etapas': etapas,
+            'caches': caches,
+            'errores_equipo': errores_equipo,
+        }
+
+
+def _crear_servidor(host: str, puerto: int):
+    # http.server se importa recién aquí: no suma al tiempo de arranque
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _ManejadorMetricas(BaseHTTPRequestHandler):
+        def log_message(self, formato, *args):
+            # Silenciar el log por solicitud de http.server
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            cuerpo = REGISTRO.exportar().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+    servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+    servidor.daemon_threads = True
+    return servidor
+
+
+_servidor = None
+_servidor_lock = threading.Lock()
+
+
+def iniciar_servidor_metricas(host: Optional[str] = None, puerto: Optional[int] = None) -> Optional[str]:
+    """
+    Arranca (una sola vez por proceso) el endpoint /metrics.
+
+    Returns:
+        URL del endpoint, o None si está deshabilitado o no se pudo abrir el puerto.
+    """
+    global _servidor
+    if not METRICAS_CONFIG.get('habilitado', True):
+        return None
+
+    host = host or METRICAS_CONFIG.get('host', "127.0.0.1")
+    puerto = int(METRICAS_CONFIG.get('puerto', PUERTO_METRICAS)) if puerto is None else puerto
+
+    with _servidor_lock:
+        if _servidor is None:
+            try:
+                _servidor = _crear_servidor(host, puerto)
+            except OSError as e:
+                logger.warning(f"No se pudo abrir el endpoint de métricas en {host}:{puerto}: {e}")
+                return None
+            threading.Thread(target=_servidor.serve_forever, name="metricas", daemon=True).start()
+        host_real, puerto_real = _servidor.server_address[:2]
+    url = f"http://{host_real}:{puerto_real}/metrics"
+    logger.info(f"Métricas Prometheus en {url}")
+    return url
+
+
+def detener_servidor_metricas() -> None:
+    global _servidor
+    with _servidor_lock:
+        if _servidor:
+            _servidor.shutdown()
+            _servidor.server_close()
+            _servidor = None
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché de miniaturas para la vista previa de la GUI.
+
+Antes cada vez que se mostraba un usuario se abría el JPEG a resolución
+completa y se reducía con LANCZOS en el hilo que llamaba (casi siempre un
+worker de sincronización). Ahora la miniatura se decodifica en un hilo propio
+con `Image.draft` (el decodificador JPEG reduce por 1/2, 1/4 u 1/8 al leer,
+sin expandir la imagen completa), se guarda en memoria (LRU) y en disco con
+el hash del contenido como clave, y al hilo de Tk solo le queda crear el
+PhotoImage.
+
+PIL se importa al primer uso para no sumarlo al arranque de la GUI.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metricas import registrar_cache
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Tamaño de la vista previa del panel de usuario
+TAMANO_PREVIEW = (180, 180)
+
+# Tamaño de las miniaturas del historial de actividad
+TAMANO_FILA = (40, 40)
+
+# Miniaturas decodificadas que se mantienen en memoria
+MAX_MEMORIA = 256
+
+# Hilos de decodificación (la GUI no necesita más: es una imagen por usuario)
+WORKERS_MINIATURAS = 2
+
+# Bloque de lectura para el hash del archivo
+_BLOQUE_HASH = 1 << 20
+
+
+class CacheMiniaturas:
+    """
+    Miniaturas por hash del archivo y tamaño, en memoria y en disco.
+
+    Args:
+        carpeta: Carpeta de las miniaturas en disco
+        max_memoria: Miniaturas que se mantienen decodificadas en memoria
+        workers: Hilos de decodificación para obtener_async
+    """
+
+    def __init__(self, carpeta: Path, max_memoria: int = MAX_MEMORIA, workers: int = WORKERS_MINIATURAS):
+        self.carpeta = Path(carpeta)
+        self.max_memoria = max(1, int(max_memoria))
+        self._memoria: "OrderedDict[Tuple[str, Tuple[int, int]], Any]" = OrderedDict()
+        # (ruta, mtime, tamaño) -> hash, para no releer el archivo en cada consulta
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="miniatura")
+
+    def _hash(self, ruta: Path) -> str:
+        estado = ruta.stat()
+        clave = (str(ruta), estado.st_mtime_ns, estado.st_size)
+        with self._lock:
+            valor = self._hashes.get(clave)
+        if valor:
+            return valor
+        resumen = hashlib.sha1()
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(_BLOQUE_HASH), b""):
+                resumen.update(bloque)
+        valor = resumen.hexdigest()
+        with self._lock:
+            if len(self._hashes) >= self.max_memoria * 4:
+                self._hashes.clear()
+            self._hashes[clave] = valor
+        return valor
+
+    def _recordar(self, clave: Tuple[str, Tuple[int, int]], imagen: Any) -> None:
+        with self._lock:
+            self._memoria[clave] = imagen
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def obtener(self, ruta: Path, tamano: Tuple[int, int] = TAMANO_PREVIEW) -> Optional[Any]:
+        """
+        Miniatura (PIL.Image) de la imagen, como máximo de `tamano`.
+        Bloquea mientras decodifica: desde la GUI usar obtener_async.
+
+        Returns:
+            La miniatura, o None si el archivo no existe o no es una imagen.
+        """
+        ruta = Path(ruta)
+        try:
+            clave = (self._hash(ruta), tuple(tamano))
+        except OSError as e:
+            logger.warning(f"No se pudo leer {ruta}: {e}")
+            return None
+
+        with self._lock:
+            imagen = self._memoria.get(clave)
+            if imagen is not None:
+                self._memoria.move_to_end(clave)
+        if imagen is not None:
+            registrar_cache("miniaturas", True)
+            return imagen
+
+        from PIL import Image
+
+        archivo = self.carpeta / f"{clave[0]}_{tamano[0]}x{tamano[1]}.png"
+        try:
+            if archivo.exists():
+                with Image.open(archivo) as guardada:
+                    imagen = guardada.copy()
+                registrar_cache("miniaturas", True)
+                self._recordar(clave, imagen)
+                return imagen
+        except Exception as e:
+            logger.warning(f"Miniatura en disco inválida {archivo.name}: {e}")
+
+        registrar_cache("miniaturas", False)
+        try:
+            with Image.open(ruta) as original:
+                # JPEG: el decodificador ya entrega la imagen reducida (escala 1/2^n)
+                original.draft("RGB", tuple(tamano))
+                original.thumbnail(tamano, Image.Resampling.LANCZOS)
+                imagen = original.convert("RGB") if original.mode not in ("RGB", "RGBA", "L") else original.copy()
+        except Exception as e:
+            logger.warning(f"No se pudo generar la miniatura de {ruta.name}: {e}")
+            return None
+
+        try:
+            self.carpeta.mkdir(parents=True, exist_ok=True)
+            temporal = archivo.with_suffix(".tmp")
+            imagen.save(temporal, format="PNG")
+            os.replace(temporal, archivo)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar la miniatura de {ruta.name}: {e}")
+        self._recordar(clave, imagen)
+        return imagen
+
+    def obtener_async(self, ruta: Path, callback: Callable[[Optional[Any]], None],
+                      tamano: Tuple[int, int] = TAMANO_PREVIEW,
+                      vigente: Optional[Callable[[], bool]] = None) -> Future:
+        """
+        Obtiene la miniatura en un hilo de la caché y llama a `callback` con
+        ella (también en ese hilo: la GUI debe pasar a Tk con root.after).
+
+        Si `vigente` devuelve False cuando le llega el turno (p. ej. la fila ya
+        salió de la vista), no se decodifica ni se llama al callback.
+        """
+        def tarea():
+            if vigente is not None and not vigente():
+                return None
+            imagen = self.obtener(ruta, tamano)
+            callback(imagen)
+            return imagen
+        return self._executor.submit(tarea)
+
+    def cerrar(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Outbox de operaciones pendientes para equipos ControlId inalcanzables.
+
+Mientras un equipo no responde, los usuarios que debían enviarse a él se
+guardan en una tabla SQLite (una fila por equipo y documento). Si el mismo
+usuario vuelve a llegar durante la caída, su fila se actualiza con los datos
+más recientes en lugar de duplicarse (coalescencia), conservando su posición
+original en la fila.
+
+Cuando el equipo vuelve, el drenador envía las operaciones en orden de
+llegada a una tasa controlada (token bucket), para que una caída larga no
+termine en una avalancha de solicitudes contra el equipo.
+
+La imagen se copia a una carpeta propia del outbox al guardar: la de la
+carpeta temporal se sobrescribe con la próxima descarga del documento (o la
+validación la mueve a `rechazadas/`), y sin copia el usuario llegaba al equipo
+sin rostro. Mientras un documento tiene una operación pendiente para un
+equipo, los envíos nuevos se fusionan en esa fila (ver `pendiente`) en lugar
+de ir directo, para que el drenador nunca aplique datos viejos sobre nuevos.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from limites_dispositivo import TokenBucket
+
+try:
+    from config import OUTBOX_CONFIG
+except ImportError:
+    OUTBOX_CONFIG = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Usuarios por segundo al drenar un equipo que volvió
+TASA_DRENADO = float(OUTBOX_CONFIG.get('usuarios_por_segundo', 2))
+RAFAGA_DRENADO = int(OUTBOX_CONFIG.get('rafaga', 2))
+
+# Segundos entre intentos de drenado mientras el equipo sigue caído
+INTERVALO_REINTENTO = float(OUTBOX_CONFIG.get('intervalo_reintento', 15))
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dispositivo TEXT NOT NULL,
+    documento TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    actualizaciones INTEGER NOT NULL DEFAULT 1,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL,
+    UNIQUE (dispositivo, documento)
+);
+"""
+
+
+class OutboxDispositivo:
+    """
+    Tabla persistente de operaciones pendientes por equipo.
+    """
+
+    def __init__(self, ruta: Path):
+        self.ruta = Path(ruta)
+        # Copias de las imágenes pendientes, una por equipo y documento
+        self.carpeta_imagenes = self.ruta.parent / f"{self.ruta.stem}_imagenes"
+        self._lock = threading.Lock()
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._conexion = sqlite3.connect(str(self.ruta), check_same_thread=False, isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.executescript(_ESQUEMA)
+
+    def _ruta_copia(self, dispositivo: str, documento: str, extension: str) -> Path:
+        equipo = hashlib.sha1(dispositivo.encode('utf-8')).hexdigest()[:12]
+        return self.carpeta_imagenes / f"{equipo}_{documento}{extension or '.jpg'}"
+
+    def _copiar_imagen(self, dispositivo: str, documento: str, ruta_imagen: str) -> str:
+        """Copia la imagen a la carpeta del outbox (reemplazo atómico) y devuelve la copia."""
+        origen = Path(ruta_imagen)
+        destino = self._ruta_copia(dispositivo, documento, origen.suffix)
+        self.carpeta_imagenes.mkdir(parents=True, exist_ok=True)
+        temporal = destino.with_name(destino.name + ".tmp")
+        shutil.copyfile(origen, temporal)
+        os.replace(temporal, destino)
+        return str(destino)
+
+    def _borrar_copia(self, ruta_imagen: Optional[str]) -> None:
+        if ruta_imagen and Path(ruta_imagen).parent == self.carpeta_imagenes:
+            try:
+                Path(ruta_imagen).unlink()
+            except OSError:
+                pass
+
+    def guardar(self, dispositivo: str, usuario: Dict[str, Any], ruta_imagen: Optional[str] = None) -> float:
+        """
+        Guarda (o actualiza, si ya había una pendiente) la operación de un
+        usuario para un equipo, con una copia propia de la imagen. Si la
+        actualización no trae imagen se conserva la de la operación pendiente.
+
+        Returns:
+            Marca `actualizado` de la fila (ver descartar).
+
+        Raises:
+            OSError: Si no se pudo copiar la imagen (la operación no se guarda).
+        """
+        documento = str(usuario['documento'])
+        ahora = time.time()
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT payload FROM outbox WHERE dispositivo = ? AND documento = ?", (dispositivo, documento)
+            ).fetchone()
+            anterior = json.loads(fila[0]).get('ruta_imagen') if fila else None
+            if ruta_imagen:
+                ruta_imagen = self._copiar_imagen(dispositivo, documento, ruta_imagen)
+                if anterior != ruta_imagen:
+                    self._borrar_copia(anterior)
+            else:
+                ruta_imagen = anterior
+            payload = json.dumps({'usuario': usuario, 'ruta_imagen': ruta_imagen}, default=str)
+            self._conexion.execute(
+                "INSERT INTO outbox (dispositivo, documento, payload, creado, actualizado) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (dispositivo, documento) DO UPDATE SET "
+                "payload = excluded.payload, actualizado = excluded.actualizado, "
+                "actualizaciones = actualizaciones + 1",
+                (dispositivo, documento, payload, ahora, ahora),
+            )
+        return ahora
+
+    def pendiente(self, dispositivo: str, documento: str) -> bool:
+        """True si el documento tiene una operación pendiente para el equipo."""
+        with self._lock:
+            return self._conexion.execute(
+                "SELECT 1 FROM outbox WHERE dispositivo = ? AND documento = ?", (dispositivo, str(documento))
+            ).fetchone() is not None
+
+    def _eliminar_donde(self, condicion: str, parametros: tuple) -> None:
+        """Borra las filas (y sus copias de imagen) que cumplen la condición."""
+        with self._lock:
+            filas = self._conexion.execute(f"SELECT payload FROM outbox WHERE {condicion}", parametros).fetchall()
+            self._conexion.execute(f"DELETE FROM outbox WHERE {condicion}", parametros)
+            for (payload,) in filas:
+                self._borrar_copia(json.loads(payload).get('ruta_imagen'))
+
+    def siguiente(self, dispositivo: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la operación pendiente más antigua de un equipo (sin quitarla)."""
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT id, documento, payload, actualizaciones, actualizado FROM outbox "
+                "WHERE dispositivo = ? ORDER BY id LIMIT 1",
+                (dispositivo,),
+            ).fetchone()
+        if not fila:
+            return None
+        operacion_id, documento, payload, actualizaciones, actualizado = fila
+        datos = json.loads(payload)
+        return {
+            'id': operacion_id,
+            'documento': documento,
+            'usuario': datos['usuario'],
+            'ruta_imagen': datos.get('ruta_imagen'),
+            'actualizaciones': actualizaciones,
+            'actualizado': actualizado,
+        }
+
+    def eliminar(self, operacion_id: int, actualizado: float) -> None:
+        """
+        Quita una operación ya enviada. Si se actualizó mientras se enviaba
+        (actualizado distinto), se conserva para enviar los datos nuevos.
+        """
+        self._eliminar_donde("id = ? AND actualizado = ?", (operacion_id, actualizado))
+
+    def descartar(self, dispositivo: str, documento: str, actualizado: float) -> None:
+        """
+        Quita la operación de un documento que ya llegó al equipo por otra vía
+        (p. ej. un envío rezagado del fan-out), salvo que se haya actualizado
+        después de `actualizado`.
+        """
+        self._eliminar_donde("dispositivo = ? AND documento = ? AND actualizado = ?",
+                             (dispositivo, str(documento), actualizado))
+
+    def dispositivos_pendientes(self) -> List[str]:
+        with self._lock:
+            return [fila[0] for fila in self._conexion.execute("SELECT DISTINCT dispositivo FROM outbox")]
+
+    def pendientes(self, dispositivo: Optional[str] = None) -> int:
+        with self._lock:
+            if dispositivo:
+                return self._conexion.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE dispositivo = ?", (dispositivo,)
+                ).fetchone()[0]
+            return self._conexion.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conexion.close()
+
+
+class DrenadorOutbox:
+    """
+    Hilo que vacía el outbox cuando los equipos vuelven.
+
+    Args:
+        outbox: Outbox persistente
+        enviar: Función (nombre_dispositivo, usuario, ruta_imagen) -> resultado;
+            el resultado es un diccionario con `exito` (y opcionalmente
+            `inalcanzable`) o None si el equipo ya no está configurado
+        tasa: Usuarios por segundo por equipo
+        log: Función para reportar mensajes
+    """
+
+    def __init__(self, outbox: OutboxDispositivo,
+                 enviar: Callable[[str, Dict[str, Any], Optional[str]], Optional[Dict[str, Any]]],
+                 tasa: float = TASA_DRENADO, rafaga: int = RAFAGA_DRENADO,
+                 intervalo_reintento: float = INTERVALO_REINTENTO,
+                 log: Optional[Callable[[str], None]] = None):
+        self.outbox = outbox
+        self.enviar = enviar
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self.intervalo_reintento = intervalo_reintento
+        self.log = log or logger.info
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._proximo_intento: Dict[str, float] = {}
+        self._detener = threading.Event()
+        self._evento = threading.Event()
+        self._hilo = None
+
+    def iniciar(self) -> None:
+        self._hilo = threading.Thread(target=self._loop, name="outbox-drenador", daemon=True)
+        self._hilo.start()
+
+    def detener(self) -> None:
+        self._detener.set()
+        self._evento.set()
+
+    def notificar(self) -> None:
+        """Pide un intento de drenado inmediato (p. ej. tras reconectar)."""
+        self._proximo_intento.clear()
+        self._evento.set()
+
+    def _drenar_dispositivo(self, dispositivo: str) -> None:
+        bucket = self._buckets.setdefault(dispositivo, TokenBucket(self.tasa, self.rafaga))
+        enviados = 0
+        while not self._detener.is_set():
+            operacion = self.outbox.siguiente(dispositivo)
+            if not operacion:
+                break
+
+            bucket.adquirir()
+            resultado = self.enviar(dispositivo, operacion['usuario'], operacion['ruta_imagen'])
+            if resultado is None:
+                # El equipo ya no está configurado: descartar lo pendiente
+                self.log(f"Outbox: equipo {dispositivo} ya no existe; se descarta {operacion['documento']}")
+                self.outbox.eliminar(operacion['id'], operacion['actualizado'])
+                continue
+            if not resultado.get('exito'):
+                if resultado.get('inalcanzable', True):
+                    self._proximo_intento[dispositivo] = time.monotonic() + self.intervalo_reintento
+                    break
+                # Error propio del usuario (no del equipo): no bloquear al resto
+                self.log(f"Outbox: {dispositivo} rechazó {operacion['documento']}: {resultado.get('error', '')}")
+
+            self.outbox.eliminar(operacion['id'], operacion['actualizado'])
+            enviados += 1
+
+        if enviados:
+            restantes = self.outbox.pendientes(dispositivo)
+            self.log(f"Outbox: {enviados} usuarios enviados a {dispositivo} ({restantes} pendientes)")
+
+    def _loop(self) -> None:
+        while not self._detener.is_set():
+            try:
+                ahora = time.monotonic()
+                for dispositivo in self.outbox.dispositivos_pendientes():
+                    if self._proximo_intento.get(dispositivo, 0) > ahora:
+                        continue
+                    self._drenar_dispositivo(dispositivo)
+            except Exception as e:
+                self.log(f"Error al drenar outbox: {str(e)}")
+            self._evento.wait(1)
+            self._evento.clear()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planificador con carriles de prioridad sobre la cola persistente.
+
+Un pool de workers consume la ColaTrabajos. Cada worker libre toma primero el
+carril interactivo (búsquedas y cargas manuales del operador) y solo después
+el de fondo (sincronización automática / backfill). Para que el fondo no se
+quede sin avanzar cuando hay ráfagas interactivas, después de `cuota_interactiva`
+trabajos interactivos seguidos el siguiente worker libre atiende uno de fondo.
+
+Además hay `workers_interactivos` workers reservados que solo toman el carril
+interactivo: aunque todos los demás estén ocupados con trabajos de fondo largos
+(fan-out a varios equipos, esperas de un_vuelo), una búsqueda del operador
+empieza enseguida.
+
+Los trabajos con la misma clave (documento) se fusionan: al encolar, con uno
+que todavía no empezó; al procesar, con el que otro worker tiene en curso
+(ver un_vuelo.py).
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cola_trabajos import CARRIL_FONDO, CARRIL_INTERACTIVO, ColaTrabajos
+from metricas import TRABAJOS_FUSIONADOS
+from un_vuelo import UnVuelo
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Objetivo de tiempo hasta el inicio de un trabajo interactivo (segundos)
+OBJETIVO_INICIO_INTERACTIVO = 1.0
+
+# Workers reservados para el carril interactivo
+WORKERS_INTERACTIVOS = 1
+
+
+class PlanificadorPrioridad:
+    """
+    Pool de workers que consume la cola persistente respetando carriles.
+
+    Args:
+        cola: Cola persistente de trabajos
+        procesar: Función que recibe el payload y devuelve True si tuvo éxito
+        workers: Número de workers que atienden ambos carriles
+        workers_interactivos: Workers adicionales que solo atienden el carril interactivo
+        cuota_interactiva: Trabajos interactivos seguidos antes de ceder uno al fondo
+        puede_procesar: Función opcional; mientras devuelva False los workers esperan
+            (p. ej. mientras no hay sesión de ControlId)
+        log: Función para reportar mensajes (por defecto el logger del módulo)
+        un_vuelo: Fusión de trabajos en curso por clave (por defecto una nueva)
+    """
+
+    def __init__(self, cola: ColaTrabajos, procesar: Callable[[Dict[str, Any]], bool],
+                 workers: int = 2, workers_interactivos: int = WORKERS_INTERACTIVOS,
+                 cuota_interactiva: int = 4,
+                 puede_procesar: Optional[Callable[[], bool]] = None,
+                 log: Optional[Callable[[str], None]] = None,
+                 un_vuelo: Optional[UnVuelo] = None):
+        self.cola = cola
+        self.procesar = procesar
+        self.workers = workers
+        self.workers_interactivos = workers_interactivos
+        self.cuota_interactiva = cuota_interactiva
+        self.puede_procesar = puede_procesar or (lambda: True)
+        self.log = log or logger.info
+        self.un_vuelo = un_vuelo or UnVuelo()
+
+        self._evento = threading.Event()
+        # Evento propio de los workers reservados: un worker general que limpia
+        # `_evento` no los deja durmiendo hasta el próximo sondeo
+        self._evento_interactivo = threading.Event()
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._interactivos_seguidos = 0
+        self._hilos = []
+
+        # Estadísticas de espera (encolado -> inicio) por carril
+        self.espera_ultima = {CARRIL_INTERACTIVO: 0.0, CARRIL_FONDO: 0.0}
+        self.procesados = {CARRIL_INTERACTIVO: 0, CARRIL_FONDO: 0}
+
+    def iniciar(self) -> None:
+        """Arranca los workers (retoman lo que haya quedado en la cola)."""
+        for numero in range(self.workers):
+            hilo = threading.Thread(target=self._worker_loop, name=f"sync-worker-{numero}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        for numero in range(self.workers_interactivos):
+            hilo = threading.Thread(target=self._worker_loop, args=(True,),
+                                    name=f"sync-interactivo-{numero}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def detener(self) -> None:
+        self._detener.set()
+        self._evento.set()
+        self._evento_interactivo.set()
+
+    def notificar(self) -> None:
+        """Despierta a los workers libres tras encolar un trabajo."""
+        self._evento.set()
+        self._evento_interactivo.set()
+
+    def encolar(self, payload: Dict[str, Any], clave: Optional[str] = None,
+                carril: str = CARRIL_FONDO) -> int:
+        """Encola un trabajo en el carril indicado y despierta a los workers."""
+        trabajo_id = self.cola.encolar(payload, clave=clave, carril=carril)
+        self.notificar()
+        return trabajo_id
+
+    def encolar_o_fusionar(self, payload: Dict[str, Any], clave: str,
+                           carril: str = CARRIL_FONDO) -> Tuple[int, bool]:
+        """
+        Encola un trabajo o lo fusiona con uno pendiente de la misma clave.
+
+        Returns:
+            (ID del trabajo, True si se fusionó).
+        """
+        trabajo_id, fusionado = self.cola.encolar_o_fusionar(payload, clave=clave, carril=carril)
+        if fusionado:
+            TRABAJOS_FUSIONADOS.incrementar(modo="encolado")
+        self.notificar()
+        return trabajo_id, fusionado
+
+    def _procesar(self, trabajo: Dict[str, Any]) -> bool:
+        """Procesa el payload; otro trabajo de la misma clave en curso se espera y se reutiliza."""
+        clave = trabajo['clave']
+        if not clave:
+            return self.procesar(trabajo['payload'])
+        exito, compartido = self.un_vuelo.ejecutar(clave, lambda: self.procesar(trabajo['payload']))
+        if compartido:
+            self.log(f"Trabajo {trabajo['id']} ({clave}) fusionado con el procesamiento en curso o reciente")
+        return exito
+
+    def _orden_carriles(self):
+        """Decide qué carril revisar primero en esta reserva."""
+        with self._lock:
+            if self._interactivos_seguidos >= self.cuota_interactiva:
+                return (CARRIL_FONDO, CARRIL_INTERACTIVO)
+            return (CARRIL_INTERACTIVO, CARRIL_FONDO)
+
+    def _registrar_reserva(self, carril: str) -> None:
+        with self._lock:
+            if carril == CARRIL_INTERACTIVO:
+                self._interactivos_seguidos += 1
+            else:
+                self._interactivos_seguidos = 0
+
+    def _worker_loop(self, solo_interactivo: bool = False) -> None:
+        evento = self._evento_interactivo if solo_interactivo else self._evento
+        while not self._detener.is_set():
+            try:
+                if not self.puede_procesar():
+                    self._detener.wait(1)
+                    continue
+
+                carriles = (CARRIL_INTERACTIVO,) if solo_interactivo else self._orden_carriles()
+                trabajo = self.cola.reservar(carriles)
+                if not trabajo:
+                    # Espera corta: un encolado despierta al worker de inmediato
+                    evento.wait(1)
+                    evento.clear()
+                    continue
+
+                carril = trabajo['carril']
+                self._registrar_reserva(carril)
+                espera = time.time() - trabajo['creado']
+                self.espera_ultima[carril] = espera
+                if carril == CARRIL_INTERACTIVO and espera > OBJETIVO_INICIO_INTERACTIVO and trabajo['intentos'] == 1:
+                    logger.warning(f"Trabajo interactivo {trabajo['id']} tardó {espera:.2f} s en iniciar")
+
+                error = ""
+                try:
+                    exito = self._procesar(trabajo)
+                except Exception as e:
+                    exito = False
+                    error = str(e)
+                    self.log(f"Error en el procesamiento: {error}")
+
+                if exito:
+                    self.cola.confirmar(trabajo['id'])
+                    with self._lock:
+                        self.procesados[carril] += 1
+                elif self.cola.fallar(trabajo['id'], error or "procesamiento fallido"):
+                    self.log(f"Trabajo {trabajo['id']} se reintentará (intento {trabajo['intentos']})")
+                else:
+                    self.log(f"Trabajo {trabajo['id']} movido a la cola de fallidos")
+            except Exception as e:
+                self.log(f"Error en el worker de la cola: {str(e)}")
+                self._detener.wait(5)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Normalización de imágenes antes de enviarlas a los equipos ControlId.
+
+Azure entrega la foto tal como la tomó la cámara (a menudo varios
+megapíxeles) y el terminal tardaba segundos en reducirla antes de extraer
+la plantilla facial. Cada imagen descargada se normaliza una sola vez, antes
+de subirla a cualquier equipo:
+- orientación EXIF aplicada a los píxeles (el equipo no la interpreta),
+- lado mayor limitado a `lado_maximo`,
+- JPEG con `calidad_jpeg` y sin metadatos (EXIF, XMP, comentarios, ICC).
+
+La decodificación y recompresión son CPU puro, así que corren en un pool de
+procesos (uno por núcleo por defecto) en lugar de competir por el GIL con los
+hilos de sincronización.
+
+Configuración opcional en config.py:
+    PREPROCESADO_CONFIG = {"habilitado": True, "lado_maximo": 1024, "calidad_jpeg": 85, "procesos": None}
+"""
+
+import logging
+import multiprocessing.util
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from metricas import BYTES_IMAGEN
+from trazas import trazar
+
+try:
+    from config import PREPROCESADO_CONFIG
+except ImportError:
+    PREPROCESADO_CONFIG = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+LADO_MAXIMO = 1024
+CALIDAD_JPEG = 85
+
+# Segundos máximos de espera por una imagen en el pool
+TIMEOUT_PREPROCESADO = 60
+
+# Orientación EXIF (0x0112)
+_TAG_ORIENTACION = 0x0112
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def normalizar_imagen(ruta_origen: str, ruta_destino: str, lado_maximo: int = LADO_MAXIMO,
+                      calidad: int = CALIDAD_JPEG) -> Dict[str, Any]:
+    """
+    Normaliza una imagen (se ejecuta en un proceso del pool).
+
+    Si la imagen ya es un JPEG dentro del tamaño, sin orientación ni
+    metadatos, no se recomprime (se evita perder calidad en cada pasada).
+
+    Returns:
+        Bytes y dimensiones antes/después, y si se reescribió el archivo.
+    """
+    from PIL import Image, ImageOps
+
+    bytes_originales = os.path.getsize(ruta_origen)
+    with Image.open(ruta_origen) as imagen:
+        tamano_original = imagen.size
+        formato = imagen.format
+        exif = imagen.getexif()
+        orientacion = exif.get(_TAG_ORIENTACION, 1)
+        tiene_metadatos = bool(exif) or any(
+            clave in imagen.info for clave in ("exif", "xmp", "XML:com.adobe.xmp", "comment", "icc_profile")
+        )
+        if (formato == "JPEG" and max(tamano_original) <= lado_maximo
+                and orientacion == 1 and not tiene_metadatos and imagen.mode in ("RGB", "L")):
+            if ruta_origen != ruta_destino:
+                with open(ruta_origen, 'rb') as origen, open(ruta_destino, 'wb') as destino:
+                    destino.write(origen.read())
+            return {
+                'reescrita': False,
+                'bytes_originales': bytes_originales,
+                'bytes': bytes_originales,
+                'tamano_original': tamano_original,
+                'tamano': tamano_original,
+            }
+
+        # JPEG: el decodificador reduce por 1/2, 1/4 u 1/8 sin expandir la imagen completa
+        imagen.draft("RGB", (lado_maximo, lado_maximo))
+        normalizada = ImageOps.exif_transpose(imagen)
+        if normalizada.mode != "RGB":
+            normalizada = normalizada.convert("RGB")
+        normalizada.thumbnail((lado_maximo, lado_maximo), Image.Resampling.LANCZOS)
+
+    temporal = f"{ruta_destino}.tmp"
+    # Sin exif/icc_profile: el JPEG resultante no lleva metadatos
+    normalizada.save(temporal, format="JPEG", quality=calidad, optimize=True)
+    os.replace(temporal, ruta_destino)
+    return {
+        'reescrita': True,
+        'bytes_originales': bytes_originales,
+        'bytes': os.path.getsize(ruta_destino),
+        'tamano_original': tamano_original,
+        'tamano': normalizada.size,
+    }
+
+
+def _obtener_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            procesos = PREPROCESADO_CONFIG.get('procesos') or os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(max_workers=int(procesos))
+            # Si este proceso es hijo de multiprocessing, al salir cierra las colas y espera
+            # a sus hijos antes de los atexit: el pool se cierra antes que sus colas
+            multiprocessing.util.Finalize(None, cerrar_pool, exitpriority=100)
+        return _pool
+
+
+def cerrar_pool() -> None:
+    """Termina los procesos del pool (se vuelve a crear al próximo uso)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+@trazar("imagen.preprocesado")
+def preprocesar_imagen(ruta_imagen: Path) -> Optional[Dict[str, Any]]:
+    """
+    Normaliza la imagen en el lugar usando el pool de procesos. Varios hilos
+    pueden llamarla a la vez: cada imagen ocupa un proceso distinto.
+
+    Returns:
+        Resultado de normalizar_imagen, o None si está deshabilitado o falla
+        (en ese caso queda la imagen original y se envía igual).
+    """
+    if not PREPROCESADO_CONFIG.get('habilitado', True):
+        return None
+    inicio = time.perf_counter()
+    try:
+        futuro = _obtener_pool().submit(
+            normalizar_imagen,
+            str(ruta_imagen),
+            str(ruta_imagen),
+            int(PREPROCESADO_CONFIG.get('lado_maximo', LADO_MAXIMO)),
+            int(PREPROCESADO_CONFIG.get('calidad_jpeg', CALIDAD_JPEG)),
+        )
+        resultado = futuro.result(timeout=TIMEOUT_PREPROCESADO)
+    except Exception as e:
+        logger.warning(f"No se pudo normalizar {Path(ruta_imagen).name}, se envía la original: {e}")
+        return None
+
+    BYTES_IMAGEN.incrementar(resultado['bytes_originales'], etapa="descargada")
+    BYTES_IMAGEN.incrementar(resultado['bytes'], etapa="normalizada")
+    if resultado['reescrita']:
+        logger.info(
+            f"Imagen {Path(ruta_imagen).name} normalizada: "
+            f"{resultado['tamano_original'][0]}x{resultado['tamano_original'][1]} -> "
+            f"{resultado['tamano'][0]}x{resultado['tamano'][1]}, "
+            f"{resultado['bytes_originales'] / 1024:.0f} KB -> {resultado['bytes'] / 1024:.0f} KB "
+            f"en {(time.perf_counter() - inicio) * 1000:.0f} ms"
+        )
+    return resultado
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Capa de resiliencia para las llamadas HTTP (equipos ControlId y descarga de
+imágenes).
+
+- Reintentos con backoff exponencial y jitter completo, solo para llamadas
+  idempotentes y solo ante errores de red, timeouts o respuestas 5xx.
+- Circuit breaker por equipo/host: tras varios fallos seguidos el circuito se
+  abre y las llamadas fallan al instante (sin quemar timeouts) hasta que pasa
+  el tiempo de apertura; entonces se deja pasar una sola llamada de prueba
+  (semiabierto) que cierra el circuito si el equipo volvió.
+- Timeout de conexión corto y separado del de lectura, para que un equipo
+  reiniciando se detecte en segundos y no en 30 s.
+
+Configuración opcional en config.py:
+    RESILIENCIA_CONFIG = {
+        "reintentos": 3,
+        "espera_base": 0.5,
+        "espera_maxima": 8,
+        "umbral_fallos": 5,
+        "tiempo_apertura": 30,
+        "timeout_conexion": 3.05,
+        "timeout_lectura": 30,
+    }
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+try:
+    from config import RESILIENCIA_CONFIG
+except ImportError:
+    RESILIENCIA_CONFIG = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+REINTENTOS = int(RESILIENCIA_CONFIG.get('reintentos', 3))
+ESPERA_BASE = float(RESILIENCIA_CONFIG.get('espera_base', 0.5))
+ESPERA_MAXIMA = float(RESILIENCIA_CONFIG.get('espera_maxima', 8))
+UMBRAL_FALLOS = int(RESILIENCIA_CONFIG.get('umbral_fallos', 5))
+TIEMPO_APERTURA = float(RESILIENCIA_CONFIG.get('tiempo_apertura', 30))
+
+# (conexión, lectura) para requests
+TIMEOUT_HTTP = (
+    float(RESILIENCIA_CONFIG.get('timeout_conexion', 3.05)),
+    float(RESILIENCIA_CONFIG.get('timeout_lectura', 30)),
+)
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class CircuitoAbiertoError(requests.exceptions.ConnectionError):
+    """
+    El equipo está marcado como caído; la llamada no se intentó.
+
+    Hereda de ConnectionError para que los `except requests.RequestException`
+    existentes la traten como cualquier error de red.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un equipo/host.
+
+    Args:
+        nombre: Identificador (para logs)
+        umbral_fallos: Fallos seguidos que abren el circuito
+        tiempo_apertura: Segundos que el circuito permanece abierto antes de probar
+    """
+
+    def __init__(self, nombre: str, umbral_fallos: int = UMBRAL_FALLOS,
+                 tiempo_apertura: float = TIEMPO_APERTURA):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self.estado = CERRADO
+        self.fallos_seguidos = 0
+        self.abierto_desde = 0.0
+        self.aperturas = 0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        """Indica si se puede intentar una llamada ahora."""
+        with self._lock:
+            if self.estado == CERRADO:
+                return True
+            if self.estado == ABIERTO:
+                if time.monotonic() - self.abierto_desde < self.tiempo_apertura:
+                    return False
+                self.estado = SEMIABIERTO
+                self._prueba_en_curso = False
+                logger.info(f"Circuito {self.nombre} semiabierto: probando si el equipo volvió")
+            # Semiabierto: una sola llamada de prueba a la vez
+            if self._prueba_en_curso:
+                return False
+            self._prueba_en_curso = True
+            return True
+
+    def registrar_exito(self) -> None:
+        with self._lock:
+            if self.estado != CERRADO:
+                logger.info(f"Circuito {self.nombre} cerrado: el equipo responde de nuevo")
+            self.estado = CERRADO
+            self.fallos_seguidos = 0
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self) -> None:
+        with self._lock:
+            self.fallos_seguidos += 1
+            self._prueba_en_curso = False
+            if self.estado == SEMIABIERTO or (
+                self.estado == CERRADO and self.fallos_seguidos >= self.umbral_fallos
+            ):
+                self.estado = ABIERTO
+                self.abierto_desde = time.monotonic()
+                self.aperturas += 1
+                logger.warning(
+                    f"Circuito {self.nombre} abierto tras {self.fallos_seguidos} fallos; "
+                    f"se reintentará en {self.tiempo_apertura:.0f} s"
+                )
+
+    def cancelar_prueba(self) -> None:
+        """Libera la llamada de prueba cuando terminó sin indicar el estado del equipo."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'estado': self.estado,
+                'fallos_seguidos': self.fallos_seguidos,
+                'aperturas': self.aperturas,
+            }
+
+
+_circuitos: Dict[str, CircuitBreaker] = {}
+_circuitos_lock = threading.Lock()
+
+
+def obtener_circuito(url: str) -> CircuitBreaker:
+    """Devuelve el circuit breaker del equipo/host de la URL (scheme://host:puerto)."""
+    partes = urlsplit(url)
+    clave = f"{partes.scheme}://{partes.netloc}"
+    with _circuitos_lock:
+        circuito = _circuitos.get(clave)
+        if not circuito:
+            circuito = CircuitBreaker(clave)
+            _circuitos[clave] = circuito
+        return circuito
+
+
+def estadisticas_circuitos() -> Dict[str, Dict[str, Any]]:
+    """Estado de todos los circuitos conocidos."""
+    with _circuitos_lock:
+        circuitos = list(_circuitos.values())
+    return {circuito.nombre: circuito.estadisticas() for circuito in circuitos}
+
+
+def equipo_inalcanzable(url: str) -> bool:
+    """
+    Indica si el equipo/host de la URL está caído según su circuit breaker:
+    circuito no cerrado, o fallos de red/5xx desde la última respuesta sana.
+    """
+    estadisticas = obtener_circuito(url).estadisticas()
+    return estadisticas['estado'] != CERRADO or estadisticas['fallos_seguidos'] > 0
+
+
+def es_error_transitorio(error: Exception) -> bool:
+    """Errores de red o timeouts que vale la pena reintentar."""
+    if isinstance(error, CircuitoAbiertoError):
+        return False
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def espera_backoff(intento: int, base: float = ESPERA_BASE, maximo: float = ESPERA_MAXIMA) -> float:
+    """Backoff exponencial con jitter completo: uniforme en [0, min(maximo, base * 2^intento)]."""
+    return random.uniform(0, min(maximo, base * (2 ** intento)))
+
+
+def solicitud_http(metodo: str, url: str, idempotente: bool = True,
+                   reintentos: int = REINTENTOS, enviar: Optional[Callable[..., requests.Response]] = None,
+                   **kwargs) -> requests.Response:
+    """
+    Ejecuta una solicitud HTTP protegida por el circuit breaker del equipo y,
+    si es idempotente, con reintentos con backoff.
+
+    Args:
+        metodo: "GET" o "POST"
+        url: URL completa
+        idempotente: Si es False la solicitud se intenta una sola vez
+        reintentos: Reintentos adicionales para solicitudes idempotentes
+        enviar: Función que hace el envío (por defecto requests.request); permite
+            envolverla, p. ej. con el limitador del equipo
+        **kwargs: Argumentos para requests (params, json, data, headers...)
+
+    Returns:
+        La respuesta (puede ser 4xx; el llamador decide con raise_for_status).
+
+    Raises:
+        CircuitoAbiertoError: Si el equipo está marcado como caído.
+        requests.RequestException: Si se agotan los reintentos.
+    """
+    circuito = obtener_circuito(url)
+    enviar = enviar or requests.request
+    kwargs.setdefault('timeout', TIMEOUT_HTTP)
+    intentos = 1 + (reintentos if idempotente else 0)
+
+    for intento in range(intentos):
+        if not circuito.permitir():
+            raise CircuitoAbiertoError(f"Circuito abierto para {circuito.nombre}; no se intenta {url}")
+
+        try:
+            response = enviar(metodo, url, **kwargs)
+        except requests.RequestException as e:
+            if es_error_transitorio(e):
+                circuito.registrar_fallo()
+                # Si el fallo abrió el circuito no tiene sentido esperar para reintentar
+                if intento + 1 < intentos and circuito.estado != ABIERTO:
+                    espera = espera_backoff(intento)
+                    logger.warning(f"Error transitorio en {url} ({e}); reintento en {espera:.2f} s")
+                    time.sleep(espera)
+                    continue
+            else:
+                circuito.cancelar_prueba()
+            raise
+        except BaseException:
+            # Error ajeno a la red (p. ej. del `enviar` envuelto por el limitador):
+            # libera la prueba de semiabierto para no dejar el circuito trabado
+            circuito.cancelar_prueba()
+            raise
+
+        if response.status_code >= 500:
+            circuito.registrar_fallo()
+            if intento + 1 < intentos and circuito.estado != ABIERTO:
+                espera = espera_backoff(intento)
+                logger.warning(f"Respuesta {response.status_code} de {url}; reintento en {espera:.2f} s")
+                time.sleep(espera)
+                continue
+        else:
+            circuito.registrar_exito()
+        return response
+
+    return response
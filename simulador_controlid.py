@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Simulador local de un equipo ControlId para pruebas y benchmarks.
+
+Implementa los endpoints que usa `flujo_usuario_inteligente` sobre tablas en
+memoria (`users` y `user_groups`):
+- login.fcgi
+- load_objects.fcgi
+- create_objects.fcgi
+- create_or_modify_objects.fcgi
+- user_set_image.fcgi
+
+El comportamiento del equipo real se puede ajustar: latencia (con jitter),
+tasa de errores 5xx, expiración de sesiones, tamaño máximo de la imagen y
+cantidad de solicitudes simultáneas que el servidor fcgi acepta. Los errores
+y el jitter usan una semilla fija, así que dos corridas con la misma
+configuración y la misma carga se comportan igual.
+
+Uso:
+    python simulador_controlid.py --puerto 8081 --latencia 0.05 --tasa-error 0.01
+
+o desde código:
+    with SimuladorControlId(latencia=0.02) as equipo:
+        CONTROL_ID_CONFIG['base_url'] = equipo.url
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+LOGIN = "admin"
+PASSWORD = "admin"
+
+# Los equipos reales rechazan imágenes de más de ~2 MB
+MAX_TAMANO_IMAGEN = 2 * 1024 * 1024
+
+
+class EstadoEquipo:
+    """
+    Tablas y sesiones del equipo simulado (protegidas por un lock, como la
+    base SQLite del equipo real).
+    """
+
+    def __init__(self, usuarios_iniciales: int = 0):
+        self._lock = threading.Lock()
+        self.users: List[Dict[str, Any]] = []
+        self.user_groups: List[Dict[str, Any]] = []
+        self.imagenes: Dict[int, int] = {}
+        self.sesiones: Dict[str, float] = {}
+        self._siguiente_id = 1
+        for indice in range(usuarios_iniciales):
+            self.crear_usuario({'name': f"Usuario Inicial {indice}", 'registration': f"9{indice:09d}"})
+
+    def crear_usuario(self, valores: Dict[str, Any]) -> int:
+        with self._lock:
+            usuario_id = int(valores.get('id') or self._siguiente_id)
+            self._siguiente_id = max(self._siguiente_id, usuario_id) + 1
+            self.users.append({
+                'id': usuario_id,
+                'name': valores.get('name', ''),
+                'registration': str(valores.get('registration', '')),
+                'password': valores.get('password', ''),
+                'salt': valores.get('salt', ''),
+            })
+            return usuario_id
+
+    def crear_o_modificar_usuario(self, valores: Dict[str, Any]) -> int:
+        with self._lock:
+            for usuario in self.users:
+                if usuario['id'] == int(valores.get('id', -1)):
+                    usuario.update({k: v for k, v in valores.items() if k != 'id'})
+                    return 1
+        self.crear_usuario(valores)
+        return 1
+
+    def crear_grupo(self, valores: Dict[str, Any]) -> bool:
+        relacion = {'user_id': int(valores['user_id']), 'group_id': int(valores['group_id'])}
+        with self._lock:
+            if relacion in self.user_groups:
+                return False
+            self.user_groups.append(relacion)
+            return True
+
+    def existe_usuario(self, usuario_id: int) -> bool:
+        with self._lock:
+            return any(usuario['id'] == usuario_id for usuario in self.users)
+
+    def cargar(self, objeto: str, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            filas = [dict(fila) for fila in getattr(self, objeto)]
+        if where:
+            filas = [f for f in filas if all(str(f.get(k)) == str(v) for k, v in where.items())]
+        return filas
+
+
+class _ManejadorControlId(BaseHTTPRequestHandler):
+    """Atiende las solicitudes fcgi contra el EstadoEquipo del servidor."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        # Silenciar el log por solicitud de http.server
+        pass
+
+    def _responder(self, codigo: int, cuerpo: Dict[str, Any]) -> None:
+        datos = json.dumps(cuerpo).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_POST(self):
+        simulador: SimuladorControlId = self.server.simulador
+        partes = urlsplit(self.path)
+        endpoint = partes.path.strip('/')
+        params = {k: v[0] for k, v in parse_qs(partes.query).items()}
+        cuerpo = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+
+        if not simulador._entrar():
+            self._responder(503, {'error': "Servidor ocupado"})
+            return
+        try:
+            simulador._esperar_latencia(len(cuerpo))
+            codigo, respuesta = simulador._atender(endpoint, params, cuerpo)
+        except Exception as e:
+            codigo, respuesta = 500, {'error': str(e)}
+        finally:
+            simulador._salir()
+        self._responder(codigo, respuesta)
+
+
+class SimuladorControlId:
+    """
+    Equipo ControlId simulado en un servidor HTTP local.
+
+    Args:
+        host: Interfaz de escucha
+        puerto: Puerto (0 = uno libre)
+        latencia: Segundos de procesamiento por solicitud
+        jitter: Variación aleatoria (+/-) de la latencia, en segundos
+        segundos_por_mb: Latencia adicional por MB recibido (imágenes)
+        tasa_error: Probabilidad (0-1) de responder 500
+        expiracion_sesion: Segundos de vida de una sesión (0 = no expira)
+        max_tamano_imagen: Bytes máximos aceptados por user_set_image (413 si se excede)
+        max_simultaneas: Solicitudes atendidas a la vez; el resto recibe 503 (0 = sin límite)
+        usuarios_iniciales: Usuarios precargados (agranda la respuesta de load_objects)
+        semilla: Semilla del generador aleatorio
+    """
+
+    def __init__(self, host: str = "127.0.0.1", puerto: int = 0, latencia: float = 0.0,
+                 jitter: float = 0.0, segundos_por_mb: float = 0.0, tasa_error: float = 0.0,
+                 expiracion_sesion: float = 0.0, max_tamano_imagen: int = MAX_TAMANO_IMAGEN,
+                 max_simultaneas: int = 0, usuarios_iniciales: int = 0, semilla: int = 42):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.segundos_por_mb = segundos_por_mb
+        self.tasa_error = tasa_error
+        self.expiracion_sesion = expiracion_sesion
+        self.max_tamano_imagen = max_tamano_imagen
+        self.max_simultaneas = max_simultaneas
+        self.estado = EstadoEquipo(usuarios_iniciales)
+        self._random = random.Random(semilla)
+        self._random_lock = threading.Lock()
+        self._contadores_lock = threading.Lock()
+        self.en_curso = 0
+        self.solicitudes: Dict[str, int] = {}
+        self.errores: Dict[int, int] = {}
+
+        self._servidor = ThreadingHTTPServer((host, puerto), _ManejadorControlId)
+        self._servidor.daemon_threads = True
+        self._servidor.simulador = self
+        self._hilo = None
+
+    @property
+    def url(self) -> str:
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def iniciar(self) -> "SimuladorControlId":
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name="simulador-controlid", daemon=True)
+        self._hilo.start()
+        logger.info(f"Simulador ControlId escuchando en {self.url}")
+        return self
+
+    def detener(self) -> None:
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self) -> "SimuladorControlId":
+        return self.iniciar()
+
+    def __exit__(self, *args) -> None:
+        self.detener()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._contadores_lock:
+            return {
+                'solicitudes': dict(self.solicitudes),
+                'errores': dict(self.errores),
+                'usuarios': len(self.estado.users),
+                'user_groups': len(self.estado.user_groups),
+                'imagenes': len(self.estado.imagenes),
+            }
+
+    def _entrar(self) -> bool:
+        with self._contadores_lock:
+            if self.max_simultaneas and self.en_curso >= self.max_simultaneas:
+                self.errores[503] = self.errores.get(503, 0) + 1
+                return False
+            self.en_curso += 1
+            return True
+
+    def _salir(self) -> None:
+        with self._contadores_lock:
+            self.en_curso -= 1
+
+    def _aleatorio(self) -> float:
+        with self._random_lock:
+            return self._random.random()
+
+    def _esperar_latencia(self, tamano: int) -> None:
+        espera = self.latencia + self.segundos_por_mb * tamano / (1024 * 1024)
+        if self.jitter:
+            espera += (self._aleatorio() * 2 - 1) * self.jitter
+        if espera > 0:
+            time.sleep(espera)
+
+    def _sesion_valida(self, sesion: Optional[str]) -> bool:
+        with self.estado._lock:
+            creada = self.estado.sesiones.get(sesion)
+            if creada is None:
+                return False
+            if self.expiracion_sesion and time.monotonic() - creada > self.expiracion_sesion:
+                del self.estado.sesiones[sesion]
+                return False
+            return True
+
+    def _atender(self, endpoint: str, params: Dict[str, str], cuerpo: bytes):
+        with self._contadores_lock:
+            self.solicitudes[endpoint] = self.solicitudes.get(endpoint, 0) + 1
+
+        codigo, respuesta = self._despachar(endpoint, params, cuerpo)
+        if codigo >= 400:
+            with self._contadores_lock:
+                self.errores[codigo] = self.errores.get(codigo, 0) + 1
+        return codigo, respuesta
+
+    def _despachar(self, endpoint: str, params: Dict[str, str], cuerpo: bytes):
+        if self.tasa_error and self._aleatorio() < self.tasa_error:
+            return 500, {'error': "Error interno simulado"}
+
+        if endpoint == "login.fcgi":
+            datos = json.loads(cuerpo or b"{}")
+            if datos.get('login') != LOGIN or datos.get('password') != PASSWORD:
+                return 401, {'error': "Usuario o contraseña inválidos"}
+            sesion = uuid.uuid4().hex[:24]
+            with self.estado._lock:
+                self.estado.sesiones[sesion] = time.monotonic()
+            return 200, {'session': sesion}
+
+        if not self._sesion_valida(params.get('session')):
+            return 401, {'error': "Sesión inválida", 'code': 1}
+
+        if endpoint == "user_set_image.fcgi":
+            if len(cuerpo) > self.max_tamano_imagen:
+                return 413, {'error': "Imagen demasiado grande"}
+            usuario_id = int(params.get('user_id', -1))
+            if not self.estado.existe_usuario(usuario_id):
+                return 400, {'error': f"Usuario {usuario_id} no existe"}
+            with self.estado._lock:
+                self.estado.imagenes[usuario_id] = len(cuerpo)
+            return 200, {}
+
+        datos = json.loads(cuerpo or b"{}")
+        objeto = datos.get('object')
+        if objeto not in ("users", "user_groups"):
+            return 400, {'error': f"Objeto desconocido: {objeto}"}
+
+        if endpoint == "load_objects.fcgi":
+            where = datos.get('where', {}).get(objeto)
+            return 200, {objeto: self.estado.cargar(objeto, where)}
+
+        if endpoint == "create_objects.fcgi":
+            if objeto == "users":
+                return 200, {'ids': [self.estado.crear_usuario(v) for v in datos.get('values', [])]}
+            for valores in datos.get('values', []):
+                if not self.estado.crear_grupo(valores):
+                    return 400, {'error': "constraint failed: user_groups already exists"}
+            return 200, {'ids': []}
+
+        if endpoint == "create_or_modify_objects.fcgi":
+            if objeto != "users":
+                return 400, {'error': "Solo se simula create_or_modify para users"}
+            cambios = sum(self.estado.crear_o_modificar_usuario(v) for v in datos.get('values', []))
+            return 200, {'changes': cambios}
+
+        return 404, {'error': f"Endpoint desconocido: {endpoint}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador local de un equipo ControlId")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8081)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos por solicitud")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación +/- de la latencia")
+    parser.add_argument("--segundos-por-mb", type=float, default=0.0, help="Latencia adicional por MB recibido")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Probabilidad de responder 500")
+    parser.add_argument("--expiracion-sesion", type=float, default=0.0, help="Vida de la sesión en segundos")
+    parser.add_argument("--max-tamano-imagen", type=int, default=MAX_TAMANO_IMAGEN)
+    parser.add_argument("--max-simultaneas", type=int, default=0, help="Solicitudes simultáneas (0 = sin límite)")
+    parser.add_argument("--usuarios-iniciales", type=int, default=0)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    simulador = SimuladorControlId(
+        host=args.host,
+        puerto=args.puerto,
+        latencia=args.latencia,
+        jitter=args.jitter,
+        segundos_por_mb=args.segundos_por_mb,
+        tasa_error=args.tasa_error,
+        expiracion_sesion=args.expiracion_sesion,
+        max_tamano_imagen=args.max_tamano_imagen,
+        max_simultaneas=args.max_simultaneas,
+        usuarios_iniciales=args.usuarios_iniciales,
+        semilla=args.semilla,
+    )
+    simulador.iniciar()
+    print(f"Simulador ControlId en {simulador.url} (login {LOGIN}/{PASSWORD}). Ctrl+C para detener.")
+    try:
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        print(f"\nEstadísticas: {simulador.estadisticas()}")
+        simulador.detener()
+
+
+if __name__ == "__main__":
+    main()
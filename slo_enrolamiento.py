@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SLO de enrolamiento a puerta.
+
+Lo que importa en la operación es cuánto tarda una persona, desde que se
+enrola en MiID (log_process_enroll.LP_CREATION_DATE), en poder pasar el
+torniquete: el momento en que user_set_image.fcgi responde con éxito en el
+primer equipo. Por cada usuario sincronizado se registra esa diferencia, se
+mantiene una ventana móvil para calcular el percentil configurado y se avisa
+(log y métricas) cuando supera el umbral.
+
+Solo se miden enrolamientos recientes: una resincronización o un envío desde
+el outbox de un enrolamiento de hace días no dice nada del tiempo a puerta y
+arrastraría el percentil (ver `horizonte_segundos`).
+
+Configuración opcional en config.py:
+    SLO_CONFIG = {"umbral_segundos": 300, "percentil": 95, "ventana": 500,
+                  "horizonte_segundos": 86400}
+"""
+
+import logging
+import math
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from metricas import (
+    ENROLAMIENTO_A_PUERTA,
+    PERCENTIL_ENROLAMIENTO,
+    SLO_ENROLAMIENTO_INCUMPLIDO,
+    SLO_ENROLAMIENTO_UMBRAL,
+    USUARIOS_FUERA_DE_SLO,
+)
+
+try:
+    from config import SLO_CONFIG
+except ImportError:
+    SLO_CONFIG = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+UMBRAL_SEGUNDOS = 300.0
+PERCENTIL = 95.0
+VENTANA = 500
+# Enrolamientos más viejos que esto no se miden
+HORIZONTE_SEGUNDOS = 24 * 3600
+
+# Usuarios recordados para medir solo la primera puerta de cada enrolamiento
+MAX_RECORDADOS = 10000
+
+
+def _a_datetime(valor: Any) -> Optional[datetime]:
+    """fecha_creacion puede venir como datetime (MySQL/SQLite) o texto (outbox)."""
+    if isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, str) and valor:
+        try:
+            return datetime.fromisoformat(valor)
+        except ValueError:
+            return None
+    return None
+
+
+class SLOEnrolamiento:
+    """
+    Ventana móvil del tiempo enrolamiento-puerta con umbral de SLO.
+
+    Args:
+        umbral_segundos: Valor máximo aceptable del percentil
+        percentil: Percentil evaluado (0-100)
+        ventana: Cantidad de usuarios recientes considerados
+        horizonte_segundos: Antigüedad máxima del enrolamiento para medirlo
+        log: Función opcional para mostrar avisos (p. ej. el log de la GUI)
+    """
+
+    def __init__(self, umbral_segundos: float = UMBRAL_SEGUNDOS, percentil: float = PERCENTIL,
+                 ventana: int = VENTANA, horizonte_segundos: float = HORIZONTE_SEGUNDOS,
+                 log: Optional[Callable[[str], None]] = None):
+        self.umbral_segundos = float(umbral_segundos)
+        self.percentil = float(percentil)
+        self.horizonte_segundos = float(horizonte_segundos)
+        self.log = log
+        self._valores = deque(maxlen=max(1, int(ventana)))
+        self._recordados: "OrderedDict[tuple, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._incumplido = False
+        self.ultimo: Optional[float] = None
+        self.valor_percentil: Optional[float] = None
+        SLO_ENROLAMIENTO_UMBRAL.fijar(self.umbral_segundos)
+        SLO_ENROLAMIENTO_INCUMPLIDO.fijar(0)
+
+    def _avisar(self, mensaje: str) -> None:
+        logger.warning(mensaje)
+        if self.log:
+            self.log(mensaje)
+
+    def registrar(self, usuario: Dict[str, Any], fin: Optional[datetime] = None) -> Optional[float]:
+        """
+        Registra que la imagen del usuario quedó cargada en un equipo.
+
+        Solo cuenta la primera puerta de cada enrolamiento (documento y fecha
+        de creación); los envíos posteriores a otros equipos o desde el outbox
+        no se vuelven a medir. Tampoco los enrolamientos más viejos que el
+        horizonte (resincronizaciones de usuarios antiguos).
+
+        Returns:
+            Segundos desde el enrolamiento, o None si no se midió.
+        """
+        creacion = _a_datetime(usuario.get('fecha_creacion'))
+        if creacion is None:
+            return None
+        clave = (str(usuario.get('documento')), creacion.isoformat())
+        fin = fin or datetime.now(creacion.tzinfo)
+        # Relojes desfasados entre MiID y este equipo no deben dar negativos
+        segundos = max(0.0, (fin - creacion).total_seconds())
+        if segundos > self.horizonte_segundos:
+            return None
+
+        with self._lock:
+            if clave in self._recordados:
+                return None
+            self._recordados[clave] = None
+            if len(self._recordados) > MAX_RECORDADOS:
+                self._recordados.popitem(last=False)
+            self._valores.append(segundos)
+            ordenados = sorted(self._valores)
+            indice = max(0, math.ceil(self.percentil / 100 * len(ordenados)) - 1)
+            valor_percentil = ordenados[indice]
+            self.ultimo = segundos
+            self.valor_percentil = valor_percentil
+            incumplido = valor_percentil > self.umbral_segundos
+            cambio = incumplido != self._incumplido
+            self._incumplido = incumplido
+
+        ENROLAMIENTO_A_PUERTA.observar(segundos)
+        PERCENTIL_ENROLAMIENTO.fijar(valor_percentil, percentil=f"p{self.percentil:g}")
+        SLO_ENROLAMIENTO_INCUMPLIDO.fijar(1 if incumplido else 0)
+        if segundos > self.umbral_segundos:
+            USUARIOS_FUERA_DE_SLO.incrementar()
+            logger.info(
+                f"Usuario {clave[0]} en la puerta {segundos:.0f} s después del enrolamiento "
+                f"(umbral {self.umbral_segundos:.0f} s)"
+            )
+        if cambio and incumplido:
+            self._avisar(
+                f"SLO enrolamiento-puerta incumplido: p{self.percentil:g} = {valor_percentil:.0f} s "
+                f"(umbral {self.umbral_segundos:.0f} s)"
+            )
+        elif cambio:
+            self._avisar(f"SLO enrolamiento-puerta recuperado: p{self.percentil:g} = {valor_percentil:.0f} s")
+        return segundos
+
+    @property
+    def incumplido(self) -> bool:
+        return self._incumplido
+
+    def resumen(self) -> str:
+        """Texto corto para la GUI."""
+        if self.valor_percentil is None:
+            return f"Enrolamiento→puerta: sin datos (SLO p{self.percentil:g} ≤ {self.umbral_segundos:.0f} s)"
+        return (
+            f"Enrolamiento→puerta: último {self.ultimo:.0f} s, p{self.percentil:g} {self.valor_percentil:.0f} s "
+            f"(SLO ≤ {self.umbral_segundos:.0f} s)"
+        )
+
+
+def crear_slo(log: Optional[Callable[[str], None]] = None) -> SLOEnrolamiento:
+    """SLO con la configuración de SLO_CONFIG."""
+    return SLOEnrolamiento(
+        umbral_segundos=float(SLO_CONFIG.get('umbral_segundos', UMBRAL_SEGUNDOS)),
+        percentil=float(SLO_CONFIG.get('percentil', PERCENTIL)),
+        ventana=int(SLO_CONFIG.get('ventana', VENTANA)),
+        horizonte_segundos=float(SLO_CONFIG.get('horizonte_segundos', HORIZONTE_SEGUNDOS)),
+        log=log,
+    )
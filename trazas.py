@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trazas livianas por usuario sincronizado.
+
+Cada sincronización abre una traza (id propio) y cada etapa registra un span
+con su duración: consulta a MiID, stored procedure, descarga de la imagen,
+búsqueda/creación/modificación en el equipo, grupo y foto. Los spans se
+escriben como una línea JSON por span en un archivo rotativo.
+
+Con las trazas desactivadas (por defecto) `span()` devuelve siempre el mismo
+objeto nulo y `@trazar` solo toma la duración de la llamada (un par de
+perf_counter, nada frente a una etapa de red) para la latencia por etapa del
+dashboard (metricas.LATENCIA_ETAPA). Con las trazas activas esa métrica se
+alimenta de los spans. `latencia_etapas: False` apaga también la medición.
+
+Configuración opcional en config.py:
+    TRAZAS_CONFIG = {
+        "habilitado": True,
+        "ruta": "trazas.jsonl",
+        "max_bytes": 10 * 1024 * 1024,
+        "respaldos": 5,
+        "latencia_etapas": True,
+    }
+
+Ejemplo:
+    with iniciar_traza(documento="123"):
+        with span("descarga.imagen") as s:
+            ...
+            s.atributo("bytes", 1234)
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from configuracion import ruta_datos
+from metricas import LATENCIA_ETAPA
+
+try:
+    from config import TRAZAS_CONFIG
+except ImportError:
+    TRAZAS_CONFIG = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+RUTA_TRAZAS = ruta_datos("trazas.jsonl")
+MAX_BYTES = 10 * 1024 * 1024
+RESPALDOS = 5
+
+_habilitado = False
+# Medir la duración de cada @trazar para LATENCIA_ETAPA aunque no haya trazas
+_latencia_etapas = True
+_exportador: Optional[logging.Logger] = None
+
+# Traza y span activos del contexto (hilo) actual
+_traza_actual: contextvars.ContextVar = contextvars.ContextVar("traza_actual", default=None)
+_span_actual: contextvars.ContextVar = contextvars.ContextVar("span_actual", default=None)
+
+
+def _nuevo_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class _SpanNulo:
+    """Span que no hace nada (trazas desactivadas)."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_SpanNulo":
+        return self
+
+    def __exit__(self, *args) -> bool:
+        return False
+
+    def atributo(self, clave: str, valor: Any) -> None:
+        pass
+
+    def marcar_error(self, detalle: str) -> None:
+        pass
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+class Span:
+    """Etapa medida de una traza; se exporta al salir del bloque `with`."""
+
+    __slots__ = ('nombre', 'atributos', 'traza', 'id', 'padre', 'error', '_inicio', '_inicio_epoch', '_tokens')
+
+    def __init__(self, nombre: str, atributos: dict):
+        self.nombre = nombre
+        self.atributos = atributos
+        self.traza = None
+        self.id = None
+        self.padre = None
+        self.error = None
+        self._tokens = None
+
+    def atributo(self, clave: str, valor: Any) -> None:
+        self.atributos[clave] = valor
+
+    def marcar_error(self, detalle: str) -> None:
+        """Termina el span con estado error aunque no salga con una excepción."""
+        self.error = detalle
+
+    def __enter__(self) -> "Span":
+        self.traza = _traza_actual.get()
+        token_traza = None
+        if self.traza is None:
+            # Span suelto: abre su propia traza
+            self.traza = _nuevo_id()
+            token_traza = _traza_actual.set(self.traza)
+        self.id = _nuevo_id()
+        self.padre = _span_actual.get()
+        self._tokens = (token_traza, _span_actual.set(self.id))
+        self._inicio_epoch = time.time()
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traceback) -> bool:
+        duracion = time.perf_counter() - self._inicio
+        LATENCIA_ETAPA.observar(duracion, etapa=self.nombre)
+        token_traza, token_span = self._tokens
+        _span_actual.reset(token_span)
+        if token_traza is not None:
+            _traza_actual.reset(token_traza)
+
+        registro = {
+            'traza': self.traza,
+            'span': self.id,
+            'padre': self.padre,
+            'nombre': self.nombre,
+            'inicio': self._inicio_epoch,
+            'duracion_ms': round(duracion * 1000, 3),
+            'estado': "error" if tipo or self.error else "ok",
+        }
+        if tipo:
+            registro['error'] = f"{tipo.__name__}: {valor}"
+        elif self.error:
+            registro['error'] = self.error
+        if self.atributos:
+            registro['atributos'] = self.atributos
+        exportador = _exportador
+        if exportador:
+            try:
+                exportador.info(json.dumps(registro, default=str, ensure_ascii=False))
+            except Exception as e:
+                logger.debug(f"No se pudo exportar el span {self.nombre}: {e}")
+        return False
+
+
+def span(nombre: str, **atributos: Any):
+    """
+    Context manager que mide una etapa. Con las trazas desactivadas devuelve
+    un objeto nulo compartido.
+    """
+    if not _habilitado:
+        return _SPAN_NULO
+    return Span(nombre, atributos)
+
+
+class _Traza:
+    """Contexto de una traza (p. ej. la sincronización de un usuario)."""
+
+    __slots__ = ('id', '_token', '_span')
+
+    def __init__(self, nombre: str, atributos: dict):
+        self.id = _nuevo_id()
+        self._token = None
+        self._span = Span(nombre, atributos)
+
+    def __enter__(self) -> str:
+        self._token = _traza_actual.set(self.id)
+        self._span.__enter__()
+        return self.id
+
+    def __exit__(self, tipo, valor, traceback) -> bool:
+        self._span.__exit__(tipo, valor, traceback)
+        _traza_actual.reset(self._token)
+        return False
+
+
+def iniciar_traza(nombre: str = "sincronizacion.usuario", **atributos: Any):
+    """
+    Abre una traza nueva con un span raíz. Devuelve el id de la traza (None
+    si las trazas están desactivadas).
+    """
+    if not _habilitado:
+        return _SIN_TRAZA
+    return _Traza(nombre, atributos)
+
+
+class _SinTraza:
+    """Traza que no hace nada (trazas desactivadas)."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *args) -> bool:
+        return False
+
+
+_SIN_TRAZA = _SinTraza()
+
+
+def trazar(nombre: str, falla_si_none: bool = False) -> Callable:
+    """
+    Decorador: registra cada llamada a la función como un span y su duración como etapa.
+
+    Las funciones del flujo no lanzan: loguean y devuelven False (o None). Ese
+    valor marca el span como error; con `falla_si_none` también None, para las
+    funciones donde None significa que falló y no "no encontrado".
+    """
+    def decorador(funcion: Callable) -> Callable:
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if _habilitado:
+                with Span(nombre, {}) as s:
+                    resultado = funcion(*args, **kwargs)
+                    if resultado is False or (falla_si_none and resultado is None):
+                        s.marcar_error(f"devolvió {resultado}")
+                    return resultado
+            if not _latencia_etapas:
+                return funcion(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                LATENCIA_ETAPA.observar(time.perf_counter() - inicio, etapa=nombre)
+        return envoltura
+    return decorador
+
+
+def traza_actual() -> Optional[str]:
+    """Id de la traza activa en este contexto, si hay una."""
+    return _traza_actual.get()
+
+
+def configurar_trazas(habilitado: bool, ruta: Optional[Path] = None,
+                      max_bytes: int = MAX_BYTES, respaldos: int = RESPALDOS,
+                      latencia_etapas: bool = True) -> None:
+    """
+    Activa o desactiva las trazas y (re)abre el archivo JSONL rotativo.
+    `latencia_etapas` mide cada etapa para el dashboard aunque las trazas estén desactivadas.
+    """
+    global _habilitado, _latencia_etapas, _exportador
+
+    if _exportador:
+        for handler in list(_exportador.handlers):
+            _exportador.removeHandler(handler)
+            handler.close()
+        _exportador = None
+
+    if habilitado:
+        ruta = Path(ruta or RUTA_TRAZAS)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            ruta, maxBytes=max_bytes, backupCount=respaldos, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        exportador = logging.getLogger("trazas.exportador")
+        exportador.setLevel(logging.INFO)
+        exportador.propagate = False
+        exportador.addHandler(handler)
+        _exportador = exportador
+        logger.info(f"Trazas activas en {ruta}")
+
+    _habilitado = bool(habilitado)
+    _latencia_etapas = bool(latencia_etapas)
+
+
+configurar_trazas(
+    TRAZAS_CONFIG.get('habilitado', False),
+    TRAZAS_CONFIG.get('ruta'),
+    int(TRAZAS_CONFIG.get('max_bytes', MAX_BYTES)),
+    int(TRAZAS_CONFIG.get('respaldos', RESPALDOS)),
+    TRAZAS_CONFIG.get('latencia_etapas', True),
+)
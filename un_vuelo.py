@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fusión de trabajos duplicados por clave ("single-flight").
+
+El loop de sincronización, "Cargar Último Usuario" y la búsqueda por
+documento pueden pedir el mismo documento casi a la vez; con varios workers
+eso terminaba en creaciones y cargas de imagen concurrentes del mismo usuario
+contra el equipo. Con UnVuelo solo una ejecución por clave está en curso: las
+demás esperan y reciben su resultado, y durante `ventana` segundos después de
+un éxito los pedidos repetidos reutilizan ese resultado sin volver a ejecutar.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metricas import TRABAJOS_FUSIONADOS
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Segundos durante los que un resultado exitoso se reutiliza para la misma clave
+VENTANA_FUSION = 5.0
+
+
+class _Vuelo:
+    """Ejecución en curso de una clave."""
+
+    __slots__ = ('listo', 'resultado', 'error')
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class UnVuelo:
+    """
+    Una sola ejecución en curso por clave.
+
+    Args:
+        ventana: Segundos que se reutiliza un resultado exitoso (0 = solo
+            se fusionan los pedidos que llegan mientras hay uno en curso)
+    """
+
+    def __init__(self, ventana: float = VENTANA_FUSION):
+        self.ventana = ventana
+        self._lock = threading.Lock()
+        self._en_vuelo: Dict[str, _Vuelo] = {}
+        self._recientes: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def _purgar(self, ahora: float) -> None:
+        # Orden de inserción = orden de finalización: se corta en el primero vigente
+        while self._recientes:
+            clave, (fin, _) = next(iter(self._recientes.items()))
+            if ahora - fin <= self.ventana:
+                break
+            del self._recientes[clave]
+
+    def ejecutar(self, clave: str, funcion: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Ejecuta `funcion` salvo que ya haya una ejecución de `clave` en curso
+        (se espera su resultado) o un éxito dentro de la ventana.
+
+        Returns:
+            (resultado, compartido): compartido es True si el resultado es de
+            otra ejecución.
+
+        Raises:
+            La excepción de la ejecución en curso, también a quienes la esperaban.
+        """
+        with self._lock:
+            self._purgar(time.monotonic())
+            reciente = self._recientes.get(clave)
+            if reciente:
+                TRABAJOS_FUSIONADOS.incrementar(modo="reciente")
+                return reciente[1], True
+            vuelo = self._en_vuelo.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = _Vuelo()
+                self._en_vuelo[clave] = vuelo
+
+        if not lider:
+            TRABAJOS_FUSIONADOS.incrementar(modo="en_vuelo")
+            logger.info(f"{clave}: ya en curso, se espera su resultado")
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado, True
+
+        try:
+            vuelo.resultado = funcion()
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+                # Solo los éxitos se reutilizan: un fallo se reintenta en el próximo pedido
+                if vuelo.error is None and vuelo.resultado and self.ventana > 0:
+                    self._recientes.pop(clave, None)
+                    self._recientes[clave] = (time.monotonic(), vuelo.resultado)
+            vuelo.listo.set()
+        return vuelo.resultado, False
+
+    def en_vuelo(self, clave: str) -> bool:
+        with self._lock:
+            return clave in self._en_vuelo
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Validación rápida de las imágenes descargadas antes de enviarlas a los equipos.
+
+Un blob corrupto, truncado, diminuto o que no es una imagen (p. ej. una página
+de error HTML guardada como .jpg) iba directo al equipo: fallaba allí después
+de la carga completa, o peor, se aceptaba y generaba una plantilla facial mala.
+Antes de cualquier envío se revisa, sin decodificar los píxeles:
+- tamaño del archivo entre `bytes_minimos` y `bytes_maximos`,
+- firma de formato (JPEG o PNG) y marcador de fin (detecta descargas cortadas),
+- encabezado con PIL (`Image.open` + `verify`, sin expandir la imagen),
+- resolución de al menos `lado_minimo` en ambos lados.
+
+Cada rechazo queda con su motivo en `imagenes_rechazadas.jsonl` (documento,
+URL, motivo y detalle) y el archivo se mueve a `rechazadas/` en la carpeta
+temporal, para volver a descargarlo o revisarlo más tarde (ver leer_rechazos).
+
+Configuración opcional en config.py:
+    VALIDACION_IMAGEN_CONFIG = {"habilitado": True, "lado_minimo": 160, "bytes_minimos": 2048,
+                                "bytes_maximos": 20 * 1024 * 1024}
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from configuracion import ruta_datos
+from metricas import IMAGENES_RECHAZADAS
+from trazas import trazar
+
+try:
+    from config import VALIDACION_IMAGEN_CONFIG
+except ImportError:
+    VALIDACION_IMAGEN_CONFIG = {}
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+LADO_MINIMO = 160
+BYTES_MINIMOS = 2048
+BYTES_MAXIMOS = 20 * 1024 * 1024
+
+RUTA_RECHAZOS = ruta_datos("imagenes_rechazadas.jsonl")
+CARPETA_RECHAZADAS = "rechazadas"
+
+# Motivos de rechazo (también son la etiqueta de la métrica)
+TAMANO_ARCHIVO = "tamano_archivo"
+FORMATO = "formato"
+TRUNCADA = "truncada"
+CORRUPTA = "corrupta"
+RESOLUCION = "resolucion"
+
+# Firmas aceptadas por los equipos y el marcador con el que termina cada formato
+_FIRMAS = (
+    (b"\xff\xd8\xff", "JPEG", b"\xff\xd9"),
+    (b"\x89PNG\r\n\x1a\n", "PNG", b"IEND"),
+)
+
+# Bytes del final del archivo en los que se busca el marcador: algunas cámaras
+# agregan datos después del fin de imagen
+_COLA_MARCADOR = 16 * 1024
+
+_lock = threading.Lock()
+# Último motivo de rechazo por documento en este proceso
+_ultimos: Dict[str, str] = {}
+
+
+def validar_imagen(ruta: Path) -> Optional[Dict[str, str]]:
+    """
+    Revisa la imagen sin decodificar sus píxeles.
+
+    Returns:
+        None si es válida; si no, {'motivo', 'detalle'}.
+    """
+    lado_minimo = int(VALIDACION_IMAGEN_CONFIG.get('lado_minimo', LADO_MINIMO))
+    bytes_minimos = int(VALIDACION_IMAGEN_CONFIG.get('bytes_minimos', BYTES_MINIMOS))
+    bytes_maximos = int(VALIDACION_IMAGEN_CONFIG.get('bytes_maximos', BYTES_MAXIMOS))
+
+    try:
+        tamano = os.path.getsize(ruta)
+        if tamano < bytes_minimos or tamano > bytes_maximos:
+            return {'motivo': TAMANO_ARCHIVO,
+                    'detalle': f"{tamano} bytes (permitido {bytes_minimos}-{bytes_maximos})"}
+
+        with open(ruta, 'rb') as f:
+            cabecera = f.read(16)
+            f.seek(max(0, tamano - _COLA_MARCADOR))
+            cola = f.read()
+    except OSError as e:
+        return {'motivo': CORRUPTA, 'detalle': f"no se pudo leer: {e}"}
+
+    formato = marcador = None
+    for firma, nombre, fin in _FIRMAS:
+        if cabecera.startswith(firma):
+            formato, marcador = nombre, fin
+            break
+    if formato is None:
+        return {'motivo': FORMATO, 'detalle': f"firma desconocida {cabecera[:8].hex()}"}
+    if marcador not in cola:
+        return {'motivo': TRUNCADA, 'detalle': f"{formato} sin marcador de fin ({tamano} bytes)"}
+
+    from PIL import Image
+
+    try:
+        with Image.open(ruta) as imagen:
+            if imagen.format != formato:
+                return {'motivo': FORMATO, 'detalle': f"firma {formato} pero PIL lee {imagen.format}"}
+            ancho, alto = imagen.size
+            # Solo recorre la estructura (segmentos JPEG, chunks y CRC de PNG)
+            imagen.verify()
+    except Exception as e:
+        return {'motivo': CORRUPTA, 'detalle': str(e) or type(e).__name__}
+
+    if min(ancho, alto) < lado_minimo:
+        return {'motivo': RESOLUCION, 'detalle': f"{ancho}x{alto} (mínimo {lado_minimo} por lado)"}
+    return None
+
+
+def registrar_rechazo(ruta: Path, documento: str, rechazo: Dict[str, str],
+                      image_url: Optional[str] = None) -> None:
+    """
+    Guarda el rechazo en el archivo JSONL y mueve la imagen a `rechazadas/`
+    para que nunca se envíe desde la carpeta temporal.
+    """
+    ruta = Path(ruta)
+    IMAGENES_RECHAZADAS.incrementar(motivo=rechazo['motivo'])
+    logger.warning(f"Imagen de {documento} rechazada ({rechazo['motivo']}): {rechazo['detalle']}")
+
+    destino = None
+    try:
+        carpeta = ruta.parent / CARPETA_RECHAZADAS
+        carpeta.mkdir(parents=True, exist_ok=True)
+        destino = carpeta / ruta.name
+        os.replace(ruta, destino)
+    except OSError as e:
+        logger.warning(f"No se pudo mover {ruta.name} a {CARPETA_RECHAZADAS}: {e}")
+        try:
+            ruta.unlink()
+        except OSError:
+            pass
+
+    registro = {
+        'momento': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'documento': documento,
+        'url': image_url,
+        'motivo': rechazo['motivo'],
+        'detalle': rechazo['detalle'],
+        'archivo': str(destino) if destino else None,
+    }
+    ruta_rechazos = Path(VALIDACION_IMAGEN_CONFIG.get('ruta_rechazos', RUTA_RECHAZOS))
+    with _lock:
+        _ultimos[documento] = rechazo['motivo']
+        try:
+            with open(ruta_rechazos, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"No se pudo registrar el rechazo de {documento}: {e}")
+
+
+@trazar("imagen.validacion")
+def aceptar_imagen(ruta: Path, documento: str, image_url: Optional[str] = None) -> bool:
+    """
+    Valida la imagen descargada; si no sirve registra el rechazo.
+
+    Returns:
+        True si se puede enviar a los equipos.
+    """
+    if not VALIDACION_IMAGEN_CONFIG.get('habilitado', True):
+        return True
+    rechazo = validar_imagen(ruta)
+    if rechazo:
+        registrar_rechazo(ruta, documento, rechazo, image_url)
+        return False
+    with _lock:
+        _ultimos.pop(documento, None)
+    return True
+
+
+def motivo_rechazo(documento: str) -> Optional[str]:
+    """Motivo del último rechazo de la imagen del documento, o None si la última fue válida."""
+    with _lock:
+        return _ultimos.get(documento)
+
+
+def olvidar_rechazo(documento: str) -> None:
+    """Borra el último motivo del documento; se llama al empezar cada descarga."""
+    with _lock:
+        _ultimos.pop(documento, None)
+
+
+def leer_rechazos(ruta: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """
+    Último rechazo de cada documento registrado en el archivo, para
+    reprocesarlos (volver a descargar la URL cuando se corrija en origen).
+    """
+    ruta = Path(ruta or VALIDACION_IMAGEN_CONFIG.get('ruta_rechazos', RUTA_RECHAZOS))
+    if not ruta.exists():
+        return []
+    por_documento: Dict[str, Dict[str, Any]] = {}
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                continue
+            por_documento[registro.get('documento')] = registro
+    return list(por_documento.values())